@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Pharmacy, Medicine, Inventory
+from .models import User, Pharmacy, Medicine, MedicineSynonym, Inventory
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -23,6 +23,11 @@ class MedicineAdmin(admin.ModelAdmin):
     list_display = ('name', 'manufacturer', 'price')
     search_fields = ('name', 'manufacturer')
 
+@admin.register(MedicineSynonym)
+class MedicineSynonymAdmin(admin.ModelAdmin):
+    list_display = ('alias', 'name')
+    search_fields = ('alias', 'name')
+
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
     list_display = ('pharmacy', 'medicine', 'quantity')
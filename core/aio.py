@@ -0,0 +1,47 @@
+"""
+Helpers for async views.
+
+Django's async ORM runs every query of a request on the same thread, one
+after the other, so ``asyncio.gather`` over ``aget()``/``acount()`` calls
+does not overlap them. ``fan_out`` runs independent blocking calls on
+separate threads, each with its own database connection, so a request
+waits for the slowest of them rather than for their sum.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # Not the event loop's default executor: that one is sized from the CPU
+    # count, which is far too few threads for calls that mostly wait on the
+    # database.
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    settings.ASYNC_FANOUT_THREADS, thread_name_prefix='fan-out'
+                )
+    return _executor
+
+
+def _run(call):
+    close_old_connections()
+    try:
+        return call()
+    finally:
+        close_old_connections()
+
+
+async def fan_out(*calls):
+    """Run zero-argument callables concurrently; return their results in order."""
+    run = sync_to_async(_run, thread_sensitive=False, executor=get_executor())
+    return await asyncio.gather(*(run(call) for call in calls))
@@ -0,0 +1,155 @@
+"""
+Low-stock alerts.
+
+Thresholds are evaluated by database triggers on ``core_inventory``
+(migration 0010) whenever a row's quantity or threshold changes, so only
+changed rows are looked at and a bulk import pays nothing per row in
+Python. A row that drops to its threshold opens a ``LowStockAlert``;
+restocking above it resolves the alert, and an alert resolved before it
+was delivered is never sent.
+
+``dispatch_pending`` claims open, undelivered alerts in batches and hands
+them to the configured sink grouped by pharmacy, one notification per
+pharmacy per batch.
+"""
+import json
+import logging
+import uuid
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import LowStockAlert
+from .sms import get_sms_gateway
+
+logger = logging.getLogger(__name__)
+
+
+class BaseAlertSink:
+    def send_alerts(self, batches):
+        """
+        Deliver ``batches``, a list of ``(pharmacy, alerts)`` pairs where
+        ``alerts`` are dicts from ``alert_payload``. Return a list of
+        booleans telling which batches were accepted.
+        """
+        raise NotImplementedError
+
+
+class LocMemAlertSink(BaseAlertSink):
+    """Collects batches in memory for tests, like Django's locmem email backend."""
+
+    outbox = []
+
+    def send_alerts(self, batches):
+        LocMemAlertSink.outbox.extend(batches)
+        return [True] * len(batches)
+
+
+class FileAlertSink(BaseAlertSink):
+    """Appends one JSON line per pharmacy to ``LOW_STOCK_ALERT_FILE``."""
+
+    def send_alerts(self, batches):
+        with open(settings.LOW_STOCK_ALERT_FILE, 'a') as output:
+            for pharmacy, alerts in batches:
+                output.write(json.dumps({
+                    'pharmacy_id': pharmacy.id,
+                    'store_name': pharmacy.store_name,
+                    'alerts': alerts,
+                }, default=str) + '\n')
+        return [True] * len(batches)
+
+
+class SMSAlertSink(BaseAlertSink):
+    """Texts the pharmacy's phone number through the configured SMS gateway."""
+
+    def send_alerts(self, batches):
+        results = [True] * len(batches)
+        messages, positions = [], []
+        for position, (pharmacy, alerts) in enumerate(batches):
+            if not pharmacy.user.phone_number:
+                logger.warning('Pharmacy %s has no phone number for low-stock alerts', pharmacy.id)
+                continue
+            listing = ', '.join(f"{alert['medicine_name']} ({alert['quantity']})" for alert in alerts)
+            messages.append((pharmacy.user.phone_number, f'Low stock: {listing}'))
+            positions.append(position)
+        for position, ok in zip(positions, get_sms_gateway().send_messages(messages)):
+            results[position] = ok
+        return results
+
+
+def get_alert_sink():
+    return import_string(settings.LOW_STOCK_ALERT_SINK)()
+
+
+def claim_batch(size):
+    """
+    Claim up to ``size`` open, undelivered alerts. Claims expire after
+    ``LOW_STOCK_ALERT_LEASE`` seconds so alerts held by a crashed
+    dispatcher are picked up again.
+    """
+    now = timezone.now()
+    claimable = Q(claimed_at__isnull=True) | Q(
+        claimed_at__lt=now - timedelta(seconds=settings.LOW_STOCK_ALERT_LEASE)
+    )
+    pending = Q(delivered_at__isnull=True, resolved_at__isnull=True)
+    ids = list(
+        LowStockAlert.objects.filter(claimable, pending)
+        .order_by('id').values_list('id', flat=True)[:size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    LowStockAlert.objects.filter(claimable, pending, id__in=ids).update(
+        claimed_at=now, claim_token=token
+    )
+    return list(
+        LowStockAlert.objects.filter(id__in=ids, claim_token=token)
+        .select_related('pharmacy__user', 'medicine').order_by('pharmacy_id', 'id')
+    )
+
+
+def alert_payload(alert):
+    return {
+        'id': alert.id,
+        'medicine_id': alert.medicine_id,
+        'medicine_name': alert.medicine.name,
+        'quantity': alert.quantity,
+        'threshold': alert.threshold,
+        'created_at': alert.created_at.isoformat(),
+    }
+
+
+def dispatch_batch(batch, sink):
+    """Deliver a claimed batch; returns the number of alerts delivered."""
+    grouped = [(pharmacy_id, list(alerts))
+               for pharmacy_id, alerts in groupby(batch, key=lambda alert: alert.pharmacy_id)]
+    results = sink.send_alerts([
+        (alerts[0].pharmacy, [alert_payload(alert) for alert in alerts])
+        for _, alerts in grouped
+    ])
+    delivered, failed = [], []
+    for (_, alerts), ok in zip(grouped, results):
+        (delivered if ok else failed).extend(alert.id for alert in alerts)
+    LowStockAlert.objects.filter(id__in=delivered).update(
+        delivered_at=timezone.now(), claim_token=''
+    )
+    if failed:
+        # Keep claimed_at so the alerts are retried once the lease expires
+        # rather than straight away by the same loop.
+        LowStockAlert.objects.filter(id__in=failed).update(claim_token='')
+    return len(delivered)
+
+
+def dispatch_pending(batch_size=500, sink=None):
+    """Deliver every pending alert; returns the number delivered."""
+    sink = sink or get_alert_sink()
+    delivered = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return delivered
+        delivered += dispatch_batch(batch, sink)
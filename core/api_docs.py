@@ -0,0 +1,111 @@
+"""
+OpenAPI schema and docs pages.
+
+drf_yasg builds the schema by walking every URL pattern and inspecting
+every serializer, which costs tens of milliseconds per hit. Here it is
+built once per process, or read from ``API_SCHEMA_DIR`` when
+``export_api_schema`` wrote it at deploy time, and served with an ETag
+so clients revalidate for free. drf_yasg is only imported by the first
+docs request, and with ``API_DOCS_ENABLED`` off the routes are not
+installed at all.
+
+The schema is generated without a request, so it carries no host and
+clients resolve paths against the server they fetched it from.
+"""
+import hashlib
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+
+FORMATS = {'json': 'application/json', 'yaml': 'application/yaml'}
+
+_lock = threading.Lock()
+_schemas = {}
+_ui_views = {}
+
+
+def get_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="PharmaReach API",
+        default_version='v1',
+        description="API documentation for PharmaReach application",
+        terms_of_service="https://www.example.com/terms/",
+        contact=openapi.Contact(email="contact@example.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+def get_schema_view():
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    return get_schema_view(get_info(), public=True, permission_classes=(permissions.AllowAny,))
+
+
+def render_schemas():
+    """Generate the schema and encode it in every format; the slow part."""
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    generator = get_schema_view().generator_class(get_info())
+    schema = generator.get_schema(request=None, public=True)
+    return {
+        'json': OpenAPICodecJson(validators=[]).encode(schema),
+        'yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def schema_path(fmt):
+    return Path(settings.API_SCHEMA_DIR) / f'openapi.{fmt}'
+
+
+def get_schema(fmt):
+    """``(body, etag)`` for ``fmt``, exported or generated on first use."""
+    cached = _schemas.get(fmt)
+    if cached is None:
+        with _lock:
+            if fmt not in _schemas:
+                if all(schema_path(name).exists() for name in FORMATS):
+                    bodies = {name: schema_path(name).read_bytes() for name in FORMATS}
+                else:
+                    bodies = render_schemas()
+                for name, body in bodies.items():
+                    _schemas[name] = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+            cached = _schemas[fmt]
+    return cached
+
+
+def reset():
+    """Forget the cached schema, e.g. after exporting a new one."""
+    with _lock:
+        _schemas.clear()
+
+
+@require_safe
+def schema_view(request, format):
+    body, etag = get_schema(format.lstrip('.'))
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(body, content_type=FORMATS[format.lstrip('.')])
+    response['ETag'] = etag
+    # Cacheable, but check back: a new deploy may change the schema.
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def ui_view(request, renderer):
+    if request.GET.get('format') == 'openapi':
+        # What the UI page fetches when SPEC_URL is unset.
+        return schema_view(request, 'json')
+    view = _ui_views.get(renderer)
+    if view is None:
+        with _lock:
+            view = _ui_views.get(renderer)
+            if view is None:
+                view = _ui_views[renderer] = get_schema_view().with_ui(renderer, cache_timeout=0)
+    return view(request)
@@ -0,0 +1,34 @@
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import BasePermission
+
+from . import sms, tokens
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """``Authorization: Bearer <access token>`` as issued by ``core.tokens``."""
+    keyword = b'bearer'
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword:
+            return None
+        if len(header) != 2:
+            raise AuthenticationFailed('Invalid Authorization header; expected "Bearer <token>".')
+        try:
+            return tokens.authenticate(header[1].decode())
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token')
+        except tokens.TokenError as exc:
+            raise AuthenticationFailed(str(exc))
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
+
+
+class SignedBySMSGateway(BasePermission):
+    """Webhook bodies must carry the gateway's ``X-SMS-Signature`` (see ``core.sms``)."""
+    message = 'Missing or invalid SMS gateway signature.'
+
+    def has_permission(self, request, view):
+        return sms.verify_signature(request.body, request.headers.get(sms.SIGNATURE_HEADER))
@@ -0,0 +1,57 @@
+"""
+Reconciliation for the ``MedicineAvailability`` summary.
+
+Day-to-day upkeep happens in database triggers (migration 0009), so every
+inventory write path, bulk upserts included, moves the totals in the same
+transaction. ``reconcile`` recomputes them from ``Inventory`` and repairs
+rows that drifted, e.g. after writes made with triggers disabled.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Inventory, Medicine, MedicineAvailability
+
+BATCH_SIZE = 1000
+
+
+def expected_totals():
+    totals = dict.fromkeys(Medicine.objects.values_list('id', flat=True), (0, 0))
+    in_stock = (
+        Inventory.objects.filter(quantity__gt=0).order_by().values('medicine_id')
+        .annotate(pharmacies=Count('id'), quantity=Sum('quantity'))
+    )
+    for row in in_stock:
+        totals[row['medicine_id']] = (row['pharmacies'], row['quantity'])
+    return totals
+
+
+def reconcile(fix=True):
+    """Return the ids of medicines whose summary row was missing or wrong."""
+    with transaction.atomic():
+        if fix and connection.vendor == 'postgresql':
+            # Keep inventory writes (and their trigger deltas) out until the
+            # recomputed totals are in place. Reads are not blocked.
+            with connection.cursor() as cursor:
+                cursor.execute('LOCK TABLE core_inventory IN SHARE MODE')
+        expected = expected_totals()
+        current = {
+            medicine_id: (pharmacies, quantity)
+            for medicine_id, pharmacies, quantity in MedicineAvailability.objects.values_list(
+                'medicine_id', 'pharmacy_count', 'total_quantity'
+            )
+        }
+        drifted = [medicine_id for medicine_id, totals in expected.items()
+                   if current.get(medicine_id) != totals]
+        if fix and drifted:
+            now = timezone.now()
+            MedicineAvailability.objects.bulk_create(
+                [MedicineAvailability(medicine_id=medicine_id, pharmacy_count=expected[medicine_id][0],
+                                      total_quantity=expected[medicine_id][1], updated_at=now)
+                 for medicine_id in drifted],
+                update_conflicts=True,
+                unique_fields=['medicine'],
+                update_fields=['pharmacy_count', 'total_quantity', 'updated_at'],
+                batch_size=BATCH_SIZE,
+            )
+    return drifted
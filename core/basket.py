@@ -0,0 +1,139 @@
+"""
+Multi-medicine basket resolution.
+
+A basket is a list of medicine ids with quantities. Every item gets a bit,
+and a single ``Inventory`` query returns the rows that satisfy their item;
+OR-ing those bits per pharmacy gives each pharmacy's mask of the items it
+holds enough of. Masks are plain Python ints, so baskets of any size fit.
+
+Pharmacies whose mask has every bit set can fill the whole basket.
+Otherwise the basket is split over as few pharmacies as possible: pairs
+are tried exactly over the distinct masks when there are few enough of
+them, and larger covers are built greedily (set cover is NP-hard; greedy is within a log factor).
+"""
+import heapq
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .geo import haversine_km
+from .models import Inventory, Pharmacy
+
+# Above this many distinct masks, skip the exact pair search (quadratic).
+PAIR_SEARCH_LIMIT = 500
+
+
+def _merge(items):
+    merged = {}
+    for medicine_id, quantity in items:
+        merged[medicine_id] = merged.get(medicine_id, 0) + quantity
+    return merged
+
+
+def _maximal(by_mask):
+    """Drop masks contained in another mask; they never help a cover."""
+    masks = sorted(by_mask, key=int.bit_count, reverse=True)
+    kept = []
+    for mask in masks:
+        if not any(mask & other == mask for other in kept):
+            kept.append(mask)
+    return kept
+
+
+def minimum_cover(by_mask, target):
+    """Return a short list of masks whose union is ``target``."""
+    masks = _maximal(by_mask) if len(by_mask) <= PAIR_SEARCH_LIMIT else list(by_mask)
+    if len(masks) <= PAIR_SEARCH_LIMIT:
+        for position, first in enumerate(masks):
+            missing = target & ~first
+            for second in masks[position + 1:]:
+                if second & missing == missing:
+                    return [first, second]
+    chosen, remaining = [], target
+    while remaining:
+        best = max(masks, key=lambda mask: (mask & remaining).bit_count())
+        chosen.append(best)
+        remaining &= ~best
+    return chosen
+
+
+def resolve_basket(items, lat=None, lng=None, limit=10):
+    """
+    Resolve ``items`` (pairs of medicine id and quantity). Pharmacies are
+    ranked by distance from ``lat``/``lng`` when given, by id otherwise.
+    """
+    wanted = _merge(items)
+    medicine_ids = list(wanted)
+    bits = {medicine_id: 1 << position for position, medicine_id in enumerate(medicine_ids)}
+    target = (1 << len(medicine_ids)) - 1
+    located = lat is not None and lng is not None
+
+    # One condition per distinct required quantity, so the database only
+    # returns rows that satisfy their item; each row sets one bit.
+    by_quantity = defaultdict(list)
+    for medicine_id, quantity in wanted.items():
+        by_quantity[max(quantity, 1)].append(medicine_id)
+    condition = Q()
+    for quantity, ids in by_quantity.items():
+        condition |= Q(medicine_id__in=ids, quantity__gte=quantity)
+    fields = ['pharmacy_id', 'medicine_id']
+    if located:
+        fields += ['pharmacy__latitude', 'pharmacy__longitude']
+    masks = defaultdict(int)
+    positions = {}
+    for row in Inventory.objects.filter(condition).order_by().values_list(*fields):
+        masks[row[0]] |= bits[row[1]]
+        if located:
+            positions[row[0]] = row[2:]
+
+    def rank(pharmacy_id):
+        if not located:
+            return (0, pharmacy_id)
+        pharmacy_lat, pharmacy_lng = positions[pharmacy_id]
+        if pharmacy_lat is None or pharmacy_lng is None:
+            return (float('inf'), pharmacy_id)
+        return (haversine_km(lat, lng, pharmacy_lat, pharmacy_lng), pharmacy_id)
+
+    available = 0
+    by_mask = defaultdict(list)
+    for pharmacy_id, mask in masks.items():
+        available |= mask
+        by_mask[mask].append(pharmacy_id)
+    complete = by_mask.pop(target, [])
+
+    cover = []
+    if not complete and available:
+        remaining = available
+        for mask in minimum_cover(by_mask, available):
+            # Each item is listed under the first pharmacy that covers it.
+            taken, remaining = mask & remaining, remaining & ~mask
+            cover.append({
+                'pharmacy_id': min(by_mask[mask], key=rank),
+                'medicine_ids': [medicine_id for medicine_id in medicine_ids
+                                 if taken & bits[medicine_id]],
+            })
+
+    shown = heapq.nsmallest(limit, complete, key=rank)
+    details = Pharmacy.objects.in_bulk(shown + [part['pharmacy_id'] for part in cover])
+
+    def describe(pharmacy_id):
+        pharmacy = details[pharmacy_id]
+        result = {
+            'id': pharmacy.id,
+            'store_name': pharmacy.store_name,
+            'latitude': pharmacy.latitude,
+            'longitude': pharmacy.longitude,
+        }
+        if located:
+            distance = rank(pharmacy_id)[0]
+            result['distance_km'] = round(distance, 2) if distance != float('inf') else None
+        return result
+
+    return {
+        'complete_count': len(complete),
+        'complete': [describe(pharmacy_id) for pharmacy_id in shown],
+        'cover': [{**describe(part['pharmacy_id']), 'medicine_ids': part['medicine_ids']}
+                  for part in cover],
+        'unavailable': [medicine_id for medicine_id in medicine_ids
+                        if not available & bits[medicine_id]],
+    }
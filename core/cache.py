@@ -0,0 +1,185 @@
+"""
+Versioned response cache for read-mostly endpoints.
+
+Each cached response belongs to one or more namespaces (``catalogue`` for
+medicine data, ``availability`` for stock data). Keys embed the current
+version of each, and the signal handlers in ``core.signals`` bump versions
+on every write, so stale entries are never read again and simply expire.
+A bump waits for the write's transaction to commit: bumped any earlier, a
+concurrent read could refill the new version with the old data.
+
+Versions only invalidate across processes when the cache is shared by all
+of them (Redis, Memcached, the file cache); see ``core.checks``.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.response import Response
+
+from . import throttling
+
+NAMESPACES = ('catalogue', 'availability')
+LOCK_TIMEOUT = 10  # seconds a miss may take to recompute before others give up
+LOCK_WAIT = 2.0  # seconds a request waits for another one to fill the key
+LOCK_POLL = 0.05
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def record(namespace, event):
+    with _stats_lock:
+        _stats[namespace, event] += 1
+
+
+def counters():
+    with _stats_lock:
+        return sorted((namespace, event, count) for (namespace, event), count in _stats.items())
+
+
+def stats():
+    return {f'{namespace}_{event}': count for namespace, event, count in counters()}
+
+
+def get_version(namespace):
+    cache = get_cache()
+    key = f'version:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        # Unknown or evicted: any fresh value differs from the old keys as
+        # long as it never repeats, so seed it from the clock, never from 1.
+        seed = time.time_ns()
+        cache.add(key, seed, timeout=None)
+        version = cache.get(key, seed)
+    return version
+
+
+def _bump(namespaces):
+    cache = get_cache()
+    for namespace in namespaces:
+        key = f'version:{namespace}'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump(*namespaces):
+    """Invalidate ``namespaces`` once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def _request_key(request):
+    query = sorted(request.query_params.lists())
+    # The host is part of the key because paginated bodies hold absolute URLs.
+    raw = f'{request.get_host()}{request.path}?{query}'.encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _respond(data, etag, hit):
+    response = Response(data)
+    response['ETag'] = etag
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def _degrade(request, cache, label, key, request_key, etag):
+    """
+    Answer a request that ran out of throttle tokens without the database:
+    from the current entry, else from the last one stored under any
+    version, else refuse it.
+    """
+    wait, exhausted = request.over_budget
+    data = cache.get(key)
+    if data is not None:
+        record(label, 'hits')
+        throttling.record(exhausted, 'degraded')
+        return _respond(data, etag, hit=True)
+    data = cache.get(f'stale:{label}:{request_key}')
+    if data is not None:
+        record(label, 'stale_hits')
+        throttling.record(exhausted, 'degraded')
+        response = Response(data)
+        response['X-Cache'] = 'STALE'
+        return response
+    throttling.record(exhausted, 'rejected')
+    raise Throttled(wait)
+
+
+def cached_response(*namespaces, timeout=None):
+    """
+    Cache the ``data`` of successful DRF responses of a view method under
+    ``namespaces``: a write to any of them invalidates the entry. Supports
+    ``If-None-Match`` and lets only one request recompute a cold key while
+    the others wait for its result. Requests over their throttle budget
+    (``core.throttling``) are only answered from the cache.
+    """
+    assert namespaces and set(namespaces) <= set(NAMESPACES), namespaces
+    label = '+'.join(namespaces)
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = get_cache()
+            version = '.'.join(str(get_version(namespace)) for namespace in namespaces)
+            request_key = _request_key(request)
+            key = f'response:{label}:{version}:{request_key}'
+            etag = f'"{label}-{version}-{request_key[:16]}"'
+
+            if request.headers.get('If-None-Match') == etag:
+                record(label, 'not_modified')
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
+
+            if getattr(request, 'over_budget', None):
+                return _degrade(request, cache, label, key, request_key, etag)
+
+            data = cache.get(key)
+            if data is not None:
+                record(label, 'hits')
+                return _respond(data, etag, hit=True)
+
+            lock_key = f'lock:{key}'
+            locked = cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+            if not locked:
+                # Someone else is computing this key: wait for them briefly.
+                deadline = time.monotonic() + LOCK_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(LOCK_POLL)
+                    data = cache.get(key)
+                    if data is not None:
+                        record(label, 'hits')
+                        return _respond(data, etag, hit=True)
+                record(label, 'lock_timeouts')
+
+            record(label, 'misses')
+            try:
+                response = view_method(self, request, *args, **kwargs)
+                if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+                    cache.set(key, response.data,
+                              timeout or settings.RESPONSE_CACHE_TIMEOUT)
+                    # Outlives version bumps, for requests over budget.
+                    cache.set(f'stale:{label}:{request_key}', response.data,
+                              settings.THROTTLE_STALE_TIMEOUT)
+                    response['ETag'] = etag
+                    response['X-Cache'] = 'MISS'
+                return response
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+        wrapper.cached_namespaces = namespaces
+        return wrapper
+    return decorator
@@ -0,0 +1,29 @@
+"""
+System checks for settings that only bite once several processes serve
+the site.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries live in one process only.
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Response cache versions, throttle buckets and the fuzzy index all
+    coordinate workers through the cache, so it has to be shared by every
+    process.
+    """
+    errors = []
+    for setting in ('RESPONSE_CACHE_ALIAS', 'THROTTLE_CACHE_ALIAS'):
+        alias = getattr(settings, setting)
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend in PROCESS_LOCAL_CACHES:
+            errors.append(Error(
+                f'{setting} points at the {alias!r} cache, which is local to each process.',
+                hint='Set CACHE_BACKEND to a shared backend such as RedisCache or FileBasedCache.',
+                id='core.E001',
+            ))
+    return errors
@@ -0,0 +1,255 @@
+"""
+Restock recommendations from inventory history and SMS demand.
+
+``forecast`` is a batch job (``forecast_restock``). It works through the
+pharmacies in chunks of ``RESTOCK_CHUNK_PHARMACIES``, loading each
+chunk's inventory rows, their state from the last run and the inventory
+events since then into NumPy arrays, and computes for all rows at once:
+
+* units sold per row and day, from drops in stock between consecutive
+  events; restocks and deletions are not sales. The rows are the
+  inventory rows that exist, not a dense pharmacy x medicine grid, which
+  would be almost all zeros;
+* the exponentially smoothed daily demand (``RESTOCK_SMOOTHING``), folded
+  in day by day from the level the last run stored, so a run only reads
+  the events of the days since. Rows seen for the first time start from
+  their mean over the days the event log still holds in full;
+* the forecast: that level scaled by the medicine's SMS trend, requests
+  over the last ``RESTOCK_TREND_RECENT_DAYS`` against the last
+  ``RESTOCK_TREND_BASE_DAYS`` (daily ``SMSDemandRollup`` buckets);
+* days of cover, and the quantity that brings the stock up to
+  ``RESTOCK_TARGET_DAYS`` of forecast demand, or above the reorder
+  threshold if that is higher.
+
+Memory is bounded by the chunk: a few arrays per inventory row and one
+rows x days matrix. Only complete days are used; today's events wait for
+tomorrow's run.
+"""
+import math
+from datetime import datetime, time as day_start, timedelta
+from itertools import repeat
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import Inventory, InventoryEvent, Medicine, Pharmacy, RestockRecommendation, SMSDemandRollup
+from .sms import normalize
+
+# Ids are below 2**31, so (pharmacy, medicine) packs into one int64 key.
+KEY_SHIFT = 31
+# How far the SMS trend may move a forecast either way.
+TREND_LIMITS = (0.5, 2.0)
+RESULT_COLUMNS = ['pharmacy_id', 'medicine_id', 'level', 'last_quantity', 'through', 'forecast',
+                  'quantity', 'days_of_cover', 'recommended_quantity', 'computed_at']
+# Model instances cost more than the whole forecast, so the results are
+# written as plain rows, with the same portable upsert as core.sms_demand.
+UPSERT = (
+    'INSERT INTO core_restockrecommendation ({columns}) VALUES ({values}) '
+    'ON CONFLICT (pharmacy_id, medicine_id) DO UPDATE SET {updates}'
+).format(
+    columns=', '.join(RESULT_COLUMNS),
+    values=', '.join(['%s'] * len(RESULT_COLUMNS)),
+    updates=', '.join(f'{column} = excluded.{column}' for column in RESULT_COLUMNS[2:]),
+)
+
+
+def _midnight(day):
+    return datetime.combine(day, day_start.min, tzinfo=timezone.get_current_timezone())
+
+
+def _first_event_id(since):
+    """
+    The lowest event id created at or after ``since``, or one past the
+    last event if there is none. Ids grow with ``created_at``, so this is a
+    binary search over the primary key rather than a scan of the log.
+    """
+    events = InventoryEvent.objects.order_by('id')
+    low = events.values_list('id', flat=True).first()
+    high = events.reverse().values_list('id', flat=True).first()
+    if low is None:
+        return 0
+    high += 1
+    while low < high:
+        middle = (low + high) // 2
+        found = events.filter(id__gte=middle).values_list('id', 'created_at').first()
+        if found is None or found[1] >= since:
+            high = middle
+        else:
+            low = found[0] + 1
+    return low
+
+
+def sms_trend(today):
+    """
+    Array indexed by medicine id: the recent rate of SMS requests against
+    the base rate, 1 where there is no signal.
+    """
+    recent_days = settings.RESTOCK_TREND_RECENT_DAYS
+    base_days = settings.RESTOCK_TREND_BASE_DAYS
+    recent_start = _midnight(today - timedelta(days=recent_days))
+    requests = (
+        SMSDemandRollup.objects
+        .filter(period=SMSDemandRollup.DAY,
+                bucket__gte=_midnight(today - timedelta(days=base_days)),
+                bucket__lt=_midnight(today))
+        .values('medicine_name')
+        .annotate(total=Sum('count'), recent=Sum('count', filter=Q(bucket__gte=recent_start)))
+    )
+    counts = {row['medicine_name']: (row['recent'] or 0, row['total']) for row in requests}
+    largest = Medicine.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    trend = np.ones(largest + 1)
+    if not counts:
+        return trend
+    ids, recent, total = [], [], []
+    for medicine_id, name in Medicine.objects.values_list('id', 'name').iterator():
+        found = counts.get(normalize(name))
+        if found:
+            ids.append(medicine_id)
+            recent.append(found[0])
+            total.append(found[1])
+    # One request a week added to both rates keeps a handful of messages
+    # from swinging the forecast.
+    prior = 1 / recent_days
+    ratio = ((np.array(recent) / recent_days + prior)
+             / (np.array(total) / base_days + prior))
+    trend[np.array(ids, dtype=np.int64)] = np.clip(ratio, *TREND_LIMITS)
+    return trend
+
+
+def _events(low, high, day_ids):
+    """The chunk's events in the days from ``day_ids`` as arrays, by row and id."""
+    rows = list(
+        InventoryEvent.objects
+        .filter(pharmacy_id__gte=low, pharmacy_id__lte=high, id__gte=day_ids[0], id__lt=day_ids[-1])
+        .order_by()
+        .values_list('id', 'pharmacy_id', 'medicine_id', 'quantity', 'deleted')
+    )
+    if not rows:
+        return None
+    ids, pharmacy, medicine, quantity, deleted = (np.array(column) for column in zip(*rows))
+    keys = (pharmacy.astype(np.int64) << KEY_SHIFT) | medicine.astype(np.int64)
+    order = np.lexsort((ids, keys))
+    day = np.searchsorted(day_ids, ids, side='right') - 1
+    # Deletions carry no quantity: the row is down to nothing.
+    quantity = np.nan_to_num(quantity.astype(float), nan=0.0)
+    return keys[order], quantity[order], deleted.astype(bool)[order], day[order]
+
+
+def _forecast_chunk(low, high, today, first_day, day_ids, trend):
+    """Recompute the recommendations of pharmacies ``low``..``high``; returns rows written."""
+    days = len(day_ids) - 1
+    inventory = list(
+        Inventory.objects.filter(pharmacy_id__gte=low, pharmacy_id__lte=high)
+        .order_by('pharmacy_id', 'medicine_id')
+        .values_list('pharmacy_id', 'medicine_id', 'quantity', 'reorder_threshold')
+    )
+    state = list(
+        RestockRecommendation.objects.filter(pharmacy_id__gte=low, pharmacy_id__lte=high)
+        .values_list('id', 'pharmacy_id', 'medicine_id', 'level', 'last_quantity', 'through')
+    )
+    if not inventory:
+        RestockRecommendation.objects.filter(id__in=[row[0] for row in state]).delete()
+        return 0
+    pharmacy, medicine, quantity, threshold = (np.array(column, dtype=np.int64) for column in zip(*inventory))
+    keys = (pharmacy << KEY_SHIFT) | medicine
+    count = len(keys)
+
+    # Carry over the last run's state; rows without one, or whose state is
+    # older than the event log goes back, start afresh.
+    level = np.full(count, np.nan)
+    last_quantity = np.full(count, np.nan)
+    folded = np.full(count, -1)  # index of the last day already in ``level``
+    stale = []
+    if state:
+        state_id, state_pharmacy, state_medicine, state_level, state_last, state_through = zip(*state)
+        state_keys = ((np.array(state_pharmacy, dtype=np.int64) << KEY_SHIFT)
+                      | np.array(state_medicine, dtype=np.int64))
+        position = np.minimum(np.searchsorted(keys, state_keys), count - 1)
+        found = keys[position] == state_keys
+        stale = np.array(state_id)[~found].tolist()
+        through = np.array([day.toordinal() for day in state_through]) - first_day.toordinal()
+        current = found & (through >= -1)
+        level[position[current]] = np.array(state_level)[current]
+        last_quantity[position[current]] = np.array(state_last, dtype=float)[current]
+        folded[position[current]] = through[current]
+    known = ~np.isnan(level)
+
+    # Units sold per row and day.
+    sold = np.zeros((count, days))
+    events = _events(low, high, day_ids) if days else None
+    if events is not None:
+        event_keys, event_quantity, deleted, day = events
+        row = np.minimum(np.searchsorted(keys, event_keys), count - 1)
+        first = np.ones(len(event_keys), dtype=bool)
+        first[1:] = event_keys[1:] != event_keys[:-1]
+        previous = np.empty(len(event_keys))
+        previous[1:] = event_quantity[:-1]
+        previous[first] = last_quantity[row[first]]
+        drop = np.nan_to_num(previous - event_quantity, nan=0.0)
+        # Only days after the stored state, and only for rows still stocked.
+        counted = (keys[row] == event_keys) & (day > folded[row]) & ~deleted & (drop > 0)
+        np.add.at(sold, (row[counted], day[counted]), drop[counted])
+        last = np.ones(len(event_keys), dtype=bool)
+        last[:-1] = event_keys[1:] != event_keys[:-1]
+        last &= keys[row] == event_keys
+        last_quantity[row[last]] = event_quantity[last]
+    last_quantity = np.where(np.isnan(last_quantity), quantity, last_quantity)
+
+    alpha = settings.RESTOCK_SMOOTHING
+    level[~known] = sold[~known].mean(axis=1) if days else 0.0
+    for offset in range(days):
+        update = known & (offset > folded)
+        level = np.where(update, alpha * sold[:, offset] + (1 - alpha) * level, level)
+
+    inside = medicine < len(trend)
+    expected = level * np.where(inside, trend[np.where(inside, medicine, 0)], 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cover = np.where(expected > 0, quantity / expected, np.nan)
+    target = np.ceil(expected * settings.RESTOCK_TARGET_DAYS - 1e-9)
+    target = np.maximum(target, np.where(threshold > 0, threshold + 1, 0))
+    recommended = np.maximum(target - quantity, 0).astype(np.int64)
+
+    # Every row shares these; adapt them once rather than per row.
+    through = connection.ops.adapt_datefield_value(today - timedelta(days=1))
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    results = zip(
+        pharmacy.tolist(), medicine.tolist(), level.tolist(), last_quantity.astype(np.int64).tolist(),
+        repeat(through), expected.tolist(), quantity.tolist(),
+        [None if math.isnan(value) else value for value in cover.tolist()],
+        recommended.tolist(), repeat(now),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        RestockRecommendation.objects.filter(id__in=stale).delete()
+        cursor.executemany(UPSERT, list(results))
+    return count
+
+
+def forecast(today=None, chunk_size=None, pharmacy_ids=None):
+    """
+    Recompute the recommendations of every pharmacy, or of the id range
+    spanned by ``pharmacy_ids``, with history up to the end of the day
+    before ``today``. Returns the number of rows written.
+    """
+    today = today or timezone.localdate()
+    chunk_size = chunk_size or settings.RESTOCK_CHUNK_PHARMACIES
+    # Below the retention horizon compaction leaves one event per row, so
+    # only the days after it have every change.
+    first_day = today - timedelta(days=settings.INVENTORY_EVENT_RETENTION_DAYS - 1)
+    # Events are assigned to days by id, which spares converting every
+    # timestamp: the first id of each day, and of today to end the range.
+    day_ids = np.array([
+        _first_event_id(_midnight(first_day + timedelta(days=offset)))
+        for offset in range((today - first_day).days + 1)
+    ], dtype=np.int64)
+    trend = sms_trend(today)
+    if pharmacy_ids is None:
+        pharmacy_ids = Pharmacy.objects.order_by('id').values_list('id', flat=True)
+    pharmacy_ids = sorted(pharmacy_ids)
+    written = 0
+    for offset in range(0, len(pharmacy_ids), chunk_size):
+        chunk = pharmacy_ids[offset:offset + chunk_size]
+        written += _forecast_chunk(chunk[0], chunk[-1], today, first_day, day_ids, trend)
+    return written
@@ -0,0 +1,245 @@
+"""
+Misspelling-tolerant medicine name matching.
+
+SMS users type names loosely ("paracetmol", "amoxycilin 500"), which
+neither ``name__iexact`` nor the prefix search in ``core.search`` finds.
+``FuzzyMatcher`` keeps an in-memory trigram index over medicine names:
+
+* candidates come from the rarest of the query's trigram posting lists
+  (a name sharing enough trigrams with the query must appear in one of
+  them), so common trigrams are only counted for a short list;
+* the best candidates by trigram overlap are reranked by edit distance
+  against the leading words of the name;
+* ``MedicineSynonym`` rows (brand <-> generic) are matched the same way
+  and the query is retried with the other name.
+
+The index follows ``Medicine`` writes made in this process through
+signals, and picks up writes made elsewhere by diffing names against the
+database when the ``catalogue`` cache version moves, at most once per
+``FUZZY_INDEX_REFRESH_INTERVAL`` seconds.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+
+from .cache import get_version
+from .models import Medicine, MedicineSynonym
+
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+MIN_OVERLAP = 0.4  # share of the query's trigrams a candidate must contain
+CANDIDATES = 200  # verified by exact trigram overlap
+RERANKED = 20  # reranked by edit distance
+STOP_FRACTION = 0.25  # posting lists longer than this share of names are skipped
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return NON_ALNUM_RE.sub(' ', text.lower()).strip()
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    """Levenshtein distance that also counts swapping two adjacent letters as one edit."""
+    if len(a) < len(b):
+        a, b = b, a
+    before, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        before, previous = previous, current
+    return previous[-1]
+
+
+class TrigramIndex:
+    """
+    Trigram postings over short texts keyed by id. Removals leave stale
+    entries in the posting lists, which lookups skip by checking the
+    current text; the lists are rebuilt once stale entries pile up.
+    """
+
+    def __init__(self):
+        self.texts = {}
+        self.postings = {}
+        self.size = 0
+        self.stale = 0
+
+    def add(self, key, text):
+        text = normalize(text)
+        if self.texts.get(key) == text:
+            return
+        if key in self.texts:
+            self.remove(key)
+        self.texts[key] = text
+        for gram in trigrams(text):
+            self.postings.setdefault(gram, []).append(key)
+            self.size += 1
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        self.stale += len(trigrams(text))
+        if self.stale > max(1000, self.size // 4):
+            self.compact()
+
+    def compact(self):
+        texts, self.texts = self.texts, {}
+        self.postings, self.size, self.stale = {}, 0, 0
+        for key, text in texts.items():
+            self.texts[key] = text
+            for gram in trigrams(text):
+                self.postings.setdefault(gram, []).append(key)
+                self.size += 1
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` ``(score, key)`` pairs, best first; scores are 0..1."""
+        query = normalize(query)
+        grams = trigrams(query) if query else set()
+        if not grams or not self.texts:
+            return []
+        lists = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        needed = max(1, math.ceil(len(grams) * MIN_OVERLAP))
+        # Any text with ``needed`` of the query's trigrams is in one of the
+        # ``len - needed + 1`` shortest lists.
+        lists = lists[:len(lists) - needed + 1]
+        stop = max(CANDIDATES, len(self.texts) * STOP_FRACTION)
+        lists = [postings for postings in lists if len(postings) <= stop] or lists[:1]
+        counts = Counter()
+        for postings in lists:
+            counts.update(postings)
+
+        scored = []
+        for key, _ in heapq.nlargest(CANDIDATES, counts.items(), key=itemgetter(1)):
+            text = self.texts.get(key)
+            if text is None:
+                continue
+            overlap = len(grams & trigrams(text)) / len(grams)
+            if overlap >= MIN_OVERLAP:
+                scored.append((overlap, key, text))
+        best = heapq.nlargest(RERANKED, scored, key=lambda item: (item[0], -len(item[2])))
+
+        words = len(query.split())
+        results = []
+        for overlap, key, text in best:
+            # Compare with as many leading words as the query has, so
+            # "paracetmol" is measured against "paracetamol", not
+            # "paracetamol 500mg tablet".
+            lead = ' '.join(text.split()[:words])
+            similarity = 1 - edit_distance(query, lead) / max(len(query), len(lead), 1)
+            results.append((round((overlap + max(similarity, 0)) / 2, 4), key, len(text)))
+        results.sort(key=lambda item: (-item[0], item[2], item[1]))
+        return [(score, key) for score, key, _ in results[:limit]]
+
+
+class FuzzyMatcher:
+    def __init__(self):
+        self.names = TrigramIndex()
+        self.synonyms = TrigramIndex()
+        # synonym key -> the other name of the pair
+        self.synonym_targets = {}
+        self.lock = threading.RLock()
+        self.version = None
+        self.checked_at = 0.0
+
+    def load(self):
+        with self.lock:
+            self.version = get_version('catalogue')
+            self.checked_at = time.monotonic()
+            self.sync_names(Medicine.objects.values_list('id', 'name').iterator(chunk_size=5000))
+            self.sync_synonyms()
+
+    def sync_names(self, rows):
+        seen = set()
+        for medicine_id, name in rows:
+            seen.add(medicine_id)
+            self.names.add(medicine_id, name)
+        for medicine_id in set(self.names.texts) - seen:
+            self.names.remove(medicine_id)
+
+    def sync_synonyms(self):
+        # Built aside and swapped in together, so ``match`` never sees an
+        # index without its targets.
+        synonyms, targets = TrigramIndex(), {}
+        for synonym_id, alias, name in MedicineSynonym.objects.values_list('id', 'alias', 'name'):
+            # Both directions: a brand finds the generic and vice versa.
+            for key, text, target in (((synonym_id, 0), alias, name), ((synonym_id, 1), name, alias)):
+                synonyms.add(key, text)
+                targets[key] = target
+        with self.lock:
+            self.synonyms, self.synonym_targets = synonyms, targets
+
+    def refresh(self):
+        """Catch up with catalogue writes made by other processes."""
+        if self.version is None:
+            # Not loaded from the database; fed through sync_names only.
+            return
+        if time.monotonic() - self.checked_at < settings.FUZZY_INDEX_REFRESH_INTERVAL:
+            return
+        with self.lock:
+            self.checked_at = time.monotonic()
+            version = get_version('catalogue')
+            if version != self.version:
+                self.version = version
+                self.sync_names(Medicine.objects.values_list('id', 'name').iterator(chunk_size=5000))
+                self.sync_synonyms()
+
+    def medicine_saved(self, medicine):
+        with self.lock:
+            self.names.add(medicine.id, medicine.name)
+
+    def medicine_deleted(self, medicine_id):
+        with self.lock:
+            self.names.remove(medicine_id)
+
+    def match(self, query, limit=10):
+        """Return up to ``limit`` ``(score, medicine_id)`` pairs, best first."""
+        self.refresh()
+        with self.lock:
+            best = dict((key, score) for score, key in self.names.search(query, limit))
+            for alias_score, key in self.synonyms.search(query, 3):
+                if alias_score < settings.FUZZY_MATCH_MIN_SCORE:
+                    continue
+                for score, medicine_id in self.names.search(self.synonym_targets[key], limit):
+                    score = round(score * alias_score, 4)
+                    if score > best.get(medicine_id, 0):
+                        best[medicine_id] = score
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))
+        return [(score, medicine_id) for medicine_id, score in ranked[:limit]]
+
+    def best_match(self, query):
+        """The id of the closest medicine if it scores ``FUZZY_MATCH_MIN_SCORE`` or more."""
+        matches = self.match(query, 1)
+        if matches and matches[0][0] >= settings.FUZZY_MATCH_MIN_SCORE:
+            return matches[0][1]
+        return None
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher(load=True):
+    """The process-wide matcher, built on first use unless ``load`` is false."""
+    global _matcher
+    if _matcher is None and load:
+        with _matcher_lock:
+            if _matcher is None:
+                matcher = FuzzyMatcher()
+                matcher.load()
+                _matcher = matcher
+    return _matcher
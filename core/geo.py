@@ -0,0 +1,117 @@
+import heapq
+import math
+
+from django.db import connection
+
+from .models import Inventory
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180  # along a meridian, as haversine_km measures
+INITIAL_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 20038.0  # half the Earth's circumference
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_boxes(lat, lng, radius_km):
+    """
+    Return the (min_lat, max_lat, min_lng, max_lng) boxes enclosing the
+    circle: one, or two when it crosses the 180th meridian.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6 or lat + dlat >= 90 or lat - dlat <= -90:
+        dlng = 180.0
+    else:
+        dlng = min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    if dlng >= 180.0:
+        return [(min_lat, max_lat, -180.0, 180.0)]
+    if lng - dlng < -180.0:
+        return [(min_lat, max_lat, -180.0, lng + dlng), (min_lat, max_lat, lng - dlng + 360.0, 180.0)]
+    if lng + dlng > 180.0:
+        return [(min_lat, max_lat, lng - dlng, 180.0), (min_lat, max_lat, -180.0, lng + dlng - 360.0)]
+    return [(min_lat, max_lat, lng - dlng, lng + dlng)]
+
+
+def _candidates_rtree(medicine_id, box):
+    # CROSS JOIN pins the R-tree as the outer loop; left to itself SQLite
+    # prefers walking every inventory row of the medicine.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT p.id, p.store_name, p.latitude, p.longitude, i.quantity '
+            'FROM core_pharmacy_rtree r '
+            'CROSS JOIN core_inventory i '
+            'CROSS JOIN core_pharmacy p '
+            'WHERE r.max_lat >= %s AND r.min_lat <= %s '
+            'AND r.max_lng >= %s AND r.min_lng <= %s '
+            'AND i.pharmacy_id = r.id AND i.medicine_id = %s AND i.quantity > 0 '
+            'AND p.id = r.id',
+            [*box, medicine_id],
+        )
+        return cursor.fetchall()
+
+
+def _candidates_orm(medicine_id, box):
+    min_lat, max_lat, min_lng, max_lng = box
+    return Inventory.objects.filter(
+        medicine_id=medicine_id,
+        quantity__gt=0,
+        pharmacy__latitude__range=(min_lat, max_lat),
+        pharmacy__longitude__range=(min_lng, max_lng),
+    ).values_list(
+        'pharmacy_id', 'pharmacy__store_name', 'pharmacy__latitude',
+        'pharmacy__longitude', 'quantity',
+    )
+
+
+def _result(row, distance):
+    pharmacy_id, store_name, latitude, longitude, quantity = row
+    return {
+        'pharmacy_id': pharmacy_id,
+        'store_name': store_name,
+        'latitude': latitude,
+        'longitude': longitude,
+        'quantity': quantity,
+        'distance_km': round(distance, 3),
+    }
+
+
+def nearby_in_stock(medicine_id, lat, lng, k=10):
+    """
+    Return the ``k`` pharmacies nearest to (lat, lng) holding ``medicine_id``
+    with quantity > 0, closest first.
+
+    The search radius starts small and doubles until at least ``k`` matches
+    fall inside the circle inscribed in the queried box, so only the
+    neighbourhood of the point is read from the spatial index.
+    """
+    candidates = _candidates_rtree if connection.vendor == 'sqlite' else _candidates_orm
+    radius = INITIAL_RADIUS_KM
+    while True:
+        rows = [row for box in bounding_boxes(lat, lng, radius) for row in candidates(medicine_id, box)]
+        scored = [(haversine_km(lat, lng, row[2], row[3]), row) for row in rows]
+        within = [item for item in scored if item[0] <= radius]
+        if len(within) >= k or radius >= MAX_RADIUS_KM:
+            pool = within if len(within) >= k else scored
+            nearest = heapq.nsmallest(k, pool, key=lambda item: item[0])
+            return [_result(row, distance) for distance, row in nearest]
+        radius *= 2
+
+
+def nearby_in_stock_scan(medicine_id, lat, lng, k=10):
+    """Reference implementation scanning every in-stock row; used to benchmark."""
+    rows = Inventory.objects.filter(
+        medicine_id=medicine_id, quantity__gt=0, pharmacy__latitude__isnull=False,
+    ).values_list(
+        'pharmacy_id', 'pharmacy__store_name', 'pharmacy__latitude',
+        'pharmacy__longitude', 'quantity',
+    )
+    scored = [(haversine_km(lat, lng, row[2], row[3]), row) for row in rows]
+    nearest = heapq.nsmallest(k, scored, key=lambda item: item[0])
+    return [_result(row, distance) for distance, row in nearest]
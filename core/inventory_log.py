@@ -0,0 +1,117 @@
+"""
+Inventory change log for delta sync.
+
+Database triggers append an ``InventoryEvent`` for every inventory write
+(migration 0011), so the views, ``core.stock``, bulk sync and deletes are
+all covered without the write paths knowing about the log. A client keeps
+the sequence number of the last change it applied and asks for what came
+after it.
+
+``compact`` keeps the log bounded the way log-compacted topics do: below
+the retention horizon only the latest event per inventory row is kept,
+which is a snapshot of the stock at the horizon, and deletions there are
+dropped altogether. A client whose cursor is below the last dropped
+deletion could have missed it and gets a full snapshot instead.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from .models import Inventory, InventoryEvent, InventoryLogFloor, Pharmacy
+
+
+def _change(seq, medicine_id, quantity, reorder_threshold, deleted):
+    return {
+        'seq': seq,
+        'medicine_id': medicine_id,
+        'quantity': quantity,
+        'reorder_threshold': reorder_threshold,
+        'deleted': deleted,
+    }
+
+
+def snapshot(pharmacy, floor=0):
+    """The pharmacy's whole inventory as changes, with the cursor to resume from."""
+    # Read the cursor first: a write racing with the snapshot then shows up
+    # again in the next delta, and applying a change twice is harmless. The
+    # latest events may have been dropped deletions, so never resume below
+    # the floor.
+    latest = InventoryEvent.objects.filter(pharmacy=pharmacy).aggregate(seq=Max('id'))['seq']
+    cursor = max(latest or 0, floor)
+    rows = Inventory.objects.filter(pharmacy=pharmacy).order_by('medicine_id').values_list(
+        'medicine_id', 'quantity', 'reorder_threshold'
+    )
+    return {
+        'reset': True,
+        'cursor': cursor,
+        'has_more': False,
+        'changes': [_change(cursor, medicine_id, quantity, threshold, False)
+                    for medicine_id, quantity, threshold in rows],
+    }
+
+
+def changes_since(pharmacy, since, limit=None):
+    """
+    Up to ``limit`` events after sequence number ``since``, collapsed to the
+    latest one per medicine. Follow ``cursor`` while ``has_more`` is set.
+    """
+    limit = limit or settings.INVENTORY_CHANGES_PAGE_SIZE
+    floor = InventoryLogFloor.objects.filter(pharmacy=pharmacy).values_list('seq', flat=True).first()
+    if floor and since < floor:
+        return snapshot(pharmacy, floor)
+    events = list(
+        InventoryEvent.objects.filter(pharmacy=pharmacy, id__gt=since).order_by('id').values_list(
+            'id', 'medicine_id', 'quantity', 'reorder_threshold', 'deleted'
+        )[:limit + 1]
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+    latest = {event[1]: event for event in events}
+    return {
+        'reset': False,
+        'cursor': events[-1][0] if events else since,
+        'has_more': has_more,
+        'changes': [_change(*event) for event in sorted(latest.values())],
+    }
+
+
+def compact(retention=None):
+    """
+    Compact events older than ``retention`` (a timedelta, by default
+    ``INVENTORY_EVENT_RETENTION_DAYS``). Returns the number of events removed.
+    """
+    if retention is None:
+        retention = timedelta(days=settings.INVENTORY_EVENT_RETENTION_DAYS)
+    horizon = (
+        InventoryEvent.objects.filter(created_at__lt=timezone.now() - retention)
+        .order_by('-id').values_list('id', flat=True).first()
+    )
+    if horizon is None:
+        return 0
+    old = InventoryEvent.objects.filter(id__lte=horizon)
+    with transaction.atomic():
+        later = InventoryEvent.objects.filter(
+            pharmacy_id=OuterRef('pharmacy_id'), medicine_id=OuterRef('medicine_id'),
+            id__gt=OuterRef('id'),
+        )
+        removed, _ = old.filter(Exists(later)).delete()
+        # What remains below the horizon is the latest event per row, so any
+        # deletion among it is the row's final state and can go, as can the
+        # events of deleted pharmacies: nobody is left to sync them. Both
+        # raise the floor, which snapshot rebuilds rely on to see deletions.
+        tombstones = old.filter(Q(deleted=True) | ~Q(pharmacy_id__in=Pharmacy.objects.values('id')))
+        floors = [
+            InventoryLogFloor(pharmacy_id=row['pharmacy_id'], seq=row['seq'])
+            for row in tombstones.order_by().values('pharmacy_id').annotate(seq=Max('id'))
+        ]
+        InventoryLogFloor.objects.bulk_create(
+            floors,
+            update_conflicts=True,
+            unique_fields=['pharmacy'],
+            update_fields=['seq'],
+        )
+        dropped, _ = tombstones.delete()
+    return removed + dropped
@@ -0,0 +1,181 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from .cache import bump
+from .models import Inventory, Medicine
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ('csv', 'ndjson')
+
+
+class SyncError(ValueError):
+    """The input cannot be read any further; ``line`` is where it stopped."""
+
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.line = line
+        # Set by sync_inventory: what was applied before the error.
+        self.report = None
+
+
+def detect_format(content_type='', filename=''):
+    content_type = content_type.split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv') or filename.endswith('.csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/jsonl') \
+            or filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def _decode(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                raise SyncError('input is not valid UTF-8', line=line_number)
+        yield line
+
+
+def iter_records(lines, fmt):
+    """
+    Yield ``(line_number, record)`` pairs from an iterable of lines, one at a
+    time, so the input is never held in memory as a whole.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(_decode(lines))
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(_decode(lines), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record
+    else:
+        raise SyncError(f'Unsupported format {fmt!r}; use one of {", ".join(FORMATS)}')
+
+
+def _clean(record):
+    if not isinstance(record, dict):
+        raise ValueError('malformed record')
+    try:
+        medicine_id = int(record['medicine_id'])
+        quantity = int(record['quantity'])
+    except KeyError as exc:
+        raise ValueError(f'missing field {exc.args[0]}')
+    except (TypeError, ValueError):
+        raise ValueError('medicine_id and quantity must be integers')
+    if quantity < 0:
+        raise ValueError('quantity must not be negative')
+    threshold = record.get('reorder_threshold')
+    if threshold in (None, ''):
+        return medicine_id, quantity, None
+    try:
+        threshold = int(threshold)
+    except (TypeError, ValueError):
+        raise ValueError('reorder_threshold must be an integer')
+    if threshold < 0:
+        raise ValueError('reorder_threshold must not be negative')
+    return medicine_id, quantity, threshold
+
+
+def upsert_chunk(pharmacy, chunk, report):
+    """Validate one chunk of ``(line_number, record)`` pairs and upsert it."""
+    cleaned = {}
+    for line_number, record in chunk:
+        try:
+            medicine_id, quantity, threshold = _clean(record)
+        except ValueError as exc:
+            report.add_error(line_number, str(exc))
+            continue
+        # A medicine repeated within the chunk keeps its last quantity.
+        cleaned[medicine_id] = (line_number, quantity, threshold)
+
+    known = set(
+        Medicine.objects.filter(id__in=cleaned).values_list('id', flat=True)
+    )
+    # Rows without a reorder_threshold leave the stored one untouched.
+    rows, rows_with_threshold = [], []
+    for medicine_id, (line_number, quantity, threshold) in cleaned.items():
+        if medicine_id not in known:
+            report.add_error(line_number, f'unknown medicine_id {medicine_id}')
+            continue
+        if threshold is None:
+            rows.append(Inventory(pharmacy=pharmacy, medicine_id=medicine_id, quantity=quantity))
+        else:
+            rows_with_threshold.append(Inventory(
+                pharmacy=pharmacy, medicine_id=medicine_id,
+                quantity=quantity, reorder_threshold=threshold,
+            ))
+
+    with transaction.atomic():
+        for batch, update_fields in ((rows, ['quantity']),
+                                     (rows_with_threshold, ['quantity', 'reorder_threshold'])):
+            if batch:
+                Inventory.objects.bulk_create(
+                    batch,
+                    update_conflicts=True,
+                    unique_fields=['pharmacy', 'medicine'],
+                    update_fields=update_fields,
+                )
+    report.upserted += len(rows) + len(rows_with_threshold)
+    if rows or rows_with_threshold:
+        # bulk_create sends no post_save signals.
+        bump('availability')
+
+
+class SyncReport:
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.processed = 0
+        self.upserted = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line, error):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': error})
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'upserted': self.upserted,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors),
+        }
+
+
+def sync_inventory(pharmacy, lines, fmt, chunk_size=CHUNK_SIZE):
+    """
+    Stream ``lines`` (CSV with a header row, or NDJSON) into ``pharmacy``'s
+    inventory. Each record carries ``medicine_id``, ``quantity`` and an
+    optional ``reorder_threshold``; valid rows are upserted a chunk at a
+    time and invalid ones are reported by line number. Memory use is
+    bounded by ``chunk_size``.
+
+    Raises ``SyncError`` when the input cannot be decoded; the chunks
+    before it stay applied and are described by the error's ``report``.
+    """
+    report = SyncReport()
+    records = iter_records(lines, fmt)
+    while True:
+        try:
+            chunk = list(islice(records, chunk_size))
+        except SyncError as exc:
+            exc.report = report
+            raise
+        if not chunk:
+            return report
+        report.processed += len(chunk)
+        upsert_chunk(pharmacy, chunk, report)
@@ -0,0 +1,227 @@
+import asyncio
+import io
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from core.models import Medicine
+from core.sms import sign
+from core.synthetic import delete_dataset, generate_dataset
+
+# Endpoint pairs: the synchronous DRF view served over WSGI and its async
+# counterpart served over ASGI.
+ENDPOINTS = {
+    'search': ('/api/medicines/search/', '/async/medicines/search/'),
+    'availability': ('/api/medicines/{pk}/nearby/', '/async/medicines/{pk}/availability/'),
+    'sms_inbound': ('/sms/inbound/', '/async/sms/inbound/'),
+}
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the synchronous views served over WSGI by a fixed pool of '
+        'worker threads with their async counterparts served over ASGI, at '
+        'increasing numbers of concurrent connections. --db-latency-ms adds '
+        'a sleep to every query to stand in for a database across the '
+        'network, which is where an event loop pays off.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', default='16,64,256',
+                            help='Comma-separated concurrent connection counts')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='WSGI worker threads (e.g. gunicorn --threads)')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per endpoint and connection count')
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS),
+                            help='Endpoints to run (repeatable); default all')
+        parser.add_argument('--db-latency-ms', type=float, default=5.0)
+        parser.add_argument('--pharmacies', type=int, default=200)
+        parser.add_argument('--medicines', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        tag = f'bench{uuid.uuid4().hex[:8]}'
+        names = generate_dataset(tag, options['pharmacies'], options['medicines'], 0.1, 0)
+        self.medicine_ids = list(Medicine.objects.filter(
+            manufacturer__endswith=f' {tag}').values_list('id', flat=True))
+        self.names = names
+        self.tag = tag
+
+        latency = options['db_latency_ms'] / 1000
+
+        def sleepy(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            if sleepy not in connection.execute_wrappers:
+                connection.execute_wrappers.append(sleepy)
+
+        if latency:
+            connection_created.connect(add_latency, weak=False)
+
+        # Bypass the response cache so both paths do the same database work.
+        caches = {**settings.CACHES, 'bench-dummy': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        try:
+            with override_settings(CACHES=caches, RESPONSE_CACHE_ALIAS='bench-dummy',
+                                   THROTTLE_RATES={}, ALLOWED_HOSTS=['localhost'],
+                                   SMS_WEBHOOK_SECRET=settings.SMS_WEBHOOK_SECRET or tag):
+                wsgi, asgi = get_wsgi_application(), get_asgi_application()
+                for endpoint in options['endpoint'] or sorted(ENDPOINTS):
+                    self.stdout.write(f'{endpoint} ({options["requests"]} requests, '
+                                      f'{options["workers"]} WSGI workers, '
+                                      f'{options["db_latency_ms"]} ms per query)')
+                    for connections in map(int, options['connections'].split(',')):
+                        sync = self.run_wsgi(wsgi, endpoint, connections, options)
+                        concurrent = asyncio.run(self.run_asgi(asgi, endpoint, connections, options))
+                        self.report(connections, sync, concurrent)
+        finally:
+            connection_created.disconnect(add_latency)
+            delete_dataset(tag)
+
+    def report(self, connections, sync, concurrent):
+        gain = concurrent['throughput_rps'] / sync['throughput_rps'] if sync['throughput_rps'] else 0
+        for name, result in (('wsgi', sync), ('asgi', concurrent)):
+            self.stdout.write(
+                f'  {connections:>4} conns {name}: {result["throughput_rps"]:8.1f} req/s  '
+                f'p50 {result["p50_ms"]:8.2f} ms  p99 {result["p99_ms"]:8.2f} ms  '
+                f'errors {result["errors"]}'
+            )
+        self.stdout.write(f'  {connections:>4} conns asgi/wsgi throughput: {gain:.2f}x')
+
+    def build_request(self, endpoint, use_async, rng):
+        """Return (method, path, query string, body, content type, signature)."""
+        path = ENDPOINTS[endpoint][use_async]
+        if endpoint == 'search':
+            return 'GET', path, urlencode({'name': rng.choice(self.names)[:5]}), b'', '', ''
+        if endpoint == 'availability':
+            query = urlencode({'lat': rng.uniform(8, 35), 'lng': rng.uniform(68, 97), 'k': 5})
+            return 'GET', path.format(pk=rng.choice(self.medicine_ids)), query, b'', '', ''
+        body = urlencode({
+            'phone_number': f'9{rng.randint(0, 10**9 - 1):09d}',
+            'medicine_name': rng.choice(self.names),
+            'location': f'Bench {self.tag}',
+        }).encode()
+        return 'POST', path, '', body, 'application/x-www-form-urlencoded', sign(body)
+
+    def run_wsgi(self, application, endpoint, connections, options):
+        """
+        ``connections`` clients each keep one request in flight against a
+        pool of ``--workers`` threads, so latency includes queueing.
+        """
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        remaining = iter(range(options['requests']))
+
+        def call(environ):
+            statuses = []
+            body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                b''.join(body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            return int(statuses[0].split()[0])
+
+        def client(pool, seed):
+            rng = random.Random(seed)
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                method, path, query, body, content_type, signature = self.build_request(endpoint, False, rng)
+                environ = {
+                    'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query,
+                    'SCRIPT_NAME': '', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+                    'HTTP_HOST': 'localhost', 'HTTP_X_SMS_SIGNATURE': signature, 'CONTENT_TYPE': content_type,
+                    'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+                    'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+                    'wsgi.version': (1, 0), 'wsgi.multithread': True,
+                    'wsgi.multiprocess': False, 'wsgi.run_once': False,
+                }
+                start = time.perf_counter()
+                status = pool.submit(call, environ).result()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    errors[0] += status >= 400
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['workers']) as pool:
+            clients = [threading.Thread(target=client, args=(pool, i)) for i in range(connections)]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+        return summarize(latencies, errors[0], time.perf_counter() - start)
+
+    async def run_asgi(self, application, endpoint, connections, options):
+        latencies, errors = [], 0
+        remaining = iter(range(options['requests']))
+
+        async def call(method, path, query, body, content_type, signature):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': method, 'scheme': 'http', 'path': path,
+                'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'localhost'), (b'content-type', content_type.encode()),
+                            (b'content-length', str(len(body)).encode()),
+                            (b'x-sms-signature', signature.encode())],
+                'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            }
+            pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            response = {}
+
+            async def receive():
+                if pending:
+                    return pending.pop()
+                # Never disconnect; Django cancels this wait once it responds.
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+
+            await application(scope, receive, send)
+            return response['status']
+
+        async def client(seed):
+            nonlocal errors
+            rng = random.Random(seed)
+            while next(remaining, None) is not None:
+                request = self.build_request(endpoint, True, rng)
+                start = time.perf_counter()
+                status = await call(*request)
+                latencies.append(time.perf_counter() - start)
+                errors += status >= 400
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(connections)))
+        return summarize(latencies, errors, time.perf_counter() - start)
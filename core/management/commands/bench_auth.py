@@ -0,0 +1,85 @@
+import base64
+import statistics
+import time
+import uuid
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.request import Request
+
+from core import tokens
+from core.authentication import SignedTokenAuthentication
+from core.models import User
+
+PASSWORD = 'Bench-pass-1234'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the per-request cost of authenticating an API call with '
+        'HTTP Basic (password hash per call), a database session and a '
+        'signed bearer token: latency and queries of resolving request.user.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        username = f'bench-auth-{uuid.uuid4().hex[:8]}'
+        user = User.objects.create_user(username=username, password=PASSWORD)
+        client = Client()
+        client.force_login(user)
+        session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+        access = tokens.issue(user)['access']
+        basic = base64.b64encode(f'{username}:{PASSWORD}'.encode()).decode()
+        factory = RequestFactory()
+
+        def with_session():
+            request = factory.get('/')
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+            SessionMiddleware(lambda request: None).process_request(request)
+            AuthenticationMiddleware(lambda request: None).process_request(request)
+            return request
+
+        schemes = [
+            ('basic', BasicAuthentication(),
+             lambda: factory.get('/', HTTP_AUTHORIZATION=f'Basic {basic}')),
+            ('session', SessionAuthentication(), with_session),
+            ('token', SignedTokenAuthentication(),
+             lambda: factory.get('/', HTTP_AUTHORIZATION=f'Bearer {access}')),
+        ]
+        try:
+            for name, authenticator, build in schemes:
+                timings, queries = self.measure(authenticator, build, user, options['requests'])
+                timings.sort()
+                self.stdout.write(
+                    f'{name:>8}: mean {statistics.fmean(timings) * 1000:8.3f} ms  '
+                    f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:8.3f} ms  '
+                    f'{queries / len(timings):.1f} queries/request'
+                )
+        finally:
+            import_module(settings.SESSION_ENGINE).SessionStore(session_key).delete()
+            user.delete()
+
+    def measure(self, authenticator, build, user, count):
+        timings, tally = [], [0]
+
+        def count_queries(execute, sql, params, many, context):
+            tally[0] += 1
+            return execute(sql, params, many, context)
+
+        for _ in range(count):
+            request = Request(build(), authenticators=[authenticator])
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_queries):
+                authenticated = request.user
+            timings.append(time.perf_counter() - start)
+            if authenticated.pk != user.pk:
+                raise CommandError(f'{type(authenticator).__name__} did not authenticate')
+        return timings, tally[0]
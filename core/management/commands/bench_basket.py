@@ -0,0 +1,77 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.basket import resolve_basket
+from core.models import Inventory, Medicine
+from core.synthetic import delete_dataset, generate_dataset
+
+
+def per_item(items):
+    """What clients do today: one lookup per medicine, intersected locally."""
+    complete = None
+    for medicine_id, quantity in items:
+        pharmacies = set(Inventory.objects.filter(
+            medicine_id=medicine_id, quantity__gte=quantity
+        ).values_list('pharmacy_id', flat=True))
+        complete = pharmacies if complete is None else complete & pharmacies
+    return complete or set()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare resolving medicine baskets with one inventory query and '
+        'bitmaps against one query per medicine, for growing basket sizes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pharmacies', type=int, default=1000)
+        parser.add_argument('--medicines', type=int, default=500)
+        parser.add_argument('--density', type=float, default=0.6)
+        parser.add_argument('--sizes', default='2,5,20,50,200',
+                            help='Comma-separated basket sizes')
+        parser.add_argument('--baskets', type=int, default=20, help='Baskets per size')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        tag = f'bench{uuid.uuid4().hex[:8]}'
+        generate_dataset(tag, options['pharmacies'], options['medicines'], options['density'], 0,
+                         options['seed'])
+        rng = random.Random(options['seed'])
+        medicine_ids = list(Medicine.objects.filter(manufacturer__endswith=f' {tag}')
+                            .values_list('id', flat=True))
+        try:
+            for size in map(int, options['sizes'].split(',')):
+                baskets = [[(medicine_id, rng.randint(1, 3))
+                            for medicine_id in rng.sample(medicine_ids, min(size, len(medicine_ids)))]
+                           for _ in range(options['baskets'])]
+                resolved, resolved_queries, results = self.measure(
+                    lambda basket: resolve_basket(basket, 20.0, 80.0), baskets)
+                naive, naive_queries, naive_results = self.measure(per_item, baskets)
+                for result, expected in zip(results, naive_results):
+                    assert result['complete_count'] == len(expected)
+                covers = [len(result['cover']) for result in results if result['cover']]
+                self.stdout.write(
+                    f'{size:>4} items: basket {statistics.median(resolved):8.2f} ms '
+                    f'({resolved_queries:.0f} queries)  per-item {statistics.median(naive):8.2f} ms '
+                    f'({naive_queries:.0f} queries)  '
+                    f'complete {statistics.fmean(result["complete_count"] for result in results):.0f} '
+                    f'pharmacies, cover {max(covers, default=0)} pharmacies at most'
+                )
+        finally:
+            delete_dataset(tag)
+
+    def measure(self, resolve, baskets):
+        timings, queries, results = [], 0, []
+        for basket in baskets:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                results.append(resolve(basket))
+                timings.append((time.perf_counter() - start) * 1000)
+            queries += len(captured)
+        return timings, queries / len(baskets), results
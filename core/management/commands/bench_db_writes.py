@@ -0,0 +1,100 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from core import stock
+from core.models import Inventory, Medicine, Pharmacy, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the inventory write path (atomic stock increments) with '
+        'concurrent writers and readers against the configured database '
+        'profile. Run it once per DB_PROFILE (and with DB_SQLITE_TUNED=0 for '
+        'the untuned SQLite baseline) to compare them. Synthetic rows are '
+        'deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=250,
+                            help='Operations per thread')
+        parser.add_argument('--medicines', type=int, default=50)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create(username=f'bench-{tag}', is_pharmacy=True)
+        pharmacy = Pharmacy.objects.create(user=user, license_number=tag, store_name=f'Bench {tag}')
+        medicines = Medicine.objects.bulk_create([
+            Medicine(name=f'Bench {tag} {i}', description='', price=1, manufacturer='Bench')
+            for i in range(options['medicines'])
+        ])
+        medicine_ids = [medicine.id for medicine in medicines]
+
+        latencies = {'write': [], 'read': []}
+        failures = {'write': 0, 'read': 0}
+        lock = threading.Lock()
+
+        def write(rng):
+            stock.add_stock(pharmacy, rng.choice(medicine_ids), 1)
+
+        def read(rng):
+            list(Inventory.objects.filter(pharmacy=pharmacy, quantity__gt=0)
+                 .values_list('medicine_id', 'quantity'))
+
+        def worker(kind, operation, seed):
+            rng = random.Random(seed)
+            timings, failed = [], 0
+            try:
+                for _ in range(options['operations']):
+                    start = time.perf_counter()
+                    try:
+                        operation(rng)
+                    except Exception:
+                        failed += 1
+                        continue
+                    timings.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+                with lock:
+                    latencies[kind].extend(timings)
+                    failures[kind] += failed
+
+        threads = [threading.Thread(target=worker, args=('write', write, i))
+                   for i in range(options['writers'])]
+        threads += [threading.Thread(target=worker, args=('read', read, -i))
+                    for i in range(options['readers'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        total = sum(Inventory.objects.filter(pharmacy=pharmacy).values_list('quantity', flat=True))
+        pharmacy.delete()
+        user.delete()
+        Medicine.objects.filter(id__in=medicine_ids).delete()
+
+        profile = f'{settings.DB_PROFILE} ({connection.vendor})'
+        self.stdout.write(f'Profile {profile}, {elapsed:.2f}s wall time')
+        for kind, timings in latencies.items():
+            if not timings:
+                continue
+            timings.sort()
+            self.stdout.write(
+                f'  {kind:>5}: {len(timings) / elapsed:8.0f} ops/s  '
+                f'p50 {statistics.median(timings) * 1000:6.2f} ms  '
+                f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:6.2f} ms  '
+                f'failed {failures[kind]}'
+            )
+        expected = len(latencies['write'])
+        if total != expected:
+            self.stderr.write(f'Lost updates: stock is {total}, expected {expected}')
@@ -0,0 +1,89 @@
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.forecasting import _midnight, forecast
+from core.models import Inventory, InventoryEvent, Pharmacy
+from core.synthetic import delete_dataset, generate_dataset
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the restock forecast over a synthetic dataset with a few days '
+        'of sales history, and its peak memory for several chunk sizes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pharmacies', type=int, default=500)
+        parser.add_argument('--medicines', type=int, default=2000)
+        parser.add_argument('--density', type=float, default=0.1)
+        parser.add_argument('--sales-per-day', type=float, default=1.0,
+                            help='Average stock changes per inventory row and day')
+        parser.add_argument('--chunk-sizes', default='25,100,500')
+
+    def handle(self, *args, **options):
+        tag = f'bench{uuid.uuid4().hex[:8]}'
+        generate_dataset(tag, options['pharmacies'], options['medicines'], options['density'], 0)
+        pharmacy_ids = list(Pharmacy.objects.filter(user__username__startswith=f'{tag}-')
+                            .values_list('id', flat=True))
+        try:
+            events = self.history(pharmacy_ids, options['sales_per_day'])
+            rows = Inventory.objects.filter(pharmacy_id__in=pharmacy_ids).count()
+            self.stdout.write(f'{len(pharmacy_ids)} pharmacies, {rows} inventory rows, {events} events')
+            for chunk_size in map(int, options['chunk_sizes'].split(',')):
+                start = time.perf_counter()
+                forecast(chunk_size=chunk_size, pharmacy_ids=pharmacy_ids)
+                elapsed = time.perf_counter() - start
+                # Tracing slows Python down, so memory gets a run of its own.
+                tracemalloc.start()
+                forecast(chunk_size=chunk_size, pharmacy_ids=pharmacy_ids)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f'  chunk {chunk_size:>5} pharmacies  {elapsed:7.2f} s  '
+                    f'{rows / elapsed:>9,.0f} rows/s  peak {peak / 2**20:7.1f} MiB'
+                )
+        finally:
+            InventoryEvent.objects.filter(pharmacy_id__in=pharmacy_ids).delete()
+            delete_dataset(tag)
+            InventoryEvent.objects.filter(pharmacy_id__in=pharmacy_ids).delete()
+
+    def history(self, pharmacy_ids, sales_per_day):
+        """Replace the rows' insert events with a random walk over the retained days."""
+        InventoryEvent.objects.filter(pharmacy_id__in=pharmacy_ids).delete()
+        rng = random.Random(0)
+        today = timezone.localdate()
+        rows = list(Inventory.objects.filter(pharmacy_id__in=pharmacy_ids).values_list(
+            'pharmacy_id', 'medicine_id', 'quantity'))
+        levels = [quantity + rng.randint(0, 50) for _, _, quantity in rows]
+        total = 0
+        for offset in range(settings.INVENTORY_EVENT_RETENTION_DAYS - 1, 0, -1):
+            midnight = _midnight(today - timedelta(days=offset))
+            changes = []
+            for position, (pharmacy_id, medicine_id, _) in enumerate(rows):
+                for _ in range(int(rng.expovariate(1 / sales_per_day) + 0.5)):
+                    changes.append((rng.randint(0, 86399), position, pharmacy_id, medicine_id))
+            # Ids have to follow created_at, as they do for trigger-written events.
+            changes.sort()
+            batch = []
+            for second, position, pharmacy_id, medicine_id in changes:
+                # Mostly sales, now and then a delivery.
+                if rng.random() < 0.9:
+                    levels[position] = max(levels[position] - rng.randint(1, 5), 0)
+                else:
+                    levels[position] += 50
+                batch.append(InventoryEvent(
+                    pharmacy_id=pharmacy_id, medicine_id=medicine_id, quantity=levels[position],
+                    created_at=midnight + timedelta(seconds=second),
+                ))
+            InventoryEvent.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+            total += len(batch)
+        return total
@@ -0,0 +1,86 @@
+import difflib
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.fuzzy import FuzzyMatcher, normalize
+from core.synthetic import medicine_name
+
+
+def misspell(name, typos, rng):
+    """Apply ``typos`` random edits to the first word of ``name``."""
+    word, _, rest = name.lower().partition(' ')
+    for _ in range(typos):
+        position = rng.randrange(len(word))
+        edit = rng.choice(('insert', 'delete', 'substitute', 'transpose'))
+        if edit == 'insert':
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position:]
+        elif edit == 'delete' and len(word) > 3:
+            word = word[:position] + word[position + 1:]
+        elif edit == 'substitute':
+            word = word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+        elif position < len(word) - 1:
+            word = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    # Users often leave the strength out.
+    return word if rng.random() < 0.5 else f'{word} {rest}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the fuzzy name index over a synthetic catalogue and measure '
+        'lookup latency and accuracy for misspelled queries, against a '
+        'linear difflib scan on a sample.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--names', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--typos', type=int, default=1, help='Edits per query')
+        parser.add_argument('--baseline-queries', type=int, default=20,
+                            help='Queries to time the difflib scan with (0 to skip)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = [medicine_name(rng) for _ in range(options['names'])]
+        matcher = FuzzyMatcher()
+        start = time.perf_counter()
+        matcher.sync_names(enumerate(names))
+        self.stdout.write(
+            f'index: {len(names)} names, {len(matcher.names.postings)} trigrams, '
+            f'{matcher.names.size} postings, built in {time.perf_counter() - start:.2f} s'
+        )
+
+        targets = [rng.randrange(len(names)) for _ in range(options['queries'])]
+        queries = [misspell(names[target], options['typos'], rng) for target in targets]
+        timings, top1, top5 = [], 0, 0
+        for query, target in zip(queries, targets):
+            start = time.perf_counter()
+            matches = matcher.match(query, 5)
+            timings.append(time.perf_counter() - start)
+            # Synthetic names repeat, so any id with the right name counts.
+            found = [normalize(names[medicine_id]) for _, medicine_id in matches]
+            expected = normalize(names[target])
+            expected_word = expected.split()[0]
+            top1 += bool(found) and found[0].split()[0] == expected_word
+            top5 += any(name.split()[0] == expected_word for name in found)
+        timings.sort()
+        self.stdout.write(
+            f'fuzzy: {len(queries)} queries with {options["typos"]} typo(s): '
+            f'p50 {timings[len(timings) // 2] * 1000:.2f} ms  '
+            f'p99 {timings[int(len(timings) * 0.99) - 1] * 1000:.2f} ms  '
+            f'mean {statistics.fmean(timings) * 1000:.2f} ms  '
+            f'top-1 {top1 / len(queries):.1%}  top-5 {top5 / len(queries):.1%}'
+        )
+
+        sample = queries[:options['baseline_queries']]
+        if sample:
+            lowered = [name.lower() for name in names]
+            start = time.perf_counter()
+            for query in sample:
+                difflib.get_close_matches(query, lowered, n=5, cutoff=0.6)
+            elapsed = (time.perf_counter() - start) / len(sample)
+            self.stdout.write(f'difflib linear scan: {elapsed * 1000:.1f} ms per query')
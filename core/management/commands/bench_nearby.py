@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.geo import nearby_in_stock, nearby_in_stock_scan
+from core.models import Inventory, Medicine, Pharmacy, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the spatial nearby-pharmacy lookup against a full scan on '
+        'synthetic data. All rows are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pharmacies', type=int, default=20000)
+        parser.add_argument('--in-stock', type=float, default=0.5,
+                            help='Fraction of pharmacies stocking the medicine')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('-k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            medicine_id = self._populate(rng, options['pharmacies'], options['in_stock'])
+            points = [(rng.uniform(8, 35), rng.uniform(68, 97))
+                      for _ in range(options['queries'])]
+            for label, lookup in (('index', nearby_in_stock), ('scan', nearby_in_stock_scan)):
+                start = time.perf_counter()
+                for lat, lng in points:
+                    lookup(medicine_id, lat, lng, options['k'])
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f'{label:>5}: {elapsed / len(points) * 1000:.2f} ms/query '
+                    f'over {options["pharmacies"]} pharmacies'
+                )
+            lat, lng = points[0]
+            if nearby_in_stock(medicine_id, lat, lng, options['k']) != \
+                    nearby_in_stock_scan(medicine_id, lat, lng, options['k']):
+                self.stderr.write('Index and scan results differ')
+            transaction.set_rollback(True)
+
+    def _populate(self, rng, count, in_stock):
+        medicine = Medicine.objects.create(
+            name='Benchmark medicine', description='', price=1, manufacturer='Bench'
+        )
+        users = User.objects.bulk_create([
+            User(username=f'bench-nearby-{i}', is_pharmacy=True) for i in range(count)
+        ])
+        # India-sized bounding box, roughly where the service operates.
+        pharmacies = Pharmacy.objects.bulk_create([
+            Pharmacy(user=user, license_number=str(i), store_name=f'Store {i}',
+                     latitude=rng.uniform(8, 35), longitude=rng.uniform(68, 97))
+            for i, user in enumerate(users)
+        ])
+        Inventory.objects.bulk_create([
+            Inventory(pharmacy=pharmacy, medicine=medicine, quantity=rng.randint(1, 50))
+            for pharmacy in pharmacies if rng.random() < in_stock
+        ])
+        return medicine.id
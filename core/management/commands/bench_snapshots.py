@@ -0,0 +1,86 @@
+import gzip
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Inventory, Medicine
+from core.serializers import InventorySerializer, MedicineSerializer
+from core.shaping import serialize_values, shape_queryset
+from core.snapshots import CODECS, build_snapshot, read_snapshot, snapshot_path
+from core.synthetic import delete_dataset, generate_dataset
+
+SERIALIZERS = {'medicines': (Medicine, MedicineSerializer), 'inventory': (Inventory, InventorySerializer)}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare exporting the whole catalogue and inventory as DRF JSON with '
+        'the columnar snapshots: generation time and size, raw and gzipped, '
+        'plus the time of an incremental rebuild after a few stock changes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pharmacies', type=int, default=200)
+        parser.add_argument('--medicines', type=int, default=5000)
+        parser.add_argument('--density', type=float, default=0.1)
+        parser.add_argument('--changes', type=int, default=50,
+                            help='Inventory rows to change before the incremental rebuild')
+
+    def handle(self, *args, **options):
+        tag = f'bench{uuid.uuid4().hex[:8]}'
+        generate_dataset(tag, options['pharmacies'], options['medicines'], options['density'], 0)
+        try:
+            with tempfile.TemporaryDirectory() as directory, \
+                    override_settings(SNAPSHOT_DIR=directory):
+                for name in SERIALIZERS:
+                    self.compare(name)
+                self.incremental(tag, options['changes'])
+        finally:
+            delete_dataset(tag)
+
+    def timed(self, function):
+        start = time.perf_counter()
+        result = function()
+        return result, (time.perf_counter() - start) * 1000
+
+    def report(self, label, milliseconds, body):
+        self.stdout.write(
+            f'  {label:<22} {milliseconds:9.1f} ms  {len(body):>11,} bytes  '
+            f'gzip {len(gzip.compress(body, 6)):>11,} bytes'
+        )
+
+    def compare(self, name):
+        model, serializer_class = SERIALIZERS[name]
+        queryset = model.objects.order_by('id')
+        self.stdout.write(f'{name} ({queryset.count()} rows)')
+        body, elapsed = self.timed(lambda: JSONRenderer().render(
+            serializer_class(shape_queryset(queryset, serializer_class), many=True).data))
+        self.report('json (serializer)', elapsed, body)
+        body, elapsed = self.timed(lambda: JSONRenderer().render(
+            serialize_values(queryset, serializer_class)))
+        self.report('json (values)', elapsed, body)
+        for compression in sorted(CODECS):
+            _, elapsed = self.timed(lambda: build_snapshot(name, compression, force=True))
+            body = snapshot_path(name).read_bytes()
+            self.report(f'columnar ({compression})', elapsed, body)
+        _, elapsed = self.timed(lambda: read_snapshot(snapshot_path(name)))
+        self.stdout.write(f'  {f"decode ({compression})":<22} {elapsed:9.1f} ms')
+
+    def incremental(self, tag, changes):
+        build_snapshot('inventory', 'zlib', force=True)
+        rows = list(Inventory.objects.filter(pharmacy__user__username__startswith=f'{tag}-')
+                    .order_by('?')[:changes])
+        for row in rows:
+            row.quantity += 1
+            row.save(update_fields=['quantity'])
+        footer, elapsed = self.timed(lambda: build_snapshot('inventory', 'zlib'))
+        self.stdout.write(
+            f'inventory incremental rebuild after {len(rows)} changes: {elapsed:.1f} ms, '
+            f'{footer["reused_row_groups"]}/{len(footer["row_groups"])} row groups reused'
+        )
+        _, elapsed = self.timed(lambda: build_snapshot('inventory', 'zlib', force=True))
+        self.stdout.write(f'inventory full rebuild: {elapsed:.1f} ms')
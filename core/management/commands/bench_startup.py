@@ -0,0 +1,73 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Run in a fresh interpreter per sample so nothing is imported yet: time
+# loading the WSGI application, then two requests to the same path.
+WORKER = '''
+import io, json, sys, time
+start = time.perf_counter()
+from pharmareach.wsgi import application
+loaded = time.perf_counter()
+
+def call(path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+    }
+    statuses = []
+    begin = time.perf_counter()
+    body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(body)
+    return statuses[0], time.perf_counter() - begin
+
+first_status, first = call(sys.argv[1])
+_, second = call(sys.argv[1])
+print(json.dumps({
+    'startup_ms': (loaded - start) * 1000,
+    'first_ms': first * 1000,
+    'second_ms': second * 1000,
+    'status': first_status,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how long a fresh worker takes to load the WSGI application '
+        'and to answer its first and second request, with the API docs '
+        'enabled and disabled.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paths', default='/,/swagger.json',
+                            help='Comma-separated paths to request')
+        parser.add_argument('--runs', type=int, default=5, help='Fresh workers per case')
+
+    def handle(self, *args, **options):
+        for docs in ('True', 'False'):
+            for path in options['paths'].split(','):
+                samples = [self.sample(path, docs) for _ in range(options['runs'])]
+                median = {key: statistics.median(sample[key] for sample in samples)
+                          for key in ('startup_ms', 'first_ms', 'second_ms', 'modules')}
+                self.stdout.write(
+                    f'docs={docs:<5} {path:<16} {samples[0]["status"]:<16} '
+                    f'startup {median["startup_ms"]:7.1f} ms  first request '
+                    f'{median["first_ms"]:7.1f} ms  second {median["second_ms"]:7.1f} ms  '
+                    f'{median["modules"]:.0f} modules'
+                )
+
+    def sample(self, path, docs):
+        env = dict(os.environ, API_DOCS_ENABLED=docs, DJANGO_SETTINGS_MODULE='pharmareach.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER, path],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
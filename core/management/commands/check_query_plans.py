@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.query_plans import CANONICAL_QUERIES, explain, full_scans
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the app's canonical queries and fail if any of them falls "
+        'back to a full table scan'
+    )
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, build in CANONICAL_QUERIES.items():
+            plan = explain(build())
+            scanned = full_scans(plan)
+            if scanned:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'FULL SCAN  {name}: {", ".join(scanned)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'ok         {name}'))
+            if options['verbosity'] > 1 or scanned:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+        if failures:
+            raise CommandError(f'{len(failures)} queries use full table scans')
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.inventory_log import compact
+
+
+class Command(BaseCommand):
+    help = (
+        'Compact the inventory change log: events older than the retention '
+        'period are reduced to the latest per inventory row.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=float,
+                            help='Defaults to INVENTORY_EVENT_RETENTION_DAYS')
+
+    def handle(self, *args, **options):
+        retention = options['retention_days']
+        removed = compact(None if retention is None else timedelta(days=retention))
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} inventory events'))
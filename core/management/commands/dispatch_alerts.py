@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.alerts import dispatch_pending, get_alert_sink
+
+
+class Command(BaseCommand):
+    help = 'Deliver open low-stock alerts to the configured sink in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to sleep when nothing is pending')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as the queue is drained')
+
+    def handle(self, *args, **options):
+        sink = get_alert_sink()
+        total = 0
+        while True:
+            delivered = dispatch_pending(options['batch_size'], sink)
+            total += delivered
+            if options['once']:
+                break
+            if not delivered:
+                time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Delivered {total} alerts'))
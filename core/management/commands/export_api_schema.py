@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.api_docs import FORMATS, render_schemas, reset, schema_path
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the OpenAPI schema into API_SCHEMA_DIR so workers serve it '
+        'from disk instead of generating it. Run on every deploy, like '
+        'collectstatic; --clear removes the files again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true',
+                            help='Remove the exported schema and fall back to generating it')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            for fmt in FORMATS:
+                schema_path(fmt).unlink(missing_ok=True)
+            self.stdout.write('Removed the exported schema')
+            return
+        Path(settings.API_SCHEMA_DIR).mkdir(parents=True, exist_ok=True)
+        for fmt, body in render_schemas().items():
+            path = schema_path(fmt)
+            # Written aside and renamed, so a worker never reads half a file.
+            partial = path.with_suffix(path.suffix + '.tmp')
+            partial.write_bytes(body)
+            partial.replace(path)
+            self.stdout.write(f'Wrote {path} ({len(body)} bytes)')
+        reset()
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.forecasting import forecast
+
+
+class Command(BaseCommand):
+    help = (
+        'Forecast daily demand for every inventory row from its stock history '
+        'and SMS requests, and recompute restock recommendations'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Pharmacies per chunk (default RESTOCK_CHUNK_PHARMACIES)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = forecast(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {written} recommendations in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Inventory, Medicine, Pharmacy
+
+
+class Command(BaseCommand):
+    help = (
+        'Create zero-quantity inventory rows for medicines a pharmacy has no '
+        'row for. Inventory is sparse, so this is only needed by consumers '
+        'that want dense rows; it runs in small chunks so it can be left '
+        'running alongside live traffic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pharmacy', type=int, action='append',
+                            help='Limit to these pharmacy ids (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        pharmacies = Pharmacy.objects.order_by('id').values_list('id', flat=True)
+        if options['pharmacy']:
+            pharmacies = pharmacies.filter(id__in=options['pharmacy'])
+        chunk_size = options['chunk_size']
+        created = 0
+        for pharmacy_id in pharmacies.iterator():
+            last_id = 0
+            while True:
+                medicine_ids = list(
+                    Medicine.objects.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', flat=True)[:chunk_size]
+                )
+                if not medicine_ids:
+                    break
+                last_id = medicine_ids[-1]
+                existing = set(Inventory.objects.filter(
+                    pharmacy_id=pharmacy_id, medicine_id__in=medicine_ids
+                ).values_list('medicine_id', flat=True))
+                rows = [
+                    Inventory(pharmacy_id=pharmacy_id, medicine_id=medicine_id, quantity=0)
+                    for medicine_id in medicine_ids if medicine_id not in existing
+                ]
+                Inventory.objects.bulk_create(rows, ignore_conflicts=True)
+                created += len(rows)
+                if options['pause']:
+                    time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Created {created} inventory rows'))
@@ -0,0 +1,52 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.sms import claim_batch, get_sms_gateway, process_batch
+
+
+def run_once(batch_size, gateway):
+    close_old_connections()
+    try:
+        batch = claim_batch(batch_size)
+        return process_batch(batch, gateway) if batch else None
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Answer pending SMS requests with a pool of concurrent workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as the queue is drained')
+
+    def handle(self, *args, **options):
+        sent = asyncio.run(self.serve(options))
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} replies'))
+
+    async def serve(self, options):
+        gateway = get_sms_gateway()
+        # Each batch runs in its own thread (and DB connection), so the
+        # workers claim and answer batches in parallel.
+        step = sync_to_async(run_once, thread_sensitive=False)
+
+        async def worker():
+            sent = 0
+            while True:
+                result = await step(options['batch_size'], gateway)
+                if result is None:
+                    if options['once']:
+                        return sent
+                    await asyncio.sleep(options['poll_interval'])
+                    continue
+                sent += result
+
+        totals = await asyncio.gather(*(worker() for _ in range(options['workers'])))
+        return sum(totals)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Inventory
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete zero-quantity inventory rows in chunks. A missing row already '
+        'means zero stock, so these only take up space. Rows with a reorder '
+        'threshold are kept: they carry the pharmacy\'s low-stock setting.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        deleted = 0
+        while True:
+            ids = list(
+                Inventory.objects.filter(quantity=0, reorder_threshold=0)
+                .values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            count, _ = Inventory.objects.filter(id__in=ids, quantity=0, reorder_threshold=0).delete()
+            deleted += count
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} empty inventory rows'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.availability import reconcile
+from core.cache import bump
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the MedicineAvailability summary from Inventory and fix '
+        'rows that drifted. With --check, only report them (and fail if any).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Report drift without fixing it; exit non-zero on drift')
+
+    def handle(self, *args, **options):
+        drifted = reconcile(fix=not options['check'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('Availability summary is up to date'))
+            return
+        sample = ', '.join(map(str, drifted[:20]))
+        if options['check']:
+            raise CommandError(f'{len(drifted)} medicines have drifted totals: {sample}')
+        bump('catalogue', 'availability')
+        self.stdout.write(self.style.SUCCESS(f'Fixed {len(drifted)} medicines: {sample}'))
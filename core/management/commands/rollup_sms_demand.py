@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.sms_demand import archive, roll_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold new SMS requests into the hourly and daily demand rollups, '
+        'and with --archive move expired requests to archive files'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--poll-interval', type=float, default=30.0,
+                            help='Seconds to sleep when nothing is new')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as the rollups have caught up')
+        parser.add_argument('--archive', action='store_true',
+                            help='Archive expired requests after catching up')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            folded = roll_up(options['batch_size'])
+            total += folded
+            if folded:
+                continue
+            if options['archive']:
+                archived = archive()
+                if archived:
+                    self.stdout.write(f'Archived {archived} requests')
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {total} requests'))
@@ -0,0 +1,205 @@
+import json
+import random
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from core.models import User
+from core.synthetic import delete_dataset, generate_dataset
+
+PASSWORD = 'Bench-pass-1234'
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Scenario:
+    """One endpoint to drive: ``request(client, rng)`` returns a response."""
+
+    def __init__(self, name, request, login=None, expected=(200,)):
+        self.name = name
+        self.request = request
+        self.login = login
+        self.expected = expected
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic dataset, drive the main endpoints in-process '
+        'from concurrent clients and report latency percentiles, throughput '
+        'and query counts as JSON. With --baseline, fail on regressions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pharmacies', type=int, default=100)
+        parser.add_argument('--medicines', type=int, default=2000)
+        parser.add_argument('--density', type=float, default=0.1,
+                            help='Fraction of pharmacy x medicine pairs in stock')
+        parser.add_argument('--sms', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per endpoint (registration/login use a tenth)')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--only', action='append',
+                            help='Run only these scenarios (repeatable)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--baseline', help='Compare against a previous report')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative p95 / query count increase')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the generated rows afterwards')
+
+    def handle(self, *args, **options):
+        tag = f'bench{uuid.uuid4().hex[:8]}'
+        start = time.perf_counter()
+        names = generate_dataset(tag, options['pharmacies'], options['medicines'],
+                                 options['density'], options['sms'], options['seed'])
+        generated_in = time.perf_counter() - start
+        pharmacy_user = User.objects.filter(username=f'{tag}-pharmacy-0').first()
+        User.objects.create_user(username=f'{tag}-login', password=PASSWORD)
+
+        try:
+            scenarios = self.scenarios(tag, names, pharmacy_user)
+            if options['only']:
+                scenarios = [s for s in scenarios if s.name in options['only']]
+            results = {}
+            # Every simulated client shares one address; measure the views,
+            # not the rate limits.
+            with override_settings(THROTTLE_RATES={}):
+                for scenario in scenarios:
+                    count = options['requests']
+                    if scenario.name in ('register', 'login'):
+                        count = max(1, count // 10)
+                    results[scenario.name] = self.drive(scenario, count, options)
+                    self.stderr.write(
+                        f'{scenario.name:>22}: p95 {results[scenario.name]["p95_ms"]:8.2f} ms, '
+                        f'{results[scenario.name]["throughput_rps"]:8.1f} req/s'
+                    )
+        finally:
+            if not options['keep']:
+                delete_dataset(tag)
+
+        report = {
+            'scale': {key: options[key] for key in
+                      ('pharmacies', 'medicines', 'density', 'sms', 'requests', 'concurrency')},
+            'vendor': connection.vendor,
+            'generated_in_s': round(generated_in, 3),
+            'endpoints': results,
+        }
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(text + '\n')
+        self.stdout.write(text)
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'])
+
+    def scenarios(self, tag, names, pharmacy_user):
+        def api_search(client, rng):
+            return client.get('/api/medicines/search/', {'name': rng.choice(names)[:rng.randint(3, 6)]})
+
+        def html_search(client, rng):
+            return client.get('/medicine/search/', {'name': rng.choice(names).split()[0][:5]})
+
+        def pharmacy_inventory(client, rng):
+            return client.get('/pharmacy/inventory/')
+
+        def register(client, rng):
+            return client.post('/register/', {
+                'username': f'{tag}-reg-{uuid.uuid4().hex[:12]}',
+                'password': PASSWORD, 'confirm_password': PASSWORD,
+                'email': 'bench@example.com', 'is_pharmacy': False,
+            })
+
+        def login(client, rng):
+            return client.post('/login/', {'username': f'{tag}-login', 'password': PASSWORD})
+
+        return [
+            Scenario('api_medicine_search', api_search),
+            Scenario('html_medicine_search', html_search),
+            Scenario('pharmacy_inventory', pharmacy_inventory, login=pharmacy_user),
+            Scenario('register', register, expected=(201,)),
+            Scenario('login', login),
+        ]
+
+    def drive(self, scenario, count, options):
+        latencies, queries = [], []
+        errors = 0
+        lock = threading.Lock()
+        counter = iter(range(count))
+
+        def count_queries(tally):
+            def wrapper(execute, sql, params, many, context):
+                tally[0] += 1
+                return execute(sql, params, many, context)
+            return wrapper
+
+        def worker(seed):
+            nonlocal errors
+            rng = random.Random(seed)
+            client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+            if scenario.login is not None:
+                client.force_login(scenario.login)
+            local_latencies, local_queries, local_errors = [], [], 0
+            try:
+                while True:
+                    with lock:
+                        if next(counter, None) is None:
+                            break
+                    tally = [0]
+                    start = time.perf_counter()
+                    with connection.execute_wrapper(count_queries(tally)):
+                        response = scenario.request(client, rng)
+                    local_latencies.append(time.perf_counter() - start)
+                    local_queries.append(tally[0])
+                    if response.status_code not in scenario.expected:
+                        local_errors += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    latencies.extend(local_latencies)
+                    queries.extend(local_queries)
+                    errors += local_errors
+
+        threads = [threading.Thread(target=worker, args=(options['seed'] + i,))
+                   for i in range(options['concurrency'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        if not latencies:
+            raise CommandError(f'{scenario.name}: no requests completed')
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean_queries': round(sum(queries) / len(queries), 2),
+        }
+
+    def compare(self, report, path, tolerance):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)['endpoints']
+        regressions = []
+        for name, result in report['endpoints'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            for metric in ('p95_ms', 'mean_queries'):
+                if result[metric] > before[metric] * (1 + tolerance) and result[metric] - before[metric] > 0.5:
+                    regressions.append(f'{name} {metric}: {before[metric]} -> {result[metric]}')
+        if regressions:
+            raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+        self.stderr.write(self.style.SUCCESS('No regressions against baseline'))
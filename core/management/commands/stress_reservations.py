@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum
+
+from core import stock
+from core.models import (
+    Inventory, Medicine, Pharmacy, StockReservation, StockReservationLine, User
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer the stock reservation API from many threads and check that no '
+        'update is lost. Creates its own pharmacy and medicines and deletes '
+        'them afterwards. On SQLite the database is switched to WAL mode. '
+        'Fails if any update is lost or any operation errors.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=200,
+                            help='Reservations attempted per thread')
+        parser.add_argument('--medicines', type=int, default=3)
+        parser.add_argument('--stock', type=int, default=2000,
+                            help='Initial quantity of each medicine')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            if connection.is_in_memory_db():
+                raise CommandError('Needs a file-backed SQLite database')
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create(username=f'stress-{tag}', is_pharmacy=True)
+        pharmacy = Pharmacy.objects.create(user=user, license_number=tag, store_name=f'Stress {tag}')
+        medicines = Medicine.objects.bulk_create([
+            Medicine(name=f'Stress {tag} {i}', description='', price=1, manufacturer='Stress')
+            for i in range(options['medicines'])
+        ])
+        medicine_ids = [medicine.id for medicine in medicines]
+        Inventory.objects.bulk_create([
+            Inventory(pharmacy=pharmacy, medicine_id=medicine_id, quantity=options['stock'])
+            for medicine_id in medicine_ids
+        ])
+
+        counts = {'reserved': 0, 'released': 0, 'rejected': 0, 'errors': 0}
+        counts_lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = dict.fromkeys(counts, 0)
+            try:
+                for _ in range(options['operations']):
+                    lines = [(medicine_id, rng.randint(1, 3))
+                             for medicine_id in rng.sample(medicine_ids, rng.randint(1, len(medicine_ids)))]
+                    try:
+                        reservation, _ = stock.reserve(pharmacy, lines, uuid.uuid4().hex)
+                    except stock.InsufficientStock:
+                        local['rejected'] += 1
+                        continue
+                    except Exception:
+                        local['errors'] += 1
+                        continue
+                    local['reserved'] += 1
+                    try:
+                        if rng.random() < 0.3:
+                            stock.release(reservation)
+                            local['released'] += 1
+                        else:
+                            stock.commit(reservation)
+                    except Exception:
+                        # e.g. "database is locked"; the reservation stays held.
+                        local['errors'] += 1
+            finally:
+                connections.close_all()
+                with counts_lock:
+                    for key, value in local.items():
+                        counts[key] += value
+
+        threads = [threading.Thread(target=worker, args=(options['seed'] + i,))
+                   for i in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        held = StockReservationLine.objects.filter(
+            reservation__pharmacy=pharmacy,
+        ).exclude(reservation__status=StockReservation.RELEASED).aggregate(total=Sum('quantity'))['total'] or 0
+        remaining = Inventory.objects.filter(pharmacy=pharmacy).aggregate(total=Sum('quantity'))['total']
+        expected = options['stock'] * len(medicine_ids) - held
+        attempts = options['threads'] * options['operations']
+
+        self.stdout.write(
+            f'{attempts} attempts in {elapsed:.2f}s ({attempts / elapsed:.0f} ops/s): '
+            f'{counts["reserved"]} reserved, {counts["released"]} released, '
+            f'{counts["rejected"]} out of stock, {counts["errors"]} errors'
+        )
+        pharmacy.delete()
+        user.delete()
+        Medicine.objects.filter(id__in=medicine_ids).delete()
+        if remaining != expected:
+            raise CommandError(f'Lost updates: {remaining} units left, expected {expected}')
+        if counts['errors']:
+            raise CommandError(f'{counts["errors"]} operations failed')
+        self.stdout.write(self.style.SUCCESS(f'No lost updates ({remaining} units left)'))
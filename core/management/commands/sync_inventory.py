@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.inventory_sync import CHUNK_SIZE, FORMATS, SyncError, detect_format, sync_inventory
+from core.models import Pharmacy
+
+
+class Command(BaseCommand):
+    help = 'Upsert a pharmacy inventory from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pharmacy_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            pharmacy = Pharmacy.objects.get(pk=options['pharmacy_id'])
+        except Pharmacy.DoesNotExist:
+            raise CommandError(f'Pharmacy {options["pharmacy_id"]} does not exist')
+        fmt = options['format'] or detect_format(filename=options['path'])
+        if fmt is None:
+            raise CommandError('Cannot infer the format; pass --format')
+
+        # Read bytes so that a bad encoding is reported with its line number.
+        with open(options['path'], 'rb') as lines:
+            try:
+                report = sync_inventory(pharmacy, lines, fmt, options['chunk_size'])
+            except SyncError as exc:
+                self.stdout.write(json.dumps(exc.report.as_dict(), indent=2))
+                raise CommandError(f'Line {exc.line}: {exc}')
+        self.stdout.write(json.dumps(report.as_dict(), indent=2))
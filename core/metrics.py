@@ -0,0 +1,120 @@
+"""
+In-process request metrics, exposed in the Prometheus text format on
+``/metrics``. Every worker process keeps its own numbers; Prometheus adds
+them up when it scrapes each worker.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+current_request = ContextVar('current_request_metrics', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serialize_time', 'render_time', 'sql')
+
+    def __init__(self, keep_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.sql = [] if keep_sql else None
+
+
+@contextmanager
+def timed(phase):
+    """Add the wall time of the block to ``phase`` of the current request."""
+    stats = current_request.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(stats, phase, getattr(stats, phase) + time.perf_counter() - start)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.histograms = {
+            'http_request_duration_seconds': defaultdict(lambda: Histogram(LATENCY_BUCKETS)),
+            'http_request_db_queries': defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS)),
+            'http_response_size_bytes': defaultdict(lambda: Histogram(SIZE_BUCKETS)),
+        }
+        self.sums = {
+            'http_request_db_seconds_total': defaultdict(float),
+            'http_request_serialize_seconds_total': defaultdict(float),
+            'http_request_render_seconds_total': defaultdict(float),
+        }
+
+    def record(self, view, method, status, duration, size, stats):
+        with self.lock:
+            self.requests[view, method, status] += 1
+            self.histograms['http_request_duration_seconds'][view].observe(duration)
+            self.histograms['http_request_db_queries'][view].observe(stats.queries)
+            self.histograms['http_response_size_bytes'][view].observe(size)
+            self.sums['http_request_db_seconds_total'][view] += stats.db_time
+            self.sums['http_request_serialize_seconds_total'][view] += stats.serialize_time
+            self.sums['http_request_render_seconds_total'][view] += stats.render_time
+
+    def reset(self):
+        self.__init__()
+
+    def render(self, extra_counters=None):
+        lines = []
+        with self.lock:
+            lines.append('# TYPE http_requests_total counter')
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'http_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}'
+                )
+            for name, series in self.histograms.items():
+                lines.append(f'# TYPE {name} histogram')
+                for view, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.total}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+            for name, series in self.sums.items():
+                lines.append(f'# TYPE {name} counter')
+                for view, total in sorted(series.items()):
+                    lines.append(f'{name}{{view="{view}"}} {total}')
+        typed = set()
+        for name, labels, value in extra_counters or ():
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} counter')
+            label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f'{name}{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
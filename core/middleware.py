@@ -0,0 +1,109 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import RequestStats, current_request, registry
+
+logger = logging.getLogger('core.slow_requests')
+
+MAX_LOGGED_QUERIES = 50
+
+
+def track_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper charging each query to the request in
+    ``current_request``. It reads the context variable rather than closing
+    over the request because async views run their queries on other
+    threads, each with its own connection, and the context travels with
+    them while a per-connection wrapper would not.
+    """
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+        if stats.sql is not None and len(stats.sql) < MAX_LOGGED_QUERIES:
+            stats.sql.append(sql)
+
+
+def install_query_tracker(connection):
+    # Outermost, so that wrappers pushed and popped by
+    # ``connection.execute_wrapper()`` blocks keep their position.
+    if track_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, track_query)
+
+
+@receiver(connection_created)
+def _connection_created(sender, connection, **kwargs):
+    install_query_tracker(connection)
+
+
+class PerformanceMiddleware:
+    """
+    Records latency, query count and time, serializer/render time and
+    response size per view into ``core.metrics.registry``. Requests slower
+    than ``METRICS_SLOW_REQUEST_MS`` are logged with their SQL.
+
+    Works in both sync and async handler chains so that async views are
+    not forced back onto a thread under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = settings.METRICS_SLOW_REQUEST_MS / 1000
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_query_tracker(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats(keep_sql=self.slow_threshold > 0)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats(keep_sql=self.slow_threshold > 0)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        if response.streaming:
+            size = 0
+        else:
+            size = len(response.content)
+        registry.record(view, request.method, response.status_code, duration, size, stats)
+
+        if self.slow_threshold and duration >= self.slow_threshold:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms\n%s',
+                request.method, request.path, view, duration * 1000,
+                stats.queries, stats.db_time * 1000, '\n'.join(stats.sql),
+            )
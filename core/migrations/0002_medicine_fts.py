@@ -0,0 +1,60 @@
+from django.db import migrations
+
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_medicine_fts USING fts5(
+        name, manufacturer,
+        content='core_medicine', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_medicine_fts_ai AFTER INSERT ON core_medicine BEGIN
+        INSERT INTO core_medicine_fts(rowid, name, manufacturer)
+        VALUES (new.id, new.name, new.manufacturer);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_medicine_fts_ad AFTER DELETE ON core_medicine BEGIN
+        INSERT INTO core_medicine_fts(core_medicine_fts, rowid, name, manufacturer)
+        VALUES ('delete', old.id, old.name, old.manufacturer);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_medicine_fts_au AFTER UPDATE ON core_medicine BEGIN
+        INSERT INTO core_medicine_fts(core_medicine_fts, rowid, name, manufacturer)
+        VALUES ('delete', old.id, old.name, old.manufacturer);
+        INSERT INTO core_medicine_fts(rowid, name, manufacturer)
+        VALUES (new.id, new.name, new.manufacturer);
+    END
+    """,
+    "INSERT INTO core_medicine_fts(core_medicine_fts) VALUES('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS core_medicine_fts_ai',
+    'DROP TRIGGER IF EXISTS core_medicine_fts_ad',
+    'DROP TRIGGER IF EXISTS core_medicine_fts_au',
+    'DROP TABLE IF EXISTS core_medicine_fts',
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        # Other databases use the portable DatabaseSearchBackend.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(FTS_SQL), run_on_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+RTREE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_pharmacy_rtree USING rtree(
+        id, min_lat, max_lat, min_lng, max_lng
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_pharmacy_rtree_ai AFTER INSERT ON core_pharmacy
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO core_pharmacy_rtree
+        VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_pharmacy_rtree_ad AFTER DELETE ON core_pharmacy BEGIN
+        DELETE FROM core_pharmacy_rtree WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_pharmacy_rtree_au AFTER UPDATE ON core_pharmacy BEGIN
+        DELETE FROM core_pharmacy_rtree WHERE id = old.id;
+        INSERT INTO core_pharmacy_rtree
+        SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END
+    """,
+    """
+    INSERT INTO core_pharmacy_rtree
+    SELECT id, latitude, latitude, longitude, longitude FROM core_pharmacy
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS core_pharmacy_rtree_ai',
+    'DROP TRIGGER IF EXISTS core_pharmacy_rtree_ad',
+    'DROP TRIGGER IF EXISTS core_pharmacy_rtree_au',
+    'DROP TABLE IF EXISTS core_pharmacy_rtree',
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        # Other databases use the (latitude, longitude) B-tree index instead.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_medicine_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pharmacy',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pharmacy',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pharmacy',
+            index=models.Index(fields=['latitude', 'longitude'], name='pharmacy_lat_lng_idx'),
+        ),
+        migrations.RunPython(run_on_sqlite(RTREE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 10:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_pharmacy_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smsrequest',
+            name='claim_token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='smsrequest',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='smsrequest',
+            index=models.Index(fields=['phone_number', 'timestamp'], name='sms_phone_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['medicine', '-quantity'], name='inventory_in_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['manufacturer'], name='medicine_manufacturer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='smsrequest',
+            index=models.Index(fields=['timestamp'], name='sms_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='smsrequest',
+            index=models.Index(condition=models.Q(('response_sent', False)), fields=['id'], name='sms_unsent_idx'),
+        ),
+    ]
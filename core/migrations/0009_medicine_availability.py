@@ -0,0 +1,164 @@
+# Generated by Django 5.2 on 2026-10-18 10:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Each in-stock inventory row (quantity > 0) counts once towards its
+# medicine's pharmacy_count and adds its quantity to total_quantity. Every
+# medicine gets a zero row on insert so readers never need an outer join.
+SQLITE_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_medicine_availability_ai AFTER INSERT ON core_medicine BEGIN
+        INSERT OR IGNORE INTO core_medicineavailability
+            (medicine_id, pharmacy_count, total_quantity, updated_at)
+        VALUES (new.id, 0, 0, datetime('now'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_inventory_availability_ai AFTER INSERT ON core_inventory
+    WHEN new.quantity > 0 BEGIN
+        INSERT INTO core_medicineavailability
+            (medicine_id, pharmacy_count, total_quantity, updated_at)
+        VALUES (new.medicine_id, 1, new.quantity, datetime('now'))
+        ON CONFLICT (medicine_id) DO UPDATE SET
+            pharmacy_count = pharmacy_count + 1,
+            total_quantity = total_quantity + excluded.total_quantity,
+            updated_at = excluded.updated_at;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_inventory_availability_ad AFTER DELETE ON core_inventory
+    WHEN old.quantity > 0 BEGIN
+        UPDATE core_medicineavailability SET
+            pharmacy_count = pharmacy_count - 1,
+            total_quantity = total_quantity - old.quantity,
+            updated_at = datetime('now')
+        WHERE medicine_id = old.medicine_id;
+    END
+    """,
+    # Also fires for the DO UPDATE branch of bulk upserts.
+    """
+    CREATE TRIGGER IF NOT EXISTS core_inventory_availability_au
+    AFTER UPDATE OF quantity, medicine_id ON core_inventory
+    WHEN old.quantity > 0 OR new.quantity > 0 BEGIN
+        UPDATE core_medicineavailability SET
+            pharmacy_count = pharmacy_count - 1,
+            total_quantity = total_quantity - old.quantity,
+            updated_at = datetime('now')
+        WHERE medicine_id = old.medicine_id AND old.quantity > 0;
+        INSERT INTO core_medicineavailability
+            (medicine_id, pharmacy_count, total_quantity, updated_at)
+        SELECT new.medicine_id, 1, new.quantity, datetime('now') WHERE new.quantity > 0
+        ON CONFLICT (medicine_id) DO UPDATE SET
+            pharmacy_count = pharmacy_count + 1,
+            total_quantity = total_quantity + excluded.total_quantity,
+            updated_at = excluded.updated_at;
+    END
+    """,
+]
+
+POSTGRESQL_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION core_medicine_availability() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO core_medicineavailability
+            (medicine_id, pharmacy_count, total_quantity, updated_at)
+        VALUES (NEW.id, 0, 0, now())
+        ON CONFLICT (medicine_id) DO NOTHING;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_medicine_availability AFTER INSERT ON core_medicine
+    FOR EACH ROW EXECUTE FUNCTION core_medicine_availability()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION core_inventory_availability() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.quantity > 0 THEN
+            UPDATE core_medicineavailability SET
+                pharmacy_count = pharmacy_count - 1,
+                total_quantity = total_quantity - OLD.quantity,
+                updated_at = now()
+            WHERE medicine_id = OLD.medicine_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.quantity > 0 THEN
+            INSERT INTO core_medicineavailability AS a
+                (medicine_id, pharmacy_count, total_quantity, updated_at)
+            VALUES (NEW.medicine_id, 1, NEW.quantity, now())
+            ON CONFLICT (medicine_id) DO UPDATE SET
+                pharmacy_count = a.pharmacy_count + 1,
+                total_quantity = a.total_quantity + EXCLUDED.total_quantity,
+                updated_at = EXCLUDED.updated_at;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_inventory_availability
+    AFTER INSERT OR DELETE OR UPDATE OF quantity, medicine_id ON core_inventory
+    FOR EACH ROW EXECUTE FUNCTION core_inventory_availability()
+    """,
+]
+
+BACKFILL_SQL = """
+    INSERT INTO core_medicineavailability
+        (medicine_id, pharmacy_count, total_quantity, updated_at)
+    SELECT m.id, COUNT(i.id), COALESCE(SUM(i.quantity), 0), CURRENT_TIMESTAMP
+    FROM core_medicine m
+    LEFT JOIN core_inventory i ON i.medicine_id = m.id AND i.quantity > 0
+    GROUP BY m.id
+"""
+
+CREATE_SQL = {
+    'sqlite': SQLITE_SQL + [BACKFILL_SQL],
+    'postgresql': POSTGRESQL_SQL + [BACKFILL_SQL],
+}
+
+DROP_SQL = {
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS core_medicine_availability_ai',
+        'DROP TRIGGER IF EXISTS core_inventory_availability_ai',
+        'DROP TRIGGER IF EXISTS core_inventory_availability_ad',
+        'DROP TRIGGER IF EXISTS core_inventory_availability_au',
+    ],
+    'postgresql': [
+        'DROP TRIGGER IF EXISTS core_medicine_availability ON core_medicine',
+        'DROP TRIGGER IF EXISTS core_inventory_availability ON core_inventory',
+        'DROP FUNCTION IF EXISTS core_medicine_availability()',
+        'DROP FUNCTION IF EXISTS core_inventory_availability()',
+    ],
+}
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        # Other databases keep the table, refreshed by rebuild_availability.
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            # No parameters, so the SQL is passed through without %-formatting.
+            schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_revoked_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicineAvailability',
+            fields=[
+                ('medicine', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='availability', serialize=False, to='core.medicine')),
+                ('pharmacy_count', models.IntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(run_for_vendor(CREATE_SQL), run_for_vendor(DROP_SQL)),
+    ]
@@ -0,0 +1,138 @@
+# Generated by Django 5.2 on 2026-10-18 10:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Django's AddField rebuilds core_inventory on SQLite, which would copy the
+# whole table and drop the availability triggers from 0009. A plain ADD
+# COLUMN with a constant default avoids both, on PostgreSQL as well.
+ADD_COLUMN_SQL = 'ALTER TABLE core_inventory ADD COLUMN reorder_threshold integer DEFAULT 0 NOT NULL'
+DROP_COLUMN_SQL = 'ALTER TABLE core_inventory DROP COLUMN reorder_threshold'
+
+# A row is low when it has a threshold and its quantity is at or below it.
+# Only transitions do any work: becoming low opens an alert (unless one is
+# already open) and leaving it resolves the open one.
+SQLITE_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_inventory_low_stock_ai AFTER INSERT ON core_inventory
+    WHEN new.reorder_threshold > 0 AND new.quantity <= new.reorder_threshold BEGIN
+        INSERT INTO core_lowstockalert
+            (inventory_id, pharmacy_id, medicine_id, quantity, threshold, created_at, claim_token)
+        VALUES (new.id, new.pharmacy_id, new.medicine_id, new.quantity,
+                new.reorder_threshold, datetime('now'), '');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_inventory_low_stock_au
+    AFTER UPDATE OF quantity, reorder_threshold ON core_inventory
+    WHEN (new.reorder_threshold > 0 AND new.quantity <= new.reorder_threshold)
+      != (old.reorder_threshold > 0 AND old.quantity <= old.reorder_threshold) BEGIN
+        INSERT INTO core_lowstockalert
+            (inventory_id, pharmacy_id, medicine_id, quantity, threshold, created_at, claim_token)
+        SELECT new.id, new.pharmacy_id, new.medicine_id, new.quantity,
+               new.reorder_threshold, datetime('now'), ''
+        WHERE new.reorder_threshold > 0 AND new.quantity <= new.reorder_threshold
+          AND NOT EXISTS (SELECT 1 FROM core_lowstockalert
+                          WHERE inventory_id = new.id AND resolved_at IS NULL);
+        UPDATE core_lowstockalert SET resolved_at = datetime('now')
+        WHERE inventory_id = new.id AND resolved_at IS NULL
+          AND NOT (new.reorder_threshold > 0 AND new.quantity <= new.reorder_threshold);
+    END
+    """,
+]
+
+POSTGRESQL_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION core_inventory_low_stock() RETURNS trigger AS $$
+    DECLARE
+        is_low boolean := NEW.reorder_threshold > 0 AND NEW.quantity <= NEW.reorder_threshold;
+    BEGIN
+        IF TG_OP = 'UPDATE'
+           AND is_low = (OLD.reorder_threshold > 0 AND OLD.quantity <= OLD.reorder_threshold) THEN
+            RETURN NULL;
+        END IF;
+        IF is_low THEN
+            -- low_stock_alert_open_uniq settles concurrent writers.
+            INSERT INTO core_lowstockalert
+                (inventory_id, pharmacy_id, medicine_id, quantity, threshold, created_at, claim_token)
+            VALUES (NEW.id, NEW.pharmacy_id, NEW.medicine_id, NEW.quantity,
+                    NEW.reorder_threshold, now(), '')
+            ON CONFLICT DO NOTHING;
+        ELSIF TG_OP = 'UPDATE' THEN
+            UPDATE core_lowstockalert SET resolved_at = now()
+            WHERE inventory_id = NEW.id AND resolved_at IS NULL;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_inventory_low_stock
+    AFTER INSERT OR UPDATE OF quantity, reorder_threshold ON core_inventory
+    FOR EACH ROW EXECUTE FUNCTION core_inventory_low_stock()
+    """,
+]
+
+CREATE_SQL = {'sqlite': SQLITE_SQL, 'postgresql': POSTGRESQL_SQL}
+
+DROP_SQL = {
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS core_inventory_low_stock_ai',
+        'DROP TRIGGER IF EXISTS core_inventory_low_stock_au',
+    ],
+    'postgresql': [
+        'DROP TRIGGER IF EXISTS core_inventory_low_stock ON core_inventory',
+        'DROP FUNCTION IF EXISTS core_inventory_low_stock()',
+    ],
+}
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            # No parameters, so the SQL is passed through without %-formatting.
+            schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_medicine_availability'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunSQL(ADD_COLUMN_SQL, DROP_COLUMN_SQL)],
+            state_operations=[
+                migrations.AddField(
+                    model_name='inventory',
+                    name='reorder_threshold',
+                    field=models.IntegerField(default=0),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LowStockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('threshold', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('claim_token', models.CharField(blank=True, max_length=32)),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_alerts', to='core.inventory')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.medicine')),
+                ('pharmacy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.pharmacy')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('delivered_at__isnull', True), ('resolved_at__isnull', True)), fields=['id'], name='low_stock_alert_pending_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('inventory',), name='low_stock_alert_open_uniq')],
+            },
+        ),
+        migrations.RunPython(run_for_vendor(CREATE_SQL), run_for_vendor(DROP_SQL)),
+    ]
@@ -0,0 +1,148 @@
+# Generated by Django 5.2 on 2026-10-18 10:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Every inventory insert, delete and change of quantity or threshold is
+# appended to core_inventoryevent. Upserts that leave a row as it was (a
+# re-sent sync file) log nothing. Moving a row to another pharmacy or
+# medicine logs a deletion of the old one.
+SQLITE_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_inventory_event_ai AFTER INSERT ON core_inventory BEGIN
+        INSERT INTO core_inventoryevent
+            (pharmacy_id, medicine_id, quantity, reorder_threshold, deleted, created_at)
+        VALUES (new.pharmacy_id, new.medicine_id, new.quantity, new.reorder_threshold,
+                FALSE, datetime('now'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_inventory_event_ad AFTER DELETE ON core_inventory BEGIN
+        INSERT INTO core_inventoryevent
+            (pharmacy_id, medicine_id, quantity, reorder_threshold, deleted, created_at)
+        VALUES (old.pharmacy_id, old.medicine_id, NULL, NULL, TRUE, datetime('now'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_inventory_event_au AFTER UPDATE ON core_inventory
+    WHEN new.quantity != old.quantity OR new.reorder_threshold != old.reorder_threshold
+      OR new.pharmacy_id != old.pharmacy_id OR new.medicine_id != old.medicine_id BEGIN
+        INSERT INTO core_inventoryevent
+            (pharmacy_id, medicine_id, quantity, reorder_threshold, deleted, created_at)
+        SELECT old.pharmacy_id, old.medicine_id, NULL, NULL, TRUE, datetime('now')
+        WHERE new.pharmacy_id != old.pharmacy_id OR new.medicine_id != old.medicine_id;
+        INSERT INTO core_inventoryevent
+            (pharmacy_id, medicine_id, quantity, reorder_threshold, deleted, created_at)
+        VALUES (new.pharmacy_id, new.medicine_id, new.quantity, new.reorder_threshold,
+                FALSE, datetime('now'));
+    END
+    """,
+]
+
+# SQLite has a single writer, so ids are handed out in commit order. On
+# PostgreSQL a transaction that took a lower id could commit after a
+# client has already read a higher one and the client would never see it.
+# Locking the pharmacy row (NO KEY UPDATE, which foreign key checks do not
+# wait for) until commit keeps each pharmacy's sequence in commit order.
+POSTGRESQL_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION core_inventory_event() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE'
+           AND NEW.quantity = OLD.quantity AND NEW.reorder_threshold = OLD.reorder_threshold
+           AND NEW.pharmacy_id = OLD.pharmacy_id AND NEW.medicine_id = OLD.medicine_id THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND (NEW.pharmacy_id != OLD.pharmacy_id
+                                                      OR NEW.medicine_id != OLD.medicine_id)) THEN
+            PERFORM 1 FROM core_pharmacy WHERE id = OLD.pharmacy_id FOR NO KEY UPDATE;
+            INSERT INTO core_inventoryevent
+                (pharmacy_id, medicine_id, quantity, reorder_threshold, deleted, created_at)
+            VALUES (OLD.pharmacy_id, OLD.medicine_id, NULL, NULL, TRUE, now());
+        END IF;
+        IF TG_OP != 'DELETE' THEN
+            PERFORM 1 FROM core_pharmacy WHERE id = NEW.pharmacy_id FOR NO KEY UPDATE;
+            INSERT INTO core_inventoryevent
+                (pharmacy_id, medicine_id, quantity, reorder_threshold, deleted, created_at)
+            VALUES (NEW.pharmacy_id, NEW.medicine_id, NEW.quantity, NEW.reorder_threshold,
+                    FALSE, now());
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_inventory_event
+    AFTER INSERT OR UPDATE OR DELETE ON core_inventory
+    FOR EACH ROW EXECUTE FUNCTION core_inventory_event()
+    """,
+]
+
+# Start the log with the current stock so replaying it from 0 rebuilds it.
+BACKFILL_SQL = """
+    INSERT INTO core_inventoryevent
+        (pharmacy_id, medicine_id, quantity, reorder_threshold, deleted, created_at)
+    SELECT pharmacy_id, medicine_id, quantity, reorder_threshold, FALSE, CURRENT_TIMESTAMP
+    FROM core_inventory
+    ORDER BY id
+"""
+
+CREATE_SQL = {
+    'sqlite': SQLITE_SQL + [BACKFILL_SQL],
+    'postgresql': POSTGRESQL_SQL + [BACKFILL_SQL],
+}
+
+DROP_SQL = {
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS core_inventory_event_ai',
+        'DROP TRIGGER IF EXISTS core_inventory_event_ad',
+        'DROP TRIGGER IF EXISTS core_inventory_event_au',
+    ],
+    'postgresql': [
+        'DROP TRIGGER IF EXISTS core_inventory_event ON core_inventory',
+        'DROP FUNCTION IF EXISTS core_inventory_event()',
+    ],
+}
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            # No parameters, so the SQL is passed through without %-formatting.
+            schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_low_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryLogFloor',
+            fields=[
+                ('pharmacy', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='inventory_log_floor', serialize=False, to='core.pharmacy')),
+                ('seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InventoryEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(blank=True, null=True)),
+                ('reorder_threshold', models.IntegerField(blank=True, null=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('medicine', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.medicine')),
+                ('pharmacy', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.pharmacy')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['pharmacy', 'id'], name='inventory_event_seq_idx'), models.Index(fields=['pharmacy', 'medicine', 'id'], name='inventory_event_row_idx')],
+            },
+        ),
+        migrations.RunPython(run_for_vendor(CREATE_SQL), run_for_vendor(DROP_SQL)),
+    ]
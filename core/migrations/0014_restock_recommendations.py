@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 11:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_sms_demand_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestockRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.FloatField()),
+                ('last_quantity', models.IntegerField()),
+                ('through', models.DateField()),
+                ('forecast', models.FloatField()),
+                ('quantity', models.IntegerField()),
+                ('days_of_cover', models.FloatField(blank=True, null=True)),
+                ('recommended_quantity', models.IntegerField(default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.medicine')),
+                ('pharmacy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='restock_recommendations', to='core.pharmacy')),
+            ],
+            options={
+                'unique_together': {('pharmacy', 'medicine')},
+            },
+        ),
+    ]
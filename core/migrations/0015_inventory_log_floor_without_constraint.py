@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 12:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_restock_recommendations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventorylogfloor',
+            name='pharmacy',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='inventory_log_floor', serialize=False, to='core.pharmacy'),
+        ),
+    ]
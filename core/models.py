@@ -1,7 +1,5 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.utils import timezone
 
 class User(AbstractUser):
@@ -13,6 +11,13 @@ class Pharmacy(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     license_number = models.CharField(max_length=50)
     store_name = models.CharField(max_length=100)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='pharmacy_lat_lng_idx'),
+        ]
     
     def __str__(self):
         return self.store_name
@@ -22,28 +27,170 @@ class Medicine(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     manufacturer = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination with ?ordering=name.
+            models.Index(fields=['name', 'id'], name='medicine_name_id_idx'),
+            models.Index(fields=['manufacturer'], name='medicine_manufacturer_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
+class MedicineSynonym(models.Model):
+    """
+    Another name for a medicine, such as a brand for a generic
+    ("Crocin" for "Paracetamol"). Fuzzy matching tries both directions.
+    """
+    alias = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return f"{self.alias} = {self.name}"
+
 class Inventory(models.Model):
+    # Inventory is sparse: a pharmacy has no row for a medicine it has never
+    # stocked, which reads as a quantity of zero.
     pharmacy = models.ForeignKey(Pharmacy, on_delete=models.CASCADE, related_name='inventory')
     medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=0)
+    # A quantity at or below this opens a LowStockAlert; 0 disables alerts.
+    reorder_threshold = models.IntegerField(default=0)
     
     class Meta:
         unique_together = ('pharmacy', 'medicine')
+        indexes = [
+            # "Who has X in stock", largest stock first (SMS replies, nearby).
+            models.Index(fields=['medicine', '-quantity'], condition=models.Q(quantity__gt=0),
+                         name='inventory_in_stock_idx'),
+        ]
     
     def __str__(self):
         return f"{self.pharmacy.store_name} - {self.medicine.name}"
 
-@receiver(post_save, sender=Pharmacy)
-def create_pharmacy_inventory(sender, instance, created, **kwargs):
-    if created:
-        Inventory.objects.bulk_create([
-            Inventory(pharmacy=instance, medicine=medicine, quantity=0)
-            for medicine in Medicine.objects.all()
-        ])
+class MedicineAvailability(models.Model):
+    """
+    Per-medicine totals over in-stock inventory rows. Database triggers on
+    ``core_inventory`` and ``core_medicine`` keep it current on every write,
+    bulk ones included (migration 0009); ``rebuild_availability``
+    reconciles it with ``Inventory``.
+    """
+    medicine = models.OneToOneField(Medicine, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='availability')
+    pharmacy_count = models.IntegerField(default=0)
+    total_quantity = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.medicine_id}: {self.pharmacy_count} pharmacies, {self.total_quantity} units"
+
+class LowStockAlert(models.Model):
+    """
+    Opened by a database trigger when an inventory row drops to its reorder
+    threshold and resolved when it is restocked above it (migration 0010).
+    At most one alert per row is open at a time. ``core.alerts`` delivers
+    open alerts in batches.
+    """
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='low_stock_alerts')
+    pharmacy = models.ForeignKey(Pharmacy, on_delete=models.CASCADE)
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE)
+    quantity = models.IntegerField()
+    threshold = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    # Set by the dispatcher while it owns the row; see core.alerts.claim_batch.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['inventory'], condition=models.Q(resolved_at__isnull=True),
+                                    name='low_stock_alert_open_uniq'),
+        ]
+        indexes = [
+            # The dispatcher's queue: open, undelivered alerts in order.
+            models.Index(fields=['id'],
+                         condition=models.Q(delivered_at__isnull=True, resolved_at__isnull=True),
+                         name='low_stock_alert_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.pharmacy_id} - {self.medicine_id}: {self.quantity} <= {self.threshold}"
+
+class InventoryEvent(models.Model):
+    """
+    Append-only change log of ``Inventory``, written by database triggers on
+    every insert, change and delete (migration 0011). The id is the sequence
+    number clients pass back as ``since``. ``core.inventory_log`` compacts
+    old events so the log stays bounded.
+    """
+    # No database constraints: deleting a pharmacy or medicine cascades to
+    # inventory, whose triggers then log deletions for rows that reference
+    # them. Compaction drops events of pharmacies that no longer exist.
+    pharmacy = models.ForeignKey(Pharmacy, on_delete=models.DO_NOTHING, db_constraint=False,
+                                 related_name='+')
+    medicine = models.ForeignKey(Medicine, on_delete=models.DO_NOTHING, db_constraint=False,
+                                 related_name='+')
+    quantity = models.IntegerField(null=True, blank=True)
+    reorder_threshold = models.IntegerField(null=True, blank=True)
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # A pharmacy's changes since a sequence number.
+            models.Index(fields=['pharmacy', 'id'], name='inventory_event_seq_idx'),
+            # Compaction: later events for the same row.
+            models.Index(fields=['pharmacy', 'medicine', 'id'], name='inventory_event_row_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.pharmacy_id} - {self.medicine_id}: {'deleted' if self.deleted else self.quantity}"
+
+class InventoryLogFloor(models.Model):
+    """
+    Highest sequence number whose deletion event compaction has dropped for
+    a pharmacy. A client that last synced below it may have missed a
+    deletion and has to start over from a full snapshot.
+    """
+    # Kept after the pharmacy is deleted, like its events: snapshot rebuilds
+    # (core.snapshots) read the highest floor of all.
+    pharmacy = models.OneToOneField(Pharmacy, on_delete=models.DO_NOTHING, db_constraint=False,
+                                    primary_key=True, related_name='inventory_log_floor')
+    seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.pharmacy_id}: {self.seq}"
+
+class RestockRecommendation(models.Model):
+    """
+    Forecast demand and suggested restock for one inventory row, written by
+    the ``forecast_restock`` job (``core.forecasting``). ``level``,
+    ``last_quantity`` and ``through`` carry the smoothing state from one
+    run to the next, so each run only reads the events since the last one.
+    """
+    pharmacy = models.ForeignKey(Pharmacy, on_delete=models.CASCADE,
+                                 related_name='restock_recommendations')
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='+')
+    # Exponentially smoothed units sold per day, before the SMS trend.
+    level = models.FloatField()
+    # Stock at the end of ``through``, the last day folded into ``level``.
+    last_quantity = models.IntegerField()
+    through = models.DateField()
+    forecast = models.FloatField()
+    quantity = models.IntegerField()
+    # Days the stock lasts at the forecast rate; null without demand.
+    days_of_cover = models.FloatField(null=True, blank=True)
+    recommended_quantity = models.IntegerField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('pharmacy', 'medicine')
+
+    def __str__(self):
+        return f"{self.pharmacy_id}/{self.medicine_id}: order {self.recommended_quantity}"
 
 class SMSRequest(models.Model):
     phone_number = models.CharField(max_length=15)
@@ -51,6 +198,100 @@ class SMSRequest(models.Model):
     location = models.CharField(max_length=200)
     response_sent = models.BooleanField(default=False)
     timestamp = models.DateTimeField(default=timezone.now)
+    # Set by the SMS worker while it owns the row; see core.sms.claim_batch.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone_number', 'timestamp'], name='sms_phone_timestamp_idx'),
+            models.Index(fields=['timestamp'], name='sms_timestamp_idx'),
+            # The worker's queue: only unanswered rows, in arrival order.
+            models.Index(fields=['id'], condition=models.Q(response_sent=False),
+                         name='sms_unsent_idx'),
+        ]
 
     def __str__(self):
         return f"{self.phone_number} - {self.medicine_name}"
+
+class SMSDemandRollup(models.Model):
+    """
+    Number of SMS requests per hour or day, normalized medicine name and
+    location, maintained incrementally by ``core.sms_demand.roll_up`` so
+    demand reports never scan ``SMSRequest``.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    # Start of the hour or day, in TIME_ZONE.
+    bucket = models.DateTimeField()
+    medicine_name = models.CharField(max_length=100)
+    location = models.CharField(max_length=200)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves reports, which read a range of buckets of one period.
+            models.UniqueConstraint(fields=['period', 'bucket', 'medicine_name', 'location'],
+                                    name='sms_demand_rollup_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} {self.medicine_name}: {self.count}"
+
+class SMSRollupCursor(models.Model):
+    """Highest ``SMSRequest`` id folded into the rollups; a single row."""
+    name = models.CharField(max_length=32, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
+
+class StockReservation(models.Model):
+    HELD = 'held'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+    STATUS_CHOICES = [
+        (HELD, 'Held'),
+        (COMMITTED, 'Committed'),
+        (RELEASED, 'Released'),
+    ]
+
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    pharmacy = models.ForeignKey(Pharmacy, on_delete=models.CASCADE, related_name='reservations')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=HELD)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_status_exp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.idempotency_key} ({self.status})"
+
+class StockReservationLine(models.Model):
+    reservation = models.ForeignKey(StockReservation, on_delete=models.CASCADE, related_name='lines')
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.reservation_id} - {self.medicine_id} x {self.quantity}"
+
+class RevokedToken(models.Model):
+    """
+    A revoked API token session (see ``core.tokens``). Rows are only kept
+    until the session's tokens would have expired on their own.
+    """
+    session_id = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.session_id
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+from .shaping import serialize_values
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over an indexed, stable ordering. Views may offer
+    several orderings through ``keyset_orderings`` (selected with
+    ``?ordering=``); the first one is the default.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering_param = 'ordering'
+    default_orderings = {'id': ('id',)}
+
+    def get_ordering(self, request, queryset, view):
+        orderings = getattr(view, 'keyset_orderings', self.default_orderings)
+        key = request.query_params.get(self.ordering_param) or next(iter(orderings))
+        if key not in orderings:
+            raise ValidationError({
+                self.ordering_param: f'Choose one of: {", ".join(orderings)}'
+            })
+        return orderings[key]
+
+
+def iter_ndjson(queryset, serializer_class, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield ``queryset`` as NDJSON lines, walking the primary key in chunks so
+    memory stays bounded regardless of the table size.
+    """
+    encoder = JSONEncoder()
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    fast = hasattr(getattr(serializer_class, 'Meta', None), 'read_values')
+    while True:
+        chunk_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_queryset[:chunk_size])
+        if not chunk:
+            return
+        last_pk = chunk[-1].pk
+        if fast:
+            data = serialize_values(chunk, serializer_class)
+        else:
+            data = serializer_class(chunk, many=True).data
+        yield ''.join(encoder.encode(item) + '\n' for item in data)
+
+
+class NDJSONExportMixin:
+    """Stream the whole filtered list as NDJSON when ``?export=ndjson`` is given."""
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('export') != 'ndjson':
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(
+            iter_ndjson(queryset, self.get_serializer_class()),
+            content_type='application/x-ndjson',
+        )
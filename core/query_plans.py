@@ -0,0 +1,103 @@
+"""
+Canonical queries behind the app's endpoints, used by the
+``check_query_plans`` command to catch access paths that lose their index.
+Register new hot queries here alongside the view that issues them.
+"""
+import re
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Inventory, Medicine, SMSRequest, StockReservation
+
+CANONICAL_QUERIES = {}
+
+# SQLite prints "SCAN <table>" for a full table scan and "SCAN <table> USING
+# [COVERING] INDEX" for an ordered index walk; PostgreSQL prints "Seq Scan".
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING\b)(\w+)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+
+def canonical(name):
+    def register(build):
+        CANONICAL_QUERIES[name] = build
+        return build
+    return register
+
+
+@canonical('medicine page by id (MedicineViewSet.list)')
+def _medicine_page_by_id():
+    return Medicine.objects.filter(id__gt=0).order_by('id')[:50]
+
+
+@canonical('medicine page by name (?ordering=name)')
+def _medicine_page_by_name():
+    return Medicine.objects.filter(name__gt='m').order_by('name', 'id')[:50]
+
+
+@canonical('medicines by manufacturer')
+def _medicines_by_manufacturer():
+    return Medicine.objects.filter(manufacturer='Acme')
+
+
+@canonical('pharmacy inventory (PharmacyInventoryView.get)')
+def _pharmacy_inventory():
+    return Inventory.objects.filter(pharmacy_id=1).select_related('pharmacy', 'medicine')
+
+
+@canonical('in-stock pharmacies for a medicine (SMS replies)')
+def _in_stock_for_medicine():
+    return Inventory.objects.filter(medicine_id=1, quantity__gt=0).order_by('-quantity')[:3]
+
+
+@canonical('unsent SMS batch (process_sms)')
+def _unsent_sms():
+    stale = timezone.now() - timedelta(minutes=5)
+    return SMSRequest.objects.filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale), response_sent=False
+    ).order_by('id')[:100]
+
+
+@canonical('recent SMS from a phone (dedup)')
+def _recent_sms_from_phone():
+    return SMSRequest.objects.filter(
+        phone_number='5550100', timestamp__gte=timezone.now() - timedelta(minutes=10),
+        medicine_name__iexact='aspirin',
+    )
+
+
+@canonical('SMS in a time window')
+def _sms_in_window():
+    return SMSRequest.objects.filter(timestamp__gte=timezone.now() - timedelta(days=1))
+
+
+@canonical('expired reservations (release_reservations)')
+def _expired_reservations():
+    return StockReservation.objects.filter(
+        status=StockReservation.HELD, expires_at__lt=timezone.now()
+    )
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        # Small tables make the planner prefer sequential scans; disable
+        # them so the plan shows whether an index is usable at all.
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            return queryset.explain()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = on')
+    return queryset.explain()
+
+
+def full_scans(plan):
+    pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+    if pattern is None:
+        return []
+    return pattern.findall(plan)
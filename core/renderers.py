@@ -0,0 +1,11 @@
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import timed
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that reports its time to the request metrics."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render_time'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,143 @@
+import re
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils.module_loading import import_string
+
+from .models import Medicine
+
+FTS_TABLE = 'core_medicine_fts'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class RankedResults:
+    """
+    Lazy, sliceable view over a ranked search so that Paginator only
+    fetches the rows of the requested page.
+    """
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        offset = key.start or 0
+        limit = (key.stop if key.stop is not None else self.count()) - offset
+        if limit <= 0:
+            return []
+        ids = self.backend.ranked_ids(self.query, offset, limit)
+        medicines = Medicine.objects.in_bulk(ids)
+        return [medicines[pk] for pk in ids if pk in medicines]
+
+
+class BaseSearchBackend:
+    def count(self, query):
+        raise NotImplementedError
+
+    def ranked_ids(self, query, offset, limit):
+        raise NotImplementedError
+
+    def rebuild(self):
+        pass
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Portable backend for databases without a full-text index. Every token
+    must match the name or manufacturer; name prefix matches rank first.
+    """
+
+    def _queryset(self, query):
+        tokens = tokenize(query)
+        queryset = Medicine.objects.all()
+        for token in tokens:
+            queryset = queryset.filter(
+                Q(name__icontains=token) | Q(manufacturer__icontains=token)
+            )
+        rank = Case(
+            When(name__istartswith=tokens[0], then=Value(0)),
+            When(name__icontains=tokens[0], then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+        return queryset.annotate(rank=rank).order_by('rank', 'name', 'id')
+
+    def count(self, query):
+        return self._queryset(query).count()
+
+    def ranked_ids(self, query, offset, limit):
+        queryset = self._queryset(query).values_list('id', flat=True)
+        return list(queryset[offset:offset + limit])
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 backend over the ``core_medicine_fts`` external-content
+    table, kept in sync with ``core_medicine`` by triggers (see migration
+    0002). Tokens are matched as prefixes and ranked with bm25, weighting
+    the name column above the manufacturer.
+    """
+
+    name_weight = 10.0
+    manufacturer_weight = 1.0
+
+    def _match(self, query):
+        return ' '.join('"%s"*' % token for token in tokenize(query))
+
+    def count(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [self._match(query)],
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, query, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s), rowid LIMIT %s OFFSET %s',
+                [self._match(query), self.name_weight,
+                 self.manufacturer_weight, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+
+
+def get_search_backend():
+    path = getattr(settings, 'MEDICINE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return DatabaseSearchBackend()
+
+
+def search_medicines(query, page=1, per_page=None):
+    """Return one ``Page`` of medicines matching ``query``, best match first."""
+    per_page = per_page or getattr(settings, 'MEDICINE_SEARCH_PAGE_SIZE', 24)
+    if tokenize(query):
+        object_list = RankedResults(get_search_backend(), query)
+    else:
+        object_list = Medicine.objects.order_by('name', 'id')
+    return Paginator(object_list, per_page).get_page(page)
@@ -1,7 +1,11 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
-from .models import User, Pharmacy, Medicine, Inventory, SMSRequest
+from .models import (
+    User, Pharmacy, Medicine, Inventory, SMSRequest,
+    StockReservation, StockReservationLine
+)
 
 User = get_user_model()
 
@@ -33,12 +37,28 @@ class PharmacySerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Pharmacy
-        fields = ('id', 'user', 'license_number', 'store_name')
+        fields = ('id', 'user', 'license_number', 'store_name', 'latitude', 'longitude')
 
 class MedicineSerializer(serializers.ModelSerializer):
+    # From the MedicineAvailability summary, so listing needs no aggregate.
+    in_stock_pharmacies = serializers.IntegerField(
+        source='availability.pharmacy_count', read_only=True, default=0)
+    total_quantity = serializers.IntegerField(
+        source='availability.total_quantity', read_only=True, default=0)
+
     class Meta:
         model = Medicine
         fields = '__all__'
+        select_related = ('availability',)
+        read_values = {
+            'id': 'id',
+            'name': 'name',
+            'description': 'description',
+            'price': 'price',
+            'manufacturer': 'manufacturer',
+            'in_stock_pharmacies': 'availability__pharmacy_count',
+            'total_quantity': 'availability__total_quantity',
+        }
 
 class InventorySerializer(serializers.ModelSerializer):
     medicine = MedicineSerializer(read_only=True)
@@ -47,9 +67,77 @@ class InventorySerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Inventory
-        fields = ('id', 'pharmacy_name', 'medicine', 'medicine_id', 'quantity')
+        fields = ('id', 'pharmacy_name', 'medicine', 'medicine_id', 'quantity', 'reorder_threshold')
+        select_related = ('pharmacy', 'medicine__availability')
+        read_values = {
+            'id': 'id',
+            'pharmacy_name': 'pharmacy__store_name',
+            'medicine': MedicineSerializer,
+            'quantity': 'quantity',
+            'reorder_threshold': 'reorder_threshold',
+        }
+
+class InventoryAddSerializer(serializers.Serializer):
+    medicine_id = serializers.PrimaryKeyRelatedField(queryset=Medicine.objects.all())
+    quantity = serializers.IntegerField(min_value=0, default=0)
 
 class SMSRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = SMSRequest
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class SMSInboundSerializer(serializers.Serializer):
+    phone_number = serializers.CharField(max_length=15)
+    medicine_name = serializers.CharField(max_length=100)
+    location = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+
+class StockReservationLineSerializer(serializers.ModelSerializer):
+    medicine_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = StockReservationLine
+        fields = ('medicine_id', 'quantity')
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    pharmacy = serializers.PrimaryKeyRelatedField(queryset=Pharmacy.objects.all())
+    lines = StockReservationLineSerializer(many=True)
+
+    class Meta:
+        model = StockReservation
+        fields = ('id', 'idempotency_key', 'pharmacy', 'status', 'created_at', 'expires_at', 'lines')
+        read_only_fields = ('status', 'created_at', 'expires_at')
+        prefetch_related = ('lines',)
+        # Uniqueness is handled by core.stock.reserve, which replays the
+        # original reservation instead of rejecting a repeated key.
+        extra_kwargs = {'idempotency_key': {'validators': []}}
+
+    def validate_lines(self, lines):
+        if not lines:
+            raise serializers.ValidationError('At least one line is required')
+        return lines
+
+class BasketItemSerializer(serializers.Serializer):
+    medicine_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+class BasketSerializer(serializers.Serializer):
+    items = BasketItemSerializer(many=True)
+    lat = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    lng = serializers.FloatField(min_value=-180, max_value=180, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError('At least one item is required')
+        if len(items) > settings.BASKET_MAX_ITEMS:
+            raise serializers.ValidationError(f'At most {settings.BASKET_MAX_ITEMS} items are allowed')
+        return items
+
+    def validate(self, data):
+        if ('lat' in data) != ('lng' in data):
+            raise serializers.ValidationError('lat and lng must be given together')
+        return data
+
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
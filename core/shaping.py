@@ -0,0 +1,127 @@
+"""
+Query shaping for DRF views.
+
+Serializers declare what they read through optional ``Meta`` attributes:
+
+* ``select_related`` / ``prefetch_related``: relations walked by the
+  serializer, applied to the view's queryset so listing N rows costs a
+  constant number of queries;
+* ``only``: columns to load, for wide tables;
+* ``read_values``: output keys mapped to ORM lookups (or to a nested
+  serializer class), used by ``serialize_values`` to build list responses
+  straight from ``values_list()`` rows without instantiating models or
+  running every field through DRF.
+"""
+from operator import attrgetter
+
+from django.db.models import QuerySet
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .metrics import timed
+
+# Fields whose database value is already what DRF would render.
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField, serializers.CharField, serializers.IntegerField,
+    serializers.FloatField, serializers.ReadOnlyField,
+)
+
+
+def shape_queryset(queryset, serializer_class):
+    meta = getattr(serializer_class, 'Meta', None)
+    select_related = getattr(meta, 'select_related', ())
+    prefetch_related = getattr(meta, 'prefetch_related', ())
+    only = getattr(meta, 'only', ())
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if only:
+        queryset = queryset.only(*only)
+    return queryset
+
+
+def _plan(serializer_class, prefix=''):
+    plan = serializer_class.__dict__.get('_values_plan')
+    if plan is not None and not prefix:
+        return plan
+    fields = serializer_class().fields
+    plan = []
+    for key, lookup in serializer_class.Meta.read_values.items():
+        if isinstance(lookup, type) and issubclass(lookup, serializers.BaseSerializer):
+            plan.append((key, _plan(lookup, f'{prefix}{key}__')))
+            continue
+        field = fields[key]
+        convert = None if isinstance(field, PASSTHROUGH_FIELDS) else field.to_representation
+        plan.append((key, (prefix + lookup, convert)))
+    if not prefix:
+        serializer_class._values_plan = plan
+    return plan
+
+
+def _lookups(plan):
+    for key, spec in plan:
+        if isinstance(spec, list):
+            yield from _lookups(spec)
+        else:
+            yield spec
+
+
+def _build(plan, row, position):
+    item = {}
+    for key, spec in plan:
+        if isinstance(spec, list):
+            item[key], position = _build(spec, row, position)
+            continue
+        value = row[position]
+        convert = spec[1]
+        item[key] = convert(value) if convert is not None and value is not None else value
+        position += 1
+    return item, position
+
+
+def serialize_values(queryset, serializer_class):
+    """
+    Read-only equivalent of ``serializer_class(queryset, many=True).data``.
+    ``queryset`` may also be a list of already fetched instances, such as a
+    page returned by a paginator.
+    """
+    plan = _plan(serializer_class)
+    lookups = [lookup for lookup, _ in _lookups(plan)]
+    if isinstance(queryset, QuerySet):
+        rows = list(queryset.values_list(*lookups))
+    else:
+        getter = attrgetter(*(lookup.replace('__', '.') for lookup in lookups))
+        rows = [getter(instance) for instance in queryset]
+        if len(lookups) == 1:
+            rows = [(value,) for value in rows]
+    with timed('serialize_time'):
+        return [_build(plan, row, 0)[0] for row in rows]
+
+
+async def aserialize_values(queryset, serializer_class):
+    """``serialize_values`` for a queryset, fetched with the async ORM."""
+    plan = _plan(serializer_class)
+    lookups = [lookup for lookup, _ in _lookups(plan)]
+    rows = [row async for row in queryset.values_list(*lookups)]
+    with timed('serialize_time'):
+        return [_build(plan, row, 0)[0] for row in rows]
+
+
+class ShapedQuerysetMixin:
+    def get_queryset(self):
+        return shape_queryset(super().get_queryset(), self.get_serializer_class())
+
+
+class ValuesListMixin:
+    """List action that uses ``serialize_values`` when the serializer supports it."""
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if not hasattr(getattr(serializer_class, 'Meta', None), 'read_values'):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize_values(page, serializer_class))
+        return Response(serialize_values(queryset, serializer_class))
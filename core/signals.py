@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump
+from .fuzzy import get_matcher
+from .models import Inventory, Medicine, MedicineSynonym, Pharmacy
+
+
+@receiver([post_save, post_delete], sender=Medicine)
+def medicine_changed(sender, **kwargs):
+    bump('catalogue', 'availability')
+
+
+@receiver(post_save, sender=Medicine)
+def medicine_saved(sender, instance, **kwargs):
+    # Only keep an index that is already loaded up to date.
+    matcher = get_matcher(load=False)
+    if matcher is not None:
+        matcher.medicine_saved(instance)
+
+
+@receiver(post_delete, sender=Medicine)
+def medicine_deleted(sender, instance, **kwargs):
+    matcher = get_matcher(load=False)
+    if matcher is not None:
+        matcher.medicine_deleted(instance.id)
+
+
+@receiver([post_save, post_delete], sender=MedicineSynonym)
+def synonym_changed(sender, **kwargs):
+    bump('catalogue')
+    matcher = get_matcher(load=False)
+    if matcher is not None:
+        matcher.sync_synonyms()
+
+
+@receiver([post_save, post_delete], sender=Inventory)
+@receiver([post_save, post_delete], sender=Pharmacy)
+def availability_changed(sender, **kwargs):
+    bump('availability')
@@ -0,0 +1,204 @@
+import hashlib
+import hmac
+import logging
+import uuid
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .fuzzy import get_matcher
+from .models import Inventory, Medicine, SMSRequest
+from .search import search_medicines
+
+logger = logging.getLogger(__name__)
+
+MAX_PHARMACIES_PER_REPLY = 3
+# The gateway signs each webhook body: hex HMAC-SHA256 under SMS_WEBHOOK_SECRET.
+SIGNATURE_HEADER = 'X-SMS-Signature'
+
+
+def normalize(text):
+    return ' '.join(text.split()).lower()
+
+
+class BaseSMSGateway:
+    def send_messages(self, messages):
+        """
+        Send ``messages``, a list of ``(phone_number, text)`` pairs. Return a
+        list of booleans telling which ones were accepted by the gateway.
+        """
+        raise NotImplementedError
+
+
+class FakeSMSGateway(BaseSMSGateway):
+    """
+    Collects messages in memory, like Django's locmem email backend. Only
+    the last ``OUTBOX_LIMIT`` are kept, so a long-running process does not
+    grow without bound.
+    """
+
+    OUTBOX_LIMIT = 1000
+    outbox = deque(maxlen=OUTBOX_LIMIT)
+
+    def send_messages(self, messages):
+        FakeSMSGateway.outbox.extend(messages)
+        return [True] * len(messages)
+
+
+class ConsoleSMSGateway(BaseSMSGateway):
+    def send_messages(self, messages):
+        for phone_number, text in messages:
+            logger.info('SMS to %s: %s', phone_number, text)
+        return [True] * len(messages)
+
+
+def get_sms_gateway():
+    if not settings.SMS_GATEWAY:
+        # Only DEBUG defaults to the fake gateway, which answers nobody.
+        raise ImproperlyConfigured('SMS_GATEWAY must be set when DEBUG is off')
+    return import_string(settings.SMS_GATEWAY)()
+
+
+def sign(body):
+    return hmac.new(settings.SMS_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature):
+    """Whether ``signature`` signs ``body``. Without a secret nothing does."""
+    if not settings.SMS_WEBHOOK_SECRET or not signature:
+        return False
+    return hmac.compare_digest(sign(body), signature)
+
+
+def enqueue_request(phone_number, medicine_name, location=''):
+    """
+    Store an inbound request unless the same phone asked for the same
+    medicine within ``SMS_DEDUP_WINDOW`` seconds. Returns ``(request, created)``.
+    """
+    medicine_name = ' '.join(medicine_name.split())
+    since = timezone.now() - timedelta(seconds=settings.SMS_DEDUP_WINDOW)
+    existing = SMSRequest.objects.filter(
+        phone_number=phone_number,
+        timestamp__gte=since,
+        medicine_name__iexact=medicine_name,
+    ).order_by('-timestamp').first()
+    if existing:
+        return existing, False
+    return SMSRequest.objects.create(
+        phone_number=phone_number,
+        medicine_name=medicine_name,
+        location=' '.join(location.split()),
+    ), True
+
+
+async def aenqueue_request(phone_number, medicine_name, location=''):
+    """``enqueue_request`` for async views, using the async ORM."""
+    medicine_name = ' '.join(medicine_name.split())
+    since = timezone.now() - timedelta(seconds=settings.SMS_DEDUP_WINDOW)
+    existing = await SMSRequest.objects.filter(
+        phone_number=phone_number,
+        timestamp__gte=since,
+        medicine_name__iexact=medicine_name,
+    ).order_by('-timestamp').afirst()
+    if existing:
+        return existing, False
+    return await SMSRequest.objects.acreate(
+        phone_number=phone_number,
+        medicine_name=medicine_name,
+        location=' '.join(location.split()),
+    ), True
+
+
+def claim_batch(size):
+    """
+    Claim up to ``size`` unanswered requests for this worker. Claims expire
+    after ``SMS_CLAIM_LEASE`` seconds so rows owned by a crashed worker are
+    picked up again.
+    """
+    now = timezone.now()
+    claimable = Q(claimed_at__isnull=True) | Q(
+        claimed_at__lt=now - timedelta(seconds=settings.SMS_CLAIM_LEASE)
+    )
+    ids = list(
+        SMSRequest.objects.filter(claimable, response_sent=False)
+        .order_by('id').values_list('id', flat=True)[:size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # The conditional update makes the claim safe against concurrent workers.
+    SMSRequest.objects.filter(claimable, id__in=ids, response_sent=False).update(
+        claimed_at=now, claim_token=token
+    )
+    return list(SMSRequest.objects.filter(id__in=ids, claim_token=token).order_by('id'))
+
+
+def find_medicine(name):
+    medicine = Medicine.objects.filter(name__iexact=name).first()
+    if medicine is None:
+        # Tolerates misspellings and brand/generic names.
+        medicine_id = get_matcher().best_match(name)
+        if medicine_id is not None:
+            medicine = Medicine.objects.filter(id=medicine_id).first()
+    if medicine is None:
+        page = search_medicines(name, 1, per_page=1)
+        medicine = page.object_list[0] if page.object_list else None
+    return medicine
+
+
+def availability_reply(medicine_name, location):
+    medicine = find_medicine(medicine_name)
+    if medicine is None:
+        return f'Sorry, we could not find a medicine called "{medicine_name}".'
+    in_stock = Inventory.objects.filter(
+        medicine=medicine, quantity__gt=0
+    ).select_related('pharmacy').order_by('-quantity')
+    stocks = []
+    if location:
+        stocks = list(in_stock.filter(
+            pharmacy__user__address__icontains=location
+        )[:MAX_PHARMACIES_PER_REPLY])
+    if not stocks:
+        stocks = list(in_stock[:MAX_PHARMACIES_PER_REPLY])
+    if not stocks:
+        return f'Sorry, {medicine.name} is currently out of stock everywhere.'
+    listing = ', '.join(
+        f'{item.pharmacy.store_name} ({item.quantity})' for item in stocks
+    )
+    return f'{medicine.name} is available at: {listing}'
+
+
+def process_batch(batch, gateway):
+    """
+    Answer a claimed batch. Identical questions are resolved once per batch,
+    which is what keeps bursts of the same query cheap. Returns the number
+    of replies sent.
+    """
+    if not batch:
+        return 0
+    replies = {}
+    for sms in batch:
+        key = (normalize(sms.medicine_name), normalize(sms.location))
+        if key not in replies:
+            replies[key] = availability_reply(sms.medicine_name, sms.location)
+    results = gateway.send_messages([
+        (sms.phone_number,
+         replies[normalize(sms.medicine_name), normalize(sms.location)])
+        for sms in batch
+    ])
+    sent = [sms.id for sms, ok in zip(batch, results) if ok]
+    failed = [sms.id for sms, ok in zip(batch, results) if not ok]
+    # Only rows still under this batch's claim: once the lease expired
+    # another worker may own them.
+    claimed = SMSRequest.objects.filter(claim_token=batch[0].claim_token)
+    claimed.filter(id__in=sent).update(response_sent=True, claim_token='')
+    if failed:
+        # Keep claimed_at so the requests are retried once the lease expires
+        # rather than straight away, which would spin while the gateway is down.
+        claimed.filter(id__in=failed).update(claim_token='')
+    return len(sent)
@@ -0,0 +1,159 @@
+"""
+SMS demand rollups and retention.
+
+``roll_up`` folds new ``SMSRequest`` rows into ``SMSDemandRollup`` counts
+per hour and per day, keyed by the normalized medicine name and location,
+remembering how far it got in ``SMSRollupCursor``. Reports read a range
+of rollup buckets, so their cost depends on the window asked for and not
+on how much history is kept.
+
+``archive`` moves answered requests that are older than
+``SMS_RETENTION_DAYS`` and already rolled up into gzipped JSON-lines
+files under ``SMS_ARCHIVE_DIR`` and deletes them. Each batch's file is
+named after its first id and written aside, then renamed: a rerun after a
+crash starts from the same row and replaces the file, so no row is
+archived twice.
+"""
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import SMSDemandRollup, SMSRequest, SMSRollupCursor
+from .sms import normalize
+
+CURSOR = 'sms_demand'
+ARCHIVED_FIELDS = ('id', 'phone_number', 'medicine_name', 'location', 'response_sent', 'timestamp')
+
+
+def bucket_start(period, when):
+    """The start of the hour or day containing ``when``, in TIME_ZONE."""
+    start = timezone.localtime(when).replace(minute=0, second=0, microsecond=0)
+    return start.replace(hour=0) if period == SMSDemandRollup.DAY else start
+
+
+# Portable upsert (SQLite 3.24+, PostgreSQL): the database adds to the
+# stored count, so nothing has to be read back first.
+UPSERT = (
+    'INSERT INTO core_smsdemandrollup (period, bucket, medicine_name, location, count) '
+    'VALUES {values} '
+    'ON CONFLICT (period, bucket, medicine_name, location) '
+    'DO UPDATE SET count = core_smsdemandrollup.count + excluded.count'
+)
+UPSERT_ROWS = 500
+
+
+def _add(counts):
+    """Add ``counts``, keyed by ``(period, bucket, medicine_name, location)``, to the rollups."""
+    rows = [(period, connection.ops.adapt_datetimefield_value(bucket), medicine_name, location, count)
+            for (period, bucket, medicine_name, location), count in counts.items()]
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), UPSERT_ROWS):
+            chunk = rows[offset:offset + UPSERT_ROWS]
+            cursor.execute(
+                UPSERT.format(values=', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))),
+                [value for row in chunk for value in row],
+            )
+
+
+def roll_up(batch_size=5000):
+    """Fold up to ``batch_size`` new requests into the rollups; returns how many."""
+    # Rows are read in id order, but ids are handed out before commit: a
+    # row still in flight may get a lower id than one already visible.
+    # Stopping at rows younger than SMS_ROLLUP_LAG lets those commit first.
+    horizon = timezone.now() - timedelta(seconds=settings.SMS_ROLLUP_LAG)
+    with transaction.atomic():
+        SMSRollupCursor.objects.get_or_create(name=CURSOR)
+        # A no-op write takes the row lock (SQLite's write lock) before the
+        # cursor is read, so concurrent jobs take turns.
+        SMSRollupCursor.objects.filter(name=CURSOR).update(last_id=F('last_id'))
+        cursor = SMSRollupCursor.objects.get(name=CURSOR)
+        rows = SMSRequest.objects.filter(id__gt=cursor.last_id).order_by('id').values_list(
+            'id', 'timestamp', 'medicine_name', 'location'
+        )[:batch_size]
+        counts = Counter()
+        folded, last_id = 0, cursor.last_id
+        for request_id, timestamp, medicine_name, location in rows:
+            if timestamp >= horizon:
+                break
+            key = (normalize(medicine_name), normalize(location))
+            hour = bucket_start(SMSDemandRollup.HOUR, timestamp)
+            counts[(SMSDemandRollup.HOUR, hour, *key)] += 1
+            counts[(SMSDemandRollup.DAY, hour.replace(hour=0), *key)] += 1
+            folded, last_id = folded + 1, request_id
+        if folded:
+            _add(counts)
+            SMSRollupCursor.objects.filter(name=CURSOR).update(last_id=last_id)
+    return folded
+
+
+def demand(period=SMSDemandRollup.DAY, last=7, location=None, by_location=False, limit=10):
+    """
+    The most requested medicines over the last ``last`` hours or days,
+    the current one included, for one ``location`` or all of them, and
+    per location when ``by_location`` is set.
+    """
+    step = timedelta(days=1) if period == SMSDemandRollup.DAY else timedelta(hours=1)
+    start = bucket_start(period, timezone.now()) - step * (last - 1)
+    rollups = SMSDemandRollup.objects.filter(period=period, bucket__gte=start)
+    if location:
+        rollups = rollups.filter(location=normalize(location))
+    fields = ['medicine_name', 'location'] if by_location else ['medicine_name']
+    return list(
+        rollups.values(*fields).annotate(requests=Sum('count'))
+        .order_by('-requests', *fields)[:limit]
+    )
+
+
+def archive_path(first_id):
+    return Path(settings.SMS_ARCHIVE_DIR) / f'sms-{first_id:012d}.jsonl.gz'
+
+
+def read_archive(path):
+    """Yield the requests stored in an archive file as dicts."""
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+
+def archive(batch_size=10000):
+    """
+    Archive and delete answered requests older than ``SMS_RETENTION_DAYS``
+    that are already rolled up, and hourly rollups older than
+    ``SMS_HOURLY_ROLLUP_RETENTION_DAYS``. Returns the number of requests
+    archived.
+    """
+    now = timezone.now()
+    rolled_up = SMSRollupCursor.objects.filter(name=CURSOR).values_list('last_id', flat=True).first()
+    expired = SMSRequest.objects.filter(
+        id__lte=rolled_up or 0,
+        timestamp__lt=now - timedelta(days=settings.SMS_RETENTION_DAYS),
+        response_sent=True,
+    )
+    os.makedirs(settings.SMS_ARCHIVE_DIR, exist_ok=True)
+    archived = 0
+    while True:
+        rows = list(expired.order_by('id').values(*ARCHIVED_FIELDS)[:batch_size])
+        if not rows:
+            break
+        path = archive_path(rows[0]['id'])
+        partial = path.with_suffix('.tmp')
+        with gzip.open(partial, 'wt', encoding='utf-8') as output:
+            for row in rows:
+                output.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+        os.replace(partial, path)
+        SMSRequest.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
+    SMSDemandRollup.objects.filter(
+        period=SMSDemandRollup.HOUR,
+        bucket__lt=now - timedelta(days=settings.SMS_HOURLY_ROLLUP_RETENTION_DAYS),
+    ).delete()
+    return archived
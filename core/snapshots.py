@@ -0,0 +1,399 @@
+"""
+Columnar snapshot export of the catalogue and inventory.
+
+A snapshot file is a run of column chunks followed by a JSON footer, the
+way Parquet lays files out::
+
+    MAGIC | chunk | chunk | ... | footer JSON | footer length (u32 LE) | MAGIC
+
+Rows are split into row groups and every column of a group is encoded
+and compressed on its own, so a client holding the footer can fetch just
+the columns it needs with HTTP range requests. Integers are stored
+relative to the group minimum in the narrowest array type that fits,
+strings as an offsets array plus UTF-8 bytes, and low-cardinality
+strings (manufacturer names) through a per-group dictionary.
+
+Rebuilds are incremental. Each row group records a hash of its rows and
+encoded groups are reused when the hash still matches; inventory groups
+are keyed by pharmacy and only the ones touched by ``InventoryEvent``s
+since the last build are read from the database at all. The catalogue
+has no change log, so its rows are read on every build and only the
+encoding is saved. Builds run from ``export_snapshots``, not on request.
+"""
+import array
+import hashlib
+import json
+import lzma
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from dataclasses import dataclass
+from itertools import groupby
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max
+
+from .models import Inventory, InventoryEvent, InventoryLogFloor, Medicine
+
+MAGIC = b'PRSNAP1\n'
+FORMAT_VERSION = 1
+TAIL = struct.Struct('<I')
+INT_TYPECODES = ('B', 'H', 'I', 'Q')  # unsigned, smallest first
+CODECS = {
+    'none': (lambda data: data, lambda data: data),
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Table:
+    name: str
+    model: type
+    # (column, encoding, source field)
+    columns: tuple
+    # Rows are grouped by ``group_field // group_width``.
+    group_field: str
+    group_width: int
+
+    @property
+    def fields(self):
+        return [field for _, _, field in self.columns]
+
+
+TABLES = {
+    'medicines': Table('medicines', Medicine, (
+        ('id', 'int', 'id'),
+        ('name', 'string', 'name'),
+        ('description', 'string', 'description'),
+        ('price_cents', 'int', 'price'),
+        ('manufacturer', 'dictionary', 'manufacturer'),
+    ), 'id', 10000),
+    'inventory': Table('inventory', Inventory, (
+        ('id', 'int', 'id'),
+        ('pharmacy_id', 'int', 'pharmacy_id'),
+        ('medicine_id', 'int', 'medicine_id'),
+        ('quantity', 'int', 'quantity'),
+        ('reorder_threshold', 'int', 'reorder_threshold'),
+    ), 'pharmacy_id', 16),
+}
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode, data):
+    values = array.array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def encode_ints(values):
+    """Frame of reference: store ``value - min`` in the narrowest unsigned type."""
+    base = min(values, default=0)
+    span = max(values, default=0) - base
+    for typecode in INT_TYPECODES:
+        if span < 1 << (8 * array.array(typecode).itemsize):
+            break
+    return {'base': base, 'type': typecode}, _little_endian(array.array(typecode, (v - base for v in values)))
+
+
+def decode_ints(meta, data):
+    base = meta['base']
+    return [value + base for value in _from_little_endian(meta['type'], data)]
+
+
+def encode_strings(values):
+    encoded = [value.encode() for value in values]
+    offsets = array.array('Q', [0])
+    total = 0
+    for value in encoded:
+        total += len(value)
+        offsets.append(total)
+    meta, packed_offsets = encode_ints(offsets)
+    meta['offsets_length'] = len(packed_offsets)
+    return meta, packed_offsets + b''.join(encoded)
+
+
+def decode_strings(meta, data):
+    split = meta['offsets_length']
+    offsets = decode_ints(meta, data[:split])
+    body = data[split:]
+    return [body[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+
+
+def encode_dictionary(values):
+    codes, dictionary = {}, []
+    for value in values:
+        if value not in codes:
+            codes[value] = len(dictionary)
+            dictionary.append(value)
+    dictionary_meta, dictionary_data = encode_strings(dictionary)
+    codes_meta, codes_data = encode_ints([codes[value] for value in values])
+    return {
+        'dictionary': dictionary_meta,
+        'dictionary_length': len(dictionary_data),
+        'codes': codes_meta,
+    }, dictionary_data + codes_data
+
+
+def decode_dictionary(meta, data):
+    split = meta['dictionary_length']
+    dictionary = decode_strings(meta['dictionary'], data[:split])
+    return [dictionary[code] for code in decode_ints(meta['codes'], data[split:])]
+
+
+ENCODINGS = {
+    'int': (encode_ints, decode_ints),
+    'string': (encode_strings, decode_strings),
+    'dictionary': (encode_dictionary, decode_dictionary),
+}
+
+
+def _column_values(encoding, values):
+    if encoding == 'int':
+        # Decimal prices are stored as whole cents.
+        return [int(value * 100) if isinstance(value, Decimal) else value for value in values]
+    return values
+
+
+def _rows_hash(rows):
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def encode_group(table, rows, compression):
+    """Encode one row group; returns ``(column metadata, chunks)``."""
+    compress = CODECS[compression][0]
+    meta, chunks = {}, []
+    for position, (column, encoding, _) in enumerate(table.columns):
+        values = _column_values(encoding, [row[position] for row in rows])
+        column_meta, data = ENCODINGS[encoding][0](values)
+        chunk = compress(data)
+        meta[column] = {'encoding': encoding, **column_meta, 'length': len(chunk),
+                        'raw_length': len(data)}
+        chunks.append(chunk)
+    return meta, chunks
+
+
+def _iter_groups(table, keys=None):
+    """Yield ``(key, rows)`` in key order, for every group or only ``keys``."""
+    queryset = table.model.objects.order_by(table.group_field, 'id')
+    width = table.group_width
+    if keys is not None:
+        for key in sorted(keys):
+            yield key, list(queryset.filter(**{
+                f'{table.group_field}__gte': key * width,
+                f'{table.group_field}__lt': (key + 1) * width,
+            }).values_list(*table.fields))
+        return
+    position = table.fields.index(table.group_field)
+    rows = queryset.values_list(*table.fields).iterator(chunk_size=2000)
+    for key, group in groupby(rows, key=lambda row: row[position] // width):
+        yield key, list(group)
+
+
+def snapshot_path(name):
+    return Path(settings.SNAPSHOT_DIR) / f'{name}.prs'
+
+
+def read_footer(source):
+    """
+    Footer of a snapshot, given its path or a file opened in binary mode.
+    Raises SnapshotError for anything else, truncated files included.
+    """
+    if not hasattr(source, 'read'):
+        with open(source, 'rb') as snapshot:
+            return read_footer(snapshot)
+    try:
+        # Seeking before the start fails on files too short to be snapshots.
+        source.seek(-(TAIL.size + len(MAGIC)), os.SEEK_END)
+        tail = source.read()
+        if tail[TAIL.size:] == MAGIC:
+            (length,) = TAIL.unpack(tail[:TAIL.size])
+            source.seek(-(TAIL.size + len(MAGIC) + length), os.SEEK_END)
+            return json.loads(source.read(length))
+    except (OSError, ValueError):
+        pass
+    raise SnapshotError(f'{getattr(source, "name", "file")} is not a snapshot file')
+
+
+def snapshot_etag(footer):
+    """Changes whenever any row does: derived from the row group hashes."""
+    digest = hashlib.blake2b(footer['compression'].encode(), digest_size=12)
+    for group in footer['row_groups']:
+        digest.update(group['hash'].encode())
+    return f'"{footer["table"]}-{digest.hexdigest()}"'
+
+
+def read_snapshot(path, columns=None):
+    """Decode a snapshot file into ``{column: [values]}``."""
+    footer = read_footer(path)
+    decompress = CODECS[footer['compression']][1]
+    names = columns or [column['name'] for column in footer['columns']]
+    result = {name: [] for name in names}
+    with open(path, 'rb') as snapshot:
+        for group in footer['row_groups']:
+            for name in names:
+                meta = group['columns'][name]
+                snapshot.seek(meta['offset'])
+                data = decompress(snapshot.read(meta['length']))
+                result[name].extend(ENCODINGS[meta['encoding']][1](meta, data))
+    return result
+
+
+def _source_state(table):
+    """Where the change log stood at build time; None for the catalogue, which has none."""
+    if table.name != 'inventory':
+        return None
+    return {
+        'seq': InventoryEvent.objects.aggregate(seq=Max('id'))['seq'] or 0,
+        'floor': InventoryLogFloor.objects.aggregate(seq=Max('seq'))['seq'] or 0,
+    }
+
+
+def _stale_keys(table, previous, state):
+    """Group keys to re-read, or None to re-read everything."""
+    if previous is None or table.name != 'inventory':
+        return None
+    if state['floor'] > previous['source']['seq']:
+        # Compaction dropped deletions we never saw, those of deleted
+        # pharmacies included.
+        return None
+    pharmacies = (
+        InventoryEvent.objects.filter(id__gt=previous['source']['seq'], id__lte=state['seq'])
+        .order_by().values_list('pharmacy_id', flat=True).distinct()
+    )
+    return {pharmacy_id // table.group_width for pharmacy_id in pharmacies}
+
+
+def build_snapshot(name, compression=None, force=False):
+    """
+    Bring snapshot ``name`` up to date and return its footer. Unchanged
+    row groups are copied from the previous file without re-encoding.
+    """
+    table = TABLES[name]
+    compression = compression or settings.SNAPSHOT_COMPRESSION
+    if compression not in CODECS:
+        raise SnapshotError(f'Unknown compression {compression!r}; use one of {", ".join(CODECS)}')
+    path = snapshot_path(name)
+    previous = None
+    if path.exists() and not force:
+        try:
+            previous = read_footer(path)
+        except (OSError, SnapshotError):
+            # Unreadable or truncated: build it again from scratch.
+            previous = None
+        if previous and previous['compression'] != compression:
+            previous = None
+
+    state = _source_state(table)
+    if state is not None and previous is not None and previous['source'] == state:
+        return previous
+
+    stale = _stale_keys(table, previous, state)
+    old_groups = {group['key']: group for group in previous['row_groups']} if previous else {}
+    if stale is None:
+        groups = _iter_groups(table)
+    else:
+        # Groups that were not re-read (rows of None) are copied over as they are.
+        fresh = dict(_iter_groups(table, stale))
+        groups = ((key, fresh.get(key)) for key in sorted(set(old_groups) | stale))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=f'.{name}-')
+    source = open(path, 'rb') if previous else None
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            footer = _write(output, source, table, groups, old_groups, compression, state)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    finally:
+        if source is not None:
+            source.close()
+    return footer
+
+
+def _write(output, source, table, groups, old_groups, compression, state):
+    output.write(MAGIC)
+    row_groups, total_rows, reused = [], 0, 0
+    for key, rows in groups:
+        if rows == []:
+            continue
+        old = old_groups.get(key)
+        digest = _rows_hash(rows) if rows is not None else old['hash']
+        if old is not None and old['hash'] == digest:
+            columns = {}
+            for column, meta in old['columns'].items():
+                source.seek(meta['offset'])
+                columns[column] = {**meta, 'offset': output.tell()}
+                output.write(source.read(meta['length']))
+            group_rows = old['rows']
+            reused += 1
+        else:
+            columns, chunks = encode_group(table, rows, compression)
+            for meta, chunk in zip(columns.values(), chunks):
+                meta['offset'] = output.tell()
+                output.write(chunk)
+            group_rows = len(rows)
+        row_groups.append({'key': key, 'rows': group_rows, 'hash': digest, 'columns': columns})
+        total_rows += group_rows
+    footer = {
+        'format_version': FORMAT_VERSION,
+        'table': table.name,
+        'compression': compression,
+        'rows': total_rows,
+        'columns': [{'name': column, 'encoding': encoding} for column, encoding, _ in table.columns],
+        'source': state,
+        'reused_row_groups': reused,
+        'row_groups': row_groups,
+    }
+    encoded = json.dumps(footer, separators=(',', ':')).encode()
+    output.write(encoded + TAIL.pack(len(encoded)) + MAGIC)
+    return footer
+
+
+def parse_byte_range(header, size):
+    """
+    Parse a ``Range`` header against a body of ``size`` bytes. Returns
+    ``(start, end)`` inclusive, None to send the whole body (no header,
+    another unit or several ranges, which RFC 9110 lets a server ignore),
+    or raises SnapshotError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    try:
+        if not first:
+            # Suffix range: the last N bytes.
+            length = int(last)
+            if length <= 0:
+                raise SnapshotError('Empty suffix range')
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise SnapshotError('Range starts past the end of the snapshot')
+    if start > end:
+        return None
+    return start, min(end, size - 1)
@@ -0,0 +1,156 @@
+"""
+Stock mutations. Every change to ``Inventory.quantity`` is a single
+conditional UPDATE with an ``F()`` expression, so concurrent writers never
+lose each other's updates and stock can never go negative.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump
+from .models import Inventory, Medicine, StockReservation, StockReservationLine
+
+
+class StockError(Exception):
+    pass
+
+
+class InsufficientStock(StockError):
+    def __init__(self, medicine_id, requested):
+        self.medicine_id = medicine_id
+        self.requested = requested
+        super().__init__(f'Not enough stock of medicine {medicine_id} for {requested} units')
+
+
+class IdempotencyConflict(StockError):
+    pass
+
+
+class InvalidTransition(StockError):
+    pass
+
+
+def add_stock(pharmacy, medicine_id, delta):
+    """
+    Atomically add ``delta`` units (positive; taking stock out goes
+    through reservations), creating the row if it is missing. Returns
+    ``(inventory, created)``.
+    """
+    if delta <= 0:
+        raise StockError('Added quantities must be positive')
+    rows = Inventory.objects.filter(pharmacy=pharmacy, medicine_id=medicine_id)
+    created = False
+    if not rows.update(quantity=F('quantity') + delta):
+        if not Medicine.objects.filter(id=medicine_id).exists():
+            raise StockError(f'Unknown medicine {medicine_id}')
+        try:
+            with transaction.atomic():
+                Inventory.objects.create(pharmacy=pharmacy, medicine_id=medicine_id, quantity=delta)
+            created = True
+        except IntegrityError:
+            # Lost the race to create it, or the medicine was deleted since.
+            if not rows.update(quantity=F('quantity') + delta):
+                raise StockError(f'Unknown medicine {medicine_id}')
+    bump('availability')
+    return rows.select_related('pharmacy', 'medicine').get(), created
+
+
+def _merge(lines):
+    merged = Counter()
+    for medicine_id, quantity in lines:
+        if quantity <= 0:
+            raise StockError('Reserved quantities must be positive')
+        merged[medicine_id] += quantity
+    return merged
+
+
+def reserve(pharmacy, lines, idempotency_key, user=None):
+    """
+    Hold stock for ``lines`` (pairs of medicine id and quantity) at
+    ``pharmacy`` in one transaction: either every line is decremented or
+    none is. Repeating a call with the same ``idempotency_key`` returns the
+    original reservation. Returns ``(reservation, created)``.
+    """
+    merged = _merge(lines)
+    try:
+        with transaction.atomic():
+            # Writing first takes the write lock up front and claims the key.
+            reservation = StockReservation.objects.create(
+                idempotency_key=idempotency_key,
+                pharmacy=pharmacy,
+                created_by=user,
+                expires_at=timezone.now() + timedelta(seconds=settings.RESERVATION_TTL),
+            )
+            # A fixed order keeps concurrent multi-line reservations from
+            # deadlocking on databases with row locks.
+            for medicine_id in sorted(merged):
+                quantity = merged[medicine_id]
+                updated = Inventory.objects.filter(
+                    pharmacy=pharmacy, medicine_id=medicine_id, quantity__gte=quantity
+                ).update(quantity=F('quantity') - quantity)
+                if not updated:
+                    raise InsufficientStock(medicine_id, quantity)
+            StockReservationLine.objects.bulk_create([
+                StockReservationLine(reservation=reservation, medicine_id=medicine_id, quantity=quantity)
+                for medicine_id, quantity in merged.items()
+            ])
+    except IntegrityError:
+        existing = StockReservation.objects.filter(idempotency_key=idempotency_key).first()
+        if existing is None:
+            raise
+        stored = dict(existing.lines.values_list('medicine_id', 'quantity'))
+        if existing.pharmacy_id != pharmacy.id or stored != dict(merged):
+            raise IdempotencyConflict(
+                f'Idempotency key {idempotency_key!r} was used for a different request'
+            )
+        return existing, False
+    bump('availability')
+    return reservation, True
+
+
+def commit(reservation):
+    """Make a held reservation permanent. Committing twice is a no-op."""
+    updated = StockReservation.objects.filter(
+        pk=reservation.pk, status=StockReservation.HELD
+    ).update(status=StockReservation.COMMITTED)
+    reservation.refresh_from_db(fields=['status'])
+    if not updated and reservation.status != StockReservation.COMMITTED:
+        raise InvalidTransition(f'Cannot commit a {reservation.status} reservation')
+    return reservation
+
+
+def release(reservation):
+    """Return held stock to the inventory. Releasing twice is a no-op."""
+    with transaction.atomic():
+        updated = StockReservation.objects.filter(
+            pk=reservation.pk, status=StockReservation.HELD
+        ).update(status=StockReservation.RELEASED)
+        if updated:
+            # add_stock recreates rows that were pruned while empty.
+            for medicine_id, quantity in reservation.lines.values_list('medicine_id', 'quantity'):
+                add_stock(reservation.pharmacy, medicine_id, quantity)
+    reservation.refresh_from_db(fields=['status'])
+    if not updated and reservation.status != StockReservation.RELEASED:
+        raise InvalidTransition(f'Cannot release a {reservation.status} reservation')
+    if updated:
+        bump('availability')
+    return reservation
+
+
+def release_expired():
+    expired = StockReservation.objects.filter(
+        status=StockReservation.HELD, expires_at__lt=timezone.now()
+    )
+    released = 0
+    for reservation in expired.iterator():
+        try:
+            release(reservation)
+            released += 1
+        except InvalidTransition:
+            # Committed or released concurrently.
+            pass
+    return released
@@ -0,0 +1,79 @@
+"""
+Synthetic datasets for benchmarks. Every generated row is tagged so that
+``delete_dataset`` can remove exactly what ``generate_dataset`` created.
+"""
+import random
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Inventory, Medicine, Pharmacy, SMSRequest, User
+
+BATCH_SIZE = 2000
+SYLLABLES = ('para', 'ceta', 'mol', 'ibu', 'pro', 'fen', 'amo', 'xi', 'cil', 'lin',
+             'met', 'for', 'min', 'az', 'ithro', 'myc', 'ator', 'va', 'sta', 'tin',
+             'lo', 'sar', 'tan', 'cet', 'iri', 'zine', 'pan', 'to', 'pra', 'zole')
+MANUFACTURERS = ('Cipla', 'Sun Pharma', 'Lupin', 'Dr Reddys', 'Mankind', 'Zydus',
+                 'Torrent', 'Alkem', 'Glenmark', 'Abbott')
+CITIES = ('Mumbai', 'Pune', 'Delhi', 'Chennai', 'Kolkata', 'Bengaluru', 'Hyderabad', 'Jaipur')
+
+
+def medicine_name(rng):
+    name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return f'{name} {rng.choice((250, 400, 500, 650))}mg'
+
+
+def generate_dataset(tag, pharmacies, medicines, density, sms, seed=0):
+    """
+    Create ``pharmacies`` x ``medicines`` with roughly ``density`` of the
+    pairs stocked, plus ``sms`` pending SMS requests. Returns the names of
+    a sample of generated medicines, useful for search queries.
+    """
+    rng = random.Random(seed)
+    medicine_rows = Medicine.objects.bulk_create([
+        Medicine(name=medicine_name(rng), description='Synthetic benchmark medicine',
+                 price=rng.randint(5, 500), manufacturer=f'{rng.choice(MANUFACTURERS)} {tag}')
+        for _ in range(medicines)
+    ], batch_size=BATCH_SIZE)
+    users = User.objects.bulk_create([
+        User(username=f'{tag}-pharmacy-{i}', is_pharmacy=True,
+             address=f'{rng.randint(1, 200)} Main Road, {rng.choice(CITIES)}')
+        for i in range(pharmacies)
+    ], batch_size=BATCH_SIZE)
+    pharmacy_rows = Pharmacy.objects.bulk_create([
+        Pharmacy(user=user, license_number=f'{tag}-{i}', store_name=f'Store {tag} {i}',
+                 latitude=rng.uniform(8, 35), longitude=rng.uniform(68, 97))
+        for i, user in enumerate(users)
+    ], batch_size=BATCH_SIZE)
+
+    batch = []
+    for pharmacy in pharmacy_rows:
+        for medicine in medicine_rows:
+            if rng.random() < density:
+                batch.append(Inventory(pharmacy=pharmacy, medicine=medicine,
+                                       quantity=rng.randint(1, 100)))
+                if len(batch) >= BATCH_SIZE:
+                    Inventory.objects.bulk_create(batch)
+                    batch = []
+    Inventory.objects.bulk_create(batch)
+
+    now = timezone.now()
+    batch = []
+    for i in range(sms):
+        batch.append(SMSRequest(
+            phone_number=f'9{rng.randint(0, 10**9 - 1):09d}',
+            medicine_name=rng.choice(medicine_rows).name.lower() if medicine_rows else 'aspirin',
+            location=f'{rng.choice(CITIES)} {tag}',
+            timestamp=now - timedelta(seconds=rng.randint(0, 7 * 86400)),
+        ))
+        if len(batch) >= BATCH_SIZE:
+            SMSRequest.objects.bulk_create(batch)
+            batch = []
+    SMSRequest.objects.bulk_create(batch)
+    return [medicine.name for medicine in rng.sample(medicine_rows, min(50, len(medicine_rows)))]
+
+
+def delete_dataset(tag):
+    SMSRequest.objects.filter(location__endswith=f' {tag}').delete()
+    User.objects.filter(username__startswith=f'{tag}-').delete()
+    Medicine.objects.filter(manufacturer__endswith=f' {tag}').delete()
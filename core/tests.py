@@ -1,3 +1,1293 @@
-from django.test import TestCase
+import io
+import json
+import os
+import runpy
+import tempfile
+import threading
+import uuid
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import alerts, api_docs, fuzzy, sms, sms_demand, stock, throttling, tokens
+from .basket import minimum_cover, resolve_basket
+from .cache import get_version
+from .forecasting import forecast, sms_trend
+from .geo import bounding_boxes, haversine_km, nearby_in_stock, nearby_in_stock_scan
+from .inventory_log import changes_since, compact
+from .management.commands.run_benchmarks import Command as BenchmarkCommand
+from .metrics import registry as metrics_registry
+from .models import (
+    Inventory, InventoryEvent, LowStockAlert, Medicine, MedicineAvailability, MedicineSynonym, Pharmacy,
+    RestockRecommendation, SMSDemandRollup, SMSRequest, SMSRollupCursor, StockReservation, User,
+)
+from .query_plans import CANONICAL_QUERIES, explain, full_scans
+from .search import DatabaseSearchBackend, search_medicines
+from .serializers import InventorySerializer, MedicineSerializer
+from .shaping import serialize_values
+from .snapshots import ENCODINGS, MAGIC, build_snapshot, read_snapshot, snapshot_path
+from .synthetic import delete_dataset, generate_dataset
+
+
+def signed(data):
+    """A JSON webhook body and the headers the SMS gateway would send with it."""
+    body = json.dumps(data)
+    return body, {sms.SIGNATURE_HEADER: sms.sign(body.encode())}
+
+
+class InventoryListQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Medicine.objects.bulk_create([
+            Medicine(name=f'Medicine {i}', description='', price=f'{i}.50',
+                     manufacturer='Acme')
+            for i in range(20)
+        ])
+        cls.user = User.objects.create_user(
+            username='pharmacy', password='secret', is_pharmacy=True
+        )
+        cls.pharmacy = Pharmacy.objects.create(
+            user=cls.user, license_number='L1', store_name='Corner Store'
+        )
+        Inventory.objects.bulk_create([
+            Inventory(pharmacy=cls.pharmacy, medicine=medicine, quantity=3)
+            for medicine in Medicine.objects.all()
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_values_path_matches_serializer(self):
+        queryset = Inventory.objects.filter(pharmacy=self.pharmacy).order_by('id')
+        self.assertEqual(
+            serialize_values(queryset, InventorySerializer),
+            InventorySerializer(queryset, many=True).data,
+        )
+        medicines = Medicine.objects.order_by('id')
+        self.assertEqual(
+            serialize_values(medicines, MedicineSerializer),
+            MedicineSerializer(medicines, many=True).data,
+        )
+
+    def test_inventory_viewset_list_query_count_is_constant(self):
+        # Session, user, inventory rows.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('inventory-list'))
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_pharmacy_inventory_query_count_is_constant(self):
+        # Session, user, pharmacy, inventory rows.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('pharmacy-inventory'))
+        self.assertEqual(len(response.json()), 20)
+        self.assertEqual(response.json()[0]['pharmacy_name'], 'Corner Store')
+
+    def test_shaped_detail_query_count(self):
+        inventory = Inventory.objects.filter(pharmacy=self.pharmacy).first()
+        with self.assertNumQueries(3):
+            self.client.get(reverse('inventory-detail', args=[inventory.id]))
+
+
+class StockReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='pharmacy', password='secret', is_pharmacy=True)
+        cls.pharmacy = Pharmacy.objects.create(user=cls.user, license_number='L1', store_name='Store')
+        cls.aspirin, cls.ibuprofen = Medicine.objects.bulk_create([
+            Medicine(name='Aspirin', description='', price=1, manufacturer='Acme'),
+            Medicine(name='Ibuprofen', description='', price=1, manufacturer='Acme'),
+        ])
+        Inventory.objects.bulk_create([
+            Inventory(pharmacy=cls.pharmacy, medicine=cls.aspirin, quantity=5),
+            Inventory(pharmacy=cls.pharmacy, medicine=cls.ibuprofen, quantity=1),
+        ])
+
+    def quantity(self, medicine):
+        return Inventory.objects.get(pharmacy=self.pharmacy, medicine=medicine).quantity
+
+    def test_reservation_is_all_or_nothing(self):
+        with self.assertRaises(stock.InsufficientStock):
+            stock.reserve(self.pharmacy, [(self.aspirin.id, 2), (self.ibuprofen.id, 2)], 'k1')
+        self.assertEqual(self.quantity(self.aspirin), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_idempotency_key_replays_reservation(self):
+        first, created = stock.reserve(self.pharmacy, [(self.aspirin.id, 2)], 'k1')
+        again, created_again = stock.reserve(self.pharmacy, [(self.aspirin.id, 2)], 'k1')
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(self.quantity(self.aspirin), 3)
+        with self.assertRaises(stock.IdempotencyConflict):
+            stock.reserve(self.pharmacy, [(self.aspirin.id, 1)], 'k1')
+
+    def test_release_returns_stock_once(self):
+        reservation, _ = stock.reserve(self.pharmacy, [(self.aspirin.id, 2)], 'k1')
+        stock.release(reservation)
+        stock.release(reservation)
+        self.assertEqual(self.quantity(self.aspirin), 5)
+        with self.assertRaises(stock.InvalidTransition):
+            stock.commit(reservation)
+
+    def test_api_reserve_and_commit(self):
+        self.client.force_login(self.user)
+        payload = {
+            'idempotency_key': str(uuid.uuid4()),
+            'pharmacy': self.pharmacy.id,
+            'lines': [{'medicine_id': self.aspirin.id, 'quantity': 4}],
+        }
+        response = self.client.post(reverse('stockreservation-list'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(reverse('stockreservation-list'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        reservation_id = response.json()['id']
+        response = self.client.post(reverse('stockreservation-commit', args=[reservation_id]))
+        self.assertEqual(response.json()['status'], StockReservation.COMMITTED)
+        payload['idempotency_key'] = str(uuid.uuid4())
+        response = self.client.post(reverse('stockreservation-list'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.quantity(self.aspirin), 1)
+
+    def test_pharmacy_inventory_post_adds_to_stock(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('pharmacy-inventory'),
+                                    {'medicine_id': self.aspirin.id, 'quantity': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantity'], 8)
+
+    def test_customer_can_hold_and_release_but_not_commit(self):
+        customer = User.objects.create_user(username='customer', password='secret')
+        self.client.force_login(customer)
+        payload = {
+            'idempotency_key': str(uuid.uuid4()),
+            'pharmacy': self.pharmacy.id,
+            'lines': [{'medicine_id': self.aspirin.id, 'quantity': 2}],
+        }
+        reservation_id = self.client.post(reverse('stockreservation-list'), payload,
+                                          content_type='application/json').json()['id']
+        response = self.client.post(reverse('stockreservation-commit', args=[reservation_id]))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(reverse('stockreservation-release', args=[reservation_id]))
+        self.assertEqual(response.json()['status'], StockReservation.RELEASED)
+        self.assertEqual(self.quantity(self.aspirin), 5)
+
+    def test_add_stock_rejects_non_positive_and_unknown(self):
+        self.client.force_login(self.user)
+        url = reverse('pharmacy-inventory')
+        self.assertEqual(self.client.post(url, {'medicine_id': self.aspirin.id, 'quantity': -5}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'medicine_id': self.aspirin.id, 'quantity': 0}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'medicine_id': 999999, 'quantity': 1}).status_code, 400)
+        self.assertEqual(self.quantity(self.aspirin), 5)
+
+    def test_add_medicine_validates_and_adds(self):
+        self.client.force_login(self.user)
+        url = reverse('inventory-add-medicine')
+        for payload in ({'medicine_id': self.aspirin.id, 'quantity': -1},
+                        {'quantity': 1},
+                        {'medicine_id': 999999, 'quantity': 1},
+                        {'medicine_id': self.aspirin.id, 'quantity': 'many'}):
+            with self.subTest(payload):
+                self.assertEqual(self.client.post(url, payload).status_code, 400)
+        self.assertEqual(self.quantity(self.aspirin), 5)
+
+        response = self.client.post(url, {'medicine_id': self.aspirin.id, 'quantity': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantity'], 8)
+        Inventory.objects.filter(medicine=self.ibuprofen).delete()
+        response = self.client.post(url, {'medicine_id': self.ibuprofen.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['quantity'], 0)
+
+    def test_release_restores_pruned_rows(self):
+        reservation, _ = stock.reserve(self.pharmacy, [(self.ibuprofen.id, 1)], 'k1')
+        call_command('prune_empty_inventory', stdout=io.StringIO())
+        self.assertFalse(Inventory.objects.filter(medicine=self.ibuprofen).exists())
+        stock.release(reservation)
+        self.assertEqual(self.quantity(self.ibuprofen), 1)
+
+
+class StockReservationConcurrencyTests(TransactionTestCase):
+    threads = 8
+    operations = 25
+
+    def setUp(self):
+        # Threads get their own connections, which only works when the test
+        # database is a real file (DATABASES['default']['TEST']['NAME']).
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Concurrent writers need a file-backed test database')
+
+    def test_no_lost_updates(self):
+        user = User.objects.create(username='pharmacy', is_pharmacy=True)
+        pharmacy = Pharmacy.objects.create(user=user, license_number='L1', store_name='Store')
+        medicine = Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+        Inventory.objects.create(pharmacy=pharmacy, medicine=medicine, quantity=100)
+
+        def worker():
+            try:
+                for _ in range(self.operations):
+                    try:
+                        stock.reserve(pharmacy, [(medicine.id, 1)], uuid.uuid4().hex)
+                    except stock.InsufficientStock:
+                        pass
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(StockReservation.objects.count(), 100)
+        self.assertEqual(Inventory.objects.get(pharmacy=pharmacy).quantity, 0)
+
+    def test_stress_command(self):
+        out = io.StringIO()
+        call_command('stress_reservations', threads=4, operations=20, stdout=out)
+        self.assertIn('0 errors', out.getvalue())
+        self.assertIn('No lost updates', out.getvalue())
+
+
+class MedicineSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.paracetamol, cls.aspirin, cls.other = Medicine.objects.bulk_create([
+            Medicine(name='Paracetamol 500mg', description='', price=1, manufacturer='Acme'),
+            Medicine(name='Aspirin', description='', price=1, manufacturer='Paracorp'),
+            Medicine(name='Ibuprofen', description='', price=1, manufacturer='Acme'),
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, query):
+        return [medicine.name for medicine in search_medicines(query).object_list]
+
+    def test_prefix_match_ranks_name_above_manufacturer(self):
+        self.assertEqual(self.names('para'), ['Paracetamol 500mg', 'Aspirin'])
+        self.assertEqual(self.names('paracetamol 500'), ['Paracetamol 500mg'])
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        medicine = Medicine.objects.create(name='Cetirizine', description='', price=1, manufacturer='Acme')
+        self.assertEqual(self.names('cetiri'), ['Cetirizine'])
+        Medicine.objects.filter(id=medicine.id).update(name='Loratadine')
+        self.assertEqual(self.names('cetiri'), [])
+        self.assertEqual(self.names('lora'), ['Loratadine'])
+        medicine.delete()
+        self.assertEqual(self.names('lora'), [])
+
+    def test_query_without_tokens_lists_everything(self):
+        # Quotes and operators never reach the FTS MATCH syntax.
+        self.assertEqual(len(self.names('"*')), 3)
+        self.assertEqual(self.names('para"'), ['Paracetamol 500mg', 'Aspirin'])
+
+    def test_database_backend_matches_fts_results(self):
+        backend = DatabaseSearchBackend()
+        self.assertEqual(backend.count('para'), 2)
+        self.assertEqual(backend.ranked_ids('para', 0, 10), [self.paracetamol.id, self.aspirin.id])
+
+    def test_search_view_paginates(self):
+        response = self.client.get(reverse('medicine-search'), {'name': 'acme', 'page': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['medicines']), 2)
+
+
+class NearbyInStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medicine = Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+        cls.pharmacies = []
+        # Stores 0..4 ever further north of the origin; store 2 is sold out.
+        for i in range(5):
+            user = User.objects.create(username=f'pharmacy{i}', is_pharmacy=True)
+            pharmacy = Pharmacy.objects.create(user=user, license_number=f'L{i}', store_name=f'Store {i}',
+                                               latitude=10 + i * 0.1, longitude=77)
+            Inventory.objects.create(pharmacy=pharmacy, medicine=cls.medicine, quantity=0 if i == 2 else 5)
+            cls.pharmacies.append(pharmacy)
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, lat=10, k=10):
+        return [row['pharmacy_id'] for row in nearby_in_stock(self.medicine.id, lat, 77, k)]
+
+    def test_nearest_in_stock_first(self):
+        expected = [self.pharmacies[i].id for i in (0, 1, 3)]
+        self.assertEqual(self.ids(k=3), expected)
+        self.assertEqual(self.ids(k=3), [row['pharmacy_id'] for row in
+                                         nearby_in_stock_scan(self.medicine.id, 10, 77, 3)])
+
+    def test_index_follows_moves_and_deletes(self):
+        moved = self.pharmacies[4]
+        moved.latitude = 9.5
+        moved.save()
+        self.assertEqual(self.ids(lat=9.5, k=1), [moved.id])
+        moved.user.delete()
+        self.assertNotIn(moved.id, self.ids(k=10))
+        Pharmacy.objects.filter(id=self.pharmacies[0].id).update(latitude=None, longitude=None)
+        self.assertNotIn(self.pharmacies[0].id, self.ids(k=10))
+
+    def test_view_rejects_bad_coordinates(self):
+        url = reverse('medicine-nearby', args=[self.medicine.id])
+        self.assertEqual(self.client.get(url, {'lat': 'x', 'lng': 77}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'lat': 91, 'lng': 77}).status_code, 400)
+        response = self.client.get(url, {'lat': 10, 'lng': 77, 'k': 2})
+        self.assertEqual([row['store_name'] for row in response.json()], ['Store 0', 'Store 1'])
+
+    def place(self, index, lat, lng):
+        Pharmacy.objects.filter(id=self.pharmacies[index].id).update(latitude=lat, longitude=lng)
+
+    def test_box_encloses_the_whole_radius(self):
+        # Store 0 is due north just inside the first radius, where a box that
+        # is too short in latitude misses it; store 1 is a little farther out
+        # on the diagonal, well inside any box.
+        self.place(0, 4.998 / 111.195, 0)
+        self.place(1, 4.999 / 111.195 / 2 ** 0.5, 4.999 / 111.195 / 2 ** 0.5)
+        self.assertLess(haversine_km(0, 0, 4.998 / 111.195, 0), 5)
+        self.assertEqual([row['pharmacy_id'] for row in nearby_in_stock(self.medicine.id, 0, 0, 1)],
+                         [self.pharmacies[0].id])
+
+    def test_search_wraps_at_the_antimeridian(self):
+        self.assertEqual(len(bounding_boxes(0, 179.99, 5)), 2)
+        self.place(0, 0, -179.99)
+        self.place(1, 0, 179.0)
+        self.assertEqual([row['pharmacy_id'] for row in nearby_in_stock(self.medicine.id, 0, 179.99, 1)],
+                         [self.pharmacies[0].id])
+
+
+class RejectingGateway(sms.BaseSMSGateway):
+    def send_messages(self, messages):
+        return [False] * len(messages)
+
+
+@override_settings(SMS_WEBHOOK_SECRET='gateway-secret')
+class SMSPipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='pharmacy', is_pharmacy=True, address='12 Main Road, Pune')
+        pharmacy = Pharmacy.objects.create(user=user, license_number='L1', store_name='Corner Store')
+        medicine = Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+        Inventory.objects.create(pharmacy=pharmacy, medicine=medicine, quantity=7)
+
+    def setUp(self):
+        cache.clear()
+        sms.FakeSMSGateway.outbox.clear()
+
+    def post(self, **data):
+        body, headers = signed({'phone_number': '9000000001', **data})
+        return self.client.post(reverse('sms-inbound'), body, content_type='application/json', headers=headers)
+
+    def test_webhook_stores_once_and_worker_replies(self):
+        response = self.post(medicine_name='aspirin', location='pune')
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(self.post(medicine_name=' Aspirin ', location='pune').json()['duplicate'])
+        batch = sms.claim_batch(10)
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(sms.claim_batch(10), [])
+        self.assertEqual(sms.process_batch(batch, sms.FakeSMSGateway()), 1)
+        self.assertEqual(list(sms.FakeSMSGateway.outbox),
+                         [('9000000001', 'Aspirin is available at: Corner Store (7)')])
+        self.assertTrue(SMSRequest.objects.get().response_sent)
+
+    def test_failed_sends_are_retried_after_the_lease(self):
+        self.post(medicine_name='unknownium')
+        self.assertEqual(sms.process_batch(sms.claim_batch(10), RejectingGateway()), 0)
+        self.assertFalse(SMSRequest.objects.get().response_sent)
+        self.assertEqual(sms.claim_batch(10), [])
+        SMSRequest.objects.update(claimed_at=timezone.now() - timedelta(seconds=settings.SMS_CLAIM_LEASE + 1))
+        self.assertEqual(len(sms.claim_batch(10)), 1)
+
+    def test_expired_claim_does_not_touch_the_new_owner(self):
+        self.post(medicine_name='aspirin')
+        batch = sms.claim_batch(10)
+        SMSRequest.objects.update(claim_token='other-worker')
+        sms.process_batch(batch, sms.FakeSMSGateway())
+        request = SMSRequest.objects.get()
+        self.assertEqual((request.response_sent, request.claim_token), (False, 'other-worker'))
+
+    def test_webhook_rejects_incomplete_messages(self):
+        self.assertEqual(self.post(location='pune').status_code, 400)
+        self.assertFalse(SMSRequest.objects.exists())
+
+    def test_webhook_requires_the_gateway_signature(self):
+        url = reverse('sms-inbound')
+        body, headers = signed({'phone_number': '9000000001', 'medicine_name': 'aspirin'})
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 403)
+        forged = {sms.SIGNATURE_HEADER: sms.sign(body.encode() + b' ')}
+        self.assertEqual(self.client.post(url, body, content_type='application/json', headers=forged).status_code, 403)
+        with override_settings(SMS_WEBHOOK_SECRET=''):
+            self.assertEqual(self.client.post(url, body, content_type='application/json',
+                                              headers=headers).status_code, 403)
+        self.assertFalse(SMSRequest.objects.exists())
+
+    def test_gateway_required_outside_debug(self):
+        with override_settings(SMS_GATEWAY=''), self.assertRaises(ImproperlyConfigured):
+            sms.get_sms_gateway()
+
+    def test_fake_outbox_is_capped(self):
+        gateway = sms.FakeSMSGateway()
+        gateway.send_messages([('1', str(i)) for i in range(sms.FakeSMSGateway.OUTBOX_LIMIT + 5)])
+        self.assertEqual(len(sms.FakeSMSGateway.outbox), sms.FakeSMSGateway.OUTBOX_LIMIT)
+        self.assertEqual(sms.FakeSMSGateway.outbox[-1], ('1', str(sms.FakeSMSGateway.OUTBOX_LIMIT + 4)))
+
+
+class InventorySyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='pharmacy', is_pharmacy=True)
+        cls.pharmacy = Pharmacy.objects.create(user=cls.user, license_number='L1', store_name='Store')
+        cls.aspirin, cls.ibuprofen = Medicine.objects.bulk_create([
+            Medicine(name='Aspirin', description='', price=1, manufacturer='Acme'),
+            Medicine(name='Ibuprofen', description='', price=1, manufacturer='Acme'),
+        ])
+        Inventory.objects.create(pharmacy=cls.pharmacy, medicine=cls.aspirin, quantity=1, reorder_threshold=4)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def sync(self, body, content_type):
+        return self.client.post(reverse('pharmacy-inventory-sync'), body, content_type=content_type)
+
+    def stock(self):
+        return dict(Inventory.objects.filter(pharmacy=self.pharmacy)
+                    .values_list('medicine_id', 'quantity'))
+
+    def test_csv_upserts_and_reports_bad_rows(self):
+        body = (f'\ufeffmedicine_id,quantity\n{self.aspirin.id},10\n{self.ibuprofen.id},x\n'
+                f'999999,3\n{self.ibuprofen.id},-1\n').encode()
+        report = self.sync(body, 'text/csv').json()
+        self.assertEqual((report['processed'], report['upserted'], report['error_count']), (4, 1, 3))
+        self.assertEqual([error['line'] for error in report['errors']], [3, 5, 4])
+        self.assertEqual(self.stock(), {self.aspirin.id: 10})
+        # The stored threshold survives a row that does not carry one.
+        self.assertEqual(Inventory.objects.get(medicine=self.aspirin).reorder_threshold, 4)
+
+    def test_ndjson_upserts_new_rows(self):
+        body = '\n'.join([json.dumps({'medicine_id': self.ibuprofen.id, 'quantity': 6}), '', '{oops'])
+        report = self.sync(body, 'application/x-ndjson').json()
+        self.assertEqual((report['upserted'], report['errors']), (1, [{'line': 3, 'error': 'malformed record'}]))
+        self.assertEqual(self.stock(), {self.aspirin.id: 1, self.ibuprofen.id: 6})
+
+    def test_undecodable_input_is_a_client_error(self):
+        body = f'medicine_id,quantity\n{self.aspirin.id},2\n\xe9\xff,3\n'.encode('latin-1')
+        response = self.sync(body, 'text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['line'], 3)
+        self.assertEqual(self.sync(b'', 'application/xml').status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create(username='someone')
+        Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+
+    def test_public_lists_export_ndjson(self):
+        response = self.client.get(reverse('medicine-list'), {'export': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['name'], 'Aspirin')
+
+    def test_user_table_is_not_exportable(self):
+        response = self.client.get(reverse('user-list'), {'export': 'ndjson'})
+        self.assertFalse(response.streaming)
+        self.assertIn('results', response.json())
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medicine = Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **headers):
+        return self.client.get(reverse('medicine-list'), headers=headers)
+
+    def test_hit_and_not_modified(self):
+        first = self.get()
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        self.assertEqual(self.get(if_none_match=first['ETag']).status_code, 304)
+
+    def test_write_invalidates_after_commit(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.medicine.name = 'Aspirin 75mg'
+            self.medicine.save()
+            # Not before the commit: a read now would cache the old data anew.
+            self.assertEqual(self.get()['ETag'], etag)
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['name'], 'Aspirin 75mg')
+
+    def test_rolled_back_write_keeps_version(self):
+        version = get_version('catalogue')
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Medicine.objects.create(name='Ibuprofen', description='', price=1, manufacturer='Acme')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(get_version('catalogue'), version)
+
+    def test_evicted_version_is_not_reused(self):
+        version = get_version('catalogue')
+        self.assertNotEqual(version, 1)
+        cache.delete('version:catalogue')
+        self.assertNotEqual(get_version('catalogue'), version)
+
+    def test_stats_are_staff_only(self):
+        url = reverse('cache-stats')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class DatabaseProfileTests(TestCase):
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(str(settings.BASE_DIR / 'pharmareach' / 'settings.py'))
+
+    def test_tuned_sqlite_connection(self):
+        if connection.vendor != 'sqlite' or 'init_command' not in connection.settings_dict['OPTIONS']:
+            self.skipTest('Tuned SQLite profile not in use')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def test_profiles(self):
+        sqlite = self.load_settings(DB_PROFILE='sqlite', DB_SQLITE_TUNED='True')['DATABASES']['default']
+        self.assertIn('PRAGMA journal_mode=WAL;', sqlite['OPTIONS']['init_command'])
+        self.assertEqual(sqlite['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        postgres = self.load_settings(DB_PROFILE='postgres', DB_POOL='True')['DATABASES']['default']
+        self.assertEqual(postgres['CONN_MAX_AGE'], 0)
+        self.assertIn('pool', postgres['OPTIONS'])
+
+    def test_unknown_profile_is_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_settings(DB_PROFILE='oracle')
+
+
+class QueryPlanTests(TestCase):
+    def test_canonical_queries_use_indexes(self):
+        for name, build in CANONICAL_QUERIES.items():
+            with self.subTest(name):
+                self.assertEqual(full_scans(explain(build())), [])
+
+    def test_full_scan_is_detected(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan format differs')
+        self.assertEqual(full_scans(explain(Medicine.objects.filter(description='x'))), ['core_medicine'])
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_registry.reset()
+
+    def test_requests_are_recorded(self):
+        Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+        self.client.get(reverse('medicine-search'), {'q': 'asp'})
+        self.assertEqual(metrics_registry.requests['medicine-search', 'GET', 200], 1)
+        self.assertGreater(metrics_registry.histograms['http_request_db_queries']['medicine-search'].total, 0)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('http_requests_total{view="medicine-search",method="GET",status="200"} 1', text)
+        self.assertIn('# TYPE throttle_requests_total counter', text)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_endpoint_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+class BenchmarkTests(TestCase):
+    def test_dataset_is_generated_and_deleted(self):
+        Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+        names = generate_dataset('benchtest', pharmacies=3, medicines=20, density=0.5, sms=10)
+        self.assertEqual(len(names), 20)
+        self.assertEqual(Pharmacy.objects.filter(license_number__startswith='benchtest-').count(), 3)
+        self.assertEqual(Medicine.objects.count(), 21)
+        self.assertTrue(Inventory.objects.exists())
+        self.assertEqual(SMSRequest.objects.count(), 10)
+
+        delete_dataset('benchtest')
+        self.assertEqual(list(Medicine.objects.values_list('name', flat=True)), ['Aspirin'])
+        self.assertFalse(Pharmacy.objects.exists())
+        self.assertFalse(Inventory.objects.exists())
+        self.assertFalse(SMSRequest.objects.exists())
+
+    def test_baseline_comparison(self):
+        report = {'endpoints': {'search': {'p95_ms': 10.0, 'mean_queries': 2.0}}}
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as baseline:
+            json.dump(report, baseline)
+            baseline.flush()
+            command = BenchmarkCommand()
+            command.compare(report, baseline.name, 0.25)
+            slower = {'endpoints': {'search': {'p95_ms': 20.0, 'mean_queries': 2.0}}}
+            with self.assertRaisesMessage(CommandError, 'search p95_ms: 10.0 -> 20.0'):
+                command.compare(slower, baseline.name, 0.25)
+
+
+@override_settings(SMS_WEBHOOK_SECRET='gateway-secret')
+class AsyncViewTests(TransactionTestCase):
+    # fan_out reads on other threads, which only see committed rows.
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='pharmacy', is_pharmacy=True)
+        self.pharmacy = Pharmacy.objects.create(user=user, license_number='L1', store_name='Store',
+                                                latitude=10, longitude=10)
+        self.medicine = Medicine.objects.create(name='Paracetamol 500mg', description='', price=1,
+                                                manufacturer='Acme')
+        Medicine.objects.create(name='Ibuprofen', description='', price=1, manufacturer='Acme')
+        Inventory.objects.create(pharmacy=self.pharmacy, medicine=self.medicine, quantity=7)
+
+    async def test_search(self):
+        response = await self.async_client.get(reverse('async-medicine-search'), {'name': 'para'})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 1)
+        self.assertEqual([row['name'] for row in body['results']], ['Paracetamol 500mg'])
+
+        response = await self.async_client.get(reverse('async-medicine-search'), {'page': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_availability(self):
+        url = reverse('async-medicine-availability', args=[self.medicine.id])
+        body = (await self.async_client.get(url, {'lat': 10, 'lng': 10})).json()
+        self.assertEqual(body['total_quantity'], 7)
+        self.assertEqual(body['pharmacies'][0]['pharmacy_id'], self.pharmacy.id)
+
+        response = await self.async_client.get(url, {'lat': 10})
+        self.assertEqual(response.status_code, 400)
+        missing = reverse('async-medicine-availability', args=[self.medicine.id + 100])
+        self.assertEqual((await self.async_client.get(missing)).status_code, 404)
+
+    async def test_sms_inbound_deduplicates(self):
+        url = reverse('async-sms-inbound')
+        body, headers = signed({'phone_number': '+919812345678', 'medicine_name': 'Paracetamol'})
+        first = await self.async_client.post(url, body, content_type='application/json', headers=headers)
+        self.assertEqual(first.status_code, 202)
+        second = await self.async_client.post(url, body, content_type='application/json', headers=headers)
+        self.assertEqual(second.json(), {'id': first.json()['id'], 'duplicate': True})
+
+        headers = {sms.SIGNATURE_HEADER: sms.sign(b'{')}
+        response = await self.async_client.post(url, '{', content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+class TokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='customer', password='Secret-pass-1234')
+        response = self.client.post(reverse('token-obtain'),
+                                    {'username': 'customer', 'password': 'Secret-pass-1234'})
+        self.assertEqual(response.status_code, 200)
+        self.pair = response.json()
+
+    def get(self, access):
+        return self.client.get(reverse('medicine-list'), HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def refresh(self, token):
+        return self.client.post(reverse('token-refresh'), {'refresh': token})
+
+    def test_refresh_rotates_the_pair(self):
+        self.assertEqual(self.get(self.pair['access']).status_code, 200)
+        response = self.refresh(self.pair['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(response.json()['access']).status_code, 200)
+        self.assertEqual(self.get(self.pair['access']).status_code, 401)
+        # A refresh token works once.
+        self.assertEqual(self.refresh(self.pair['refresh']).status_code, 401)
+
+    def test_concurrent_reuse_is_rejected(self):
+        # The other request rotated the token after this one checked the list.
+        tokens.refresh(self.pair['refresh'])
+        with mock.patch.object(tokens, 'is_revoked', return_value=False):
+            with self.assertRaisesMessage(tokens.TokenError, 'revoked'):
+                tokens.refresh(self.pair['refresh'])
+
+    def test_revoke(self):
+        response = self.client.post(reverse('token-revoke'), {'refresh': self.pair['refresh']})
+        self.assertEqual(response.status_code, 204)
+        response = self.client.post(reverse('token-revoke'), {'refresh': self.pair['refresh']})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get(self.pair['access']).status_code, 401)
+        self.assertEqual(self.refresh(self.pair['refresh']).status_code, 401)
+        self.assertEqual(self.refresh('not-a-token').status_code, 401)
+
+
+class AvailabilitySummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medicine = Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+        cls.pharmacies = [
+            Pharmacy.objects.create(user=User.objects.create(username=f'pharmacy{i}', is_pharmacy=True),
+                                    license_number=f'L{i}', store_name=f'Store {i}')
+            for i in range(2)
+        ]
+
+    def totals(self):
+        summary = MedicineAvailability.objects.get(medicine=self.medicine)
+        return summary.pharmacy_count, summary.total_quantity
+
+    def test_triggers_follow_every_write(self):
+        self.assertEqual(self.totals(), (0, 0))
+        first = Inventory.objects.create(pharmacy=self.pharmacies[0], medicine=self.medicine, quantity=5)
+        Inventory.objects.bulk_create([Inventory(pharmacy=self.pharmacies[1], medicine=self.medicine, quantity=3)])
+        self.assertEqual(self.totals(), (2, 8))
+        Inventory.objects.filter(id=first.id).update(quantity=0)
+        self.assertEqual(self.totals(), (1, 3))
+        Inventory.objects.filter(medicine=self.medicine).delete()
+        self.assertEqual(self.totals(), (0, 0))
+
+    def test_rebuild_repairs_drift(self):
+        Inventory.objects.create(pharmacy=self.pharmacies[0], medicine=self.medicine, quantity=5)
+        MedicineAvailability.objects.filter(medicine=self.medicine).update(pharmacy_count=9, total_quantity=1)
+        with self.assertRaisesMessage(CommandError, '1 medicines have drifted totals'):
+            call_command('rebuild_availability', '--check', stdout=io.StringIO())
+        call_command('rebuild_availability', stdout=io.StringIO())
+        self.assertEqual(self.totals(), (1, 5))
+
+
+class LowStockAlertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pharmacy = Pharmacy.objects.create(user=User.objects.create(username='pharmacy', is_pharmacy=True),
+                                               license_number='L1', store_name='Store')
+        cls.aspirin, cls.ibuprofen = Medicine.objects.bulk_create([
+            Medicine(name='Aspirin', description='', price=1, manufacturer='Acme'),
+            Medicine(name='Ibuprofen', description='', price=1, manufacturer='Acme'),
+        ])
+
+    def setUp(self):
+        alerts.LocMemAlertSink.outbox = []
+
+    def test_trigger_opens_and_resolves_alerts(self):
+        row = Inventory.objects.create(pharmacy=self.pharmacy, medicine=self.aspirin,
+                                       quantity=10, reorder_threshold=3)
+        self.assertFalse(LowStockAlert.objects.exists())
+        Inventory.objects.filter(id=row.id).update(quantity=3)
+        Inventory.objects.filter(id=row.id).update(quantity=2)
+        alert = LowStockAlert.objects.get()
+        self.assertEqual((alert.quantity, alert.threshold, alert.resolved_at), (3, 3, None))
+        Inventory.objects.filter(id=row.id).update(quantity=20)
+        alert.refresh_from_db()
+        self.assertIsNotNone(alert.resolved_at)
+
+    def test_dispatch_groups_by_pharmacy_and_skips_resolved(self):
+        rows = Inventory.objects.bulk_create([
+            Inventory(pharmacy=self.pharmacy, medicine=medicine, quantity=5, reorder_threshold=3)
+            for medicine in (self.aspirin, self.ibuprofen)
+        ])
+        Inventory.objects.filter(pharmacy=self.pharmacy).update(quantity=1)
+        Inventory.objects.filter(id=rows[1].id).update(quantity=50)
+
+        self.assertEqual(alerts.dispatch_pending(sink=alerts.LocMemAlertSink()), 1)
+        [(pharmacy, payload)] = alerts.LocMemAlertSink.outbox
+        self.assertEqual(pharmacy, self.pharmacy)
+        self.assertEqual([alert['medicine_name'] for alert in payload], ['Aspirin'])
+        self.assertEqual(alerts.dispatch_pending(sink=alerts.LocMemAlertSink()), 0)
+
+    def test_file_sink_is_the_default(self):
+        self.assertIsInstance(alerts.get_alert_sink(), alerts.FileAlertSink)
+
+    def test_prune_keeps_rows_with_a_threshold(self):
+        Inventory.objects.bulk_create([
+            Inventory(pharmacy=self.pharmacy, medicine=self.aspirin, quantity=0),
+            Inventory(pharmacy=self.pharmacy, medicine=self.ibuprofen, quantity=0, reorder_threshold=2),
+        ])
+        call_command('prune_empty_inventory', stdout=io.StringIO())
+        self.assertEqual(list(Inventory.objects.values_list('medicine_id', flat=True)), [self.ibuprofen.id])
+
+
+class InventoryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='pharmacy', is_pharmacy=True)
+        cls.pharmacy = Pharmacy.objects.create(user=cls.user, license_number='L1', store_name='Store')
+        cls.aspirin, cls.ibuprofen = Medicine.objects.bulk_create([
+            Medicine(name='Aspirin', description='', price=1, manufacturer='Acme'),
+            Medicine(name='Ibuprofen', description='', price=1, manufacturer='Acme'),
+        ])
+
+    def changes(self, since, limit=None):
+        result = changes_since(self.pharmacy, since, limit)
+        return result, [(change['medicine_id'], change['quantity'], change['deleted'])
+                        for change in result['changes']]
+
+    def test_triggers_log_every_write(self):
+        row = Inventory.objects.create(pharmacy=self.pharmacy, medicine=self.aspirin, quantity=5)
+        Inventory.objects.bulk_create([Inventory(pharmacy=self.pharmacy, medicine=self.ibuprofen, quantity=2)])
+        Inventory.objects.filter(id=row.id).update(quantity=4)
+        result, changes = self.changes(0)
+        self.assertEqual(changes, [(self.ibuprofen.id, 2, False), (self.aspirin.id, 4, False)])
+        self.assertFalse(result['reset'])
+
+        row.delete()
+        result, changes = self.changes(result['cursor'])
+        self.assertEqual(changes, [(self.aspirin.id, None, True)])
+        self.assertEqual(self.changes(result['cursor'])[1], [])
+
+    def test_pages_follow_the_cursor(self):
+        row = Inventory.objects.create(pharmacy=self.pharmacy, medicine=self.aspirin, quantity=5)
+        for quantity in (4, 3):
+            Inventory.objects.filter(id=row.id).update(quantity=quantity)
+        result, changes = self.changes(0, limit=2)
+        self.assertTrue(result['has_more'])
+        self.assertEqual(changes, [(self.aspirin.id, 4, False)])
+        result, changes = self.changes(result['cursor'], limit=2)
+        self.assertFalse(result['has_more'])
+        self.assertEqual(changes, [(self.aspirin.id, 3, False)])
+
+    def test_compaction_keeps_latest_and_resets_old_cursors(self):
+        kept = Inventory.objects.create(pharmacy=self.pharmacy, medicine=self.aspirin, quantity=5)
+        Inventory.objects.filter(id=kept.id).update(quantity=6)
+        Inventory.objects.create(pharmacy=self.pharmacy, medicine=self.ibuprofen, quantity=1).delete()
+        InventoryEvent.objects.update(created_at=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(compact(timedelta(days=7)), 3)
+        self.assertEqual(list(InventoryEvent.objects.values_list('medicine_id', 'quantity')),
+                         [(self.aspirin.id, 6)])
+        # The dropped deletion may not have reached a client this far behind.
+        result, changes = self.changes(0)
+        self.assertTrue(result['reset'])
+        self.assertEqual(changes, [(self.aspirin.id, 6, False)])
+
+    def test_view_validates_parameters(self):
+        self.client.force_login(self.user)
+        url = reverse('pharmacy-inventory-changes')
+        self.assertEqual(self.client.get(url, {'since': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since': 0, 'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since': 0}).json()['cursor'], 0)
+
+
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', is_staff=True)
+        # Pharmacies 1 and 100 fall in different inventory row groups.
+        cls.pharmacies = [
+            Pharmacy.objects.create(id=pk, user=User.objects.create(username=f'pharmacy{pk}', is_pharmacy=True),
+                                    license_number=f'L{pk}', store_name=f'Store {pk}')
+            for pk in (1, 100)
+        ]
+        cls.aspirin, cls.ibuprofen = Medicine.objects.bulk_create([
+            Medicine(name='Aspirin', description='', price='1.25', manufacturer='Acme'),
+            Medicine(name='Ibuprofen', description='Pain relief', price=3, manufacturer='Acme'),
+        ])
+        Inventory.objects.bulk_create([
+            Inventory(pharmacy=pharmacy, medicine=medicine, quantity=5)
+            for pharmacy in cls.pharmacies for medicine in (cls.aspirin, cls.ibuprofen)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SNAPSHOT_DIR=directory.name))
+
+    def test_encodings_round_trip(self):
+        samples = {
+            'int': [7, 300, 70000, 7],
+            'string': ['Paracetamol', '', 'Crocín'],
+            'dictionary': ['Acme', 'Cipla', 'Acme', 'Acme'],
+        }
+        for encoding, values in samples.items():
+            with self.subTest(encoding):
+                encode, decode = ENCODINGS[encoding]
+                self.assertEqual(decode(*encode(values)), values)
+
+    def test_snapshot_round_trip(self):
+        build_snapshot('medicines', 'lzma')
+        columns = read_snapshot(snapshot_path('medicines'))
+        self.assertEqual(columns['name'], ['Aspirin', 'Ibuprofen'])
+        self.assertEqual(columns['price_cents'], [125, 300])
+        self.assertEqual(columns['manufacturer'], ['Acme', 'Acme'])
+
+    def test_rebuild_reencodes_only_changed_groups(self):
+        self.assertEqual(build_snapshot('inventory')['reused_row_groups'], 0)
+        Inventory.objects.filter(pharmacy_id=100, medicine=self.aspirin).update(quantity=9)
+        footer = build_snapshot('inventory')
+        self.assertEqual((len(footer['row_groups']), footer['reused_row_groups']), (2, 1))
+        self.assertEqual(read_snapshot(snapshot_path('inventory'))['quantity'], [5, 5, 9, 5])
+
+    def test_rebuild_sees_compacted_pharmacy_deletions(self):
+        build_snapshot('inventory')
+        self.pharmacies[1].delete()
+        InventoryEvent.objects.update(created_at=timezone.now() - timedelta(days=30))
+        compact(timedelta(days=7))
+        self.assertFalse(InventoryEvent.objects.filter(pharmacy_id=100).exists())
+        build_snapshot('inventory')
+        self.assertEqual(read_snapshot(snapshot_path('inventory'))['pharmacy_id'], [1, 1])
+
+    def test_truncated_file_is_rebuilt(self):
+        path = snapshot_path('medicines')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(MAGIC[:3])
+        self.assertEqual(self.get().status_code, 404)
+        build_snapshot('medicines')
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_catalogue_edits_are_picked_up(self):
+        build_snapshot('medicines')
+        # No signal, no cache version: only the rows themselves show it.
+        Medicine.objects.filter(id=self.aspirin.id).update(name='Aspirin 75mg')
+        build_snapshot('medicines')
+        self.assertEqual(read_snapshot(snapshot_path('medicines'))['name'][0], 'Aspirin 75mg')
+
+    def get(self, **headers):
+        return self.client.get(reverse('snapshot', args=['medicines']), headers=headers)
+
+    def test_view_serves_exported_file_with_ranges(self):
+        self.assertEqual(self.get().status_code, 404)
+        build_snapshot('medicines')
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        etag = response['ETag']
+        self.assertTrue(body.startswith(MAGIC))
+
+        # Requests do not rebuild.
+        Medicine.objects.create(name='Cetirizine', description='', price=1, manufacturer='Acme')
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+        response = self.get(range='bytes=-8', if_range=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes {len(body) - 8}-{len(body) - 1}/{len(body)}')
+        self.assertEqual(b''.join(response.streaming_content), MAGIC)
+        # A stale validator gets the whole file.
+        self.assertEqual(self.get(range='bytes=0-7', if_range='"old"').status_code, 200)
+        self.assertEqual(self.get(range=f'bytes={len(body)}-').status_code, 416)
+
+    def test_inventory_is_for_staff(self):
+        build_snapshot('inventory')
+        url = reverse('snapshot', args=['inventory'])
+        self.client.force_login(self.pharmacies[0].user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class FuzzyMatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.paracetamol, cls.amoxicillin, cls.ibuprofen = Medicine.objects.bulk_create([
+            Medicine(name='Paracetamol 500mg', description='', price=1, manufacturer='Acme'),
+            Medicine(name='Amoxicillin 250mg', description='', price=1, manufacturer='Acme'),
+            Medicine(name='Ibuprofen 400mg', description='', price=1, manufacturer='Acme'),
+        ])
+        MedicineSynonym.objects.create(alias='Crocin', name='Paracetamol')
+        cls.user = User.objects.create(username='customer')
+
+    def setUp(self):
+        cache.clear()
+        self.matcher = fuzzy.FuzzyMatcher()
+        self.matcher.load()
+
+    def test_edit_distance_counts_transpositions_once(self):
+        self.assertEqual(fuzzy.edit_distance('paracetamol', 'paracetmol'), 1)
+        self.assertEqual(fuzzy.edit_distance('ibuprofen', 'ibuprfoen'), 1)
+
+    def test_misspellings_and_synonyms(self):
+        self.assertEqual(self.matcher.best_match('paracetmol'), self.paracetamol.id)
+        self.assertEqual(self.matcher.best_match('amoxycilin 250'), self.amoxicillin.id)
+        self.assertEqual(self.matcher.best_match('crocin'), self.paracetamol.id)
+        self.assertIsNone(self.matcher.best_match('zzzz'))
+
+    def test_index_follows_writes(self):
+        self.matcher.medicine_deleted(self.ibuprofen.id)
+        self.assertIsNone(self.matcher.best_match('ibuprofen'))
+        MedicineSynonym.objects.create(alias='Brufen', name='Ibuprofen')
+        self.matcher.medicine_saved(self.ibuprofen)
+        self.matcher.sync_synonyms()
+        self.assertEqual(self.matcher.best_match('brufen'), self.ibuprofen.id)
+
+    def test_match_endpoint_clamps_limit(self):
+        self.client.force_login(self.user)
+        url = reverse('medicine-match')
+        with mock.patch.object(fuzzy, '_matcher', self.matcher):
+            response = self.client.get(url, {'q': 'paracetmol', 'limit': 0})
+            self.assertEqual([row['id'] for row in response.json()], [self.paracetamol.id])
+            self.assertEqual(self.client.get(url, {'q': 'para', 'limit': 'x'}).status_code, 400)
+
+    def test_match_endpoint_rejects_long_queries(self):
+        self.client.force_login(self.user)
+        url = reverse('medicine-match')
+        with mock.patch.object(fuzzy, '_matcher', self.matcher):
+            self.assertEqual(self.client.get(url, {'q': 'p' * 101}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'q': 'p' * 100}).status_code, 200)
+
+
+class BasketTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medicines = Medicine.objects.bulk_create([
+            Medicine(name=f'Medicine {i}', description='', price=1, manufacturer='Acme') for i in range(4)
+        ])
+        cls.pharmacies = [
+            Pharmacy.objects.create(user=User.objects.create(username=f'pharmacy{i}', is_pharmacy=True),
+                                    license_number=f'L{i}', store_name=f'Store {i}',
+                                    latitude=10 + i, longitude=10)
+            for i in range(3)
+        ]
+        first, second, third, fourth = cls.medicines
+        Inventory.objects.bulk_create([
+            Inventory(pharmacy=cls.pharmacies[0], medicine=first, quantity=5),
+            Inventory(pharmacy=cls.pharmacies[0], medicine=second, quantity=1),
+            Inventory(pharmacy=cls.pharmacies[1], medicine=second, quantity=5),
+            Inventory(pharmacy=cls.pharmacies[1], medicine=third, quantity=5),
+            Inventory(pharmacy=cls.pharmacies[2], medicine=first, quantity=5),
+            Inventory(pharmacy=cls.pharmacies[2], medicine=second, quantity=5),
+            Inventory(pharmacy=cls.pharmacies[2], medicine=fourth, quantity=0),
+        ])
+
+    def ids(self, *positions):
+        return [self.medicines[position].id for position in positions]
+
+    def test_complete_pharmacies_nearest_first(self):
+        items = [(medicine_id, 1) for medicine_id in self.ids(0, 1)]
+        result = resolve_basket(items, lat=12, lng=10)
+        self.assertEqual(result['complete_count'], 2)
+        self.assertEqual([pharmacy['id'] for pharmacy in result['complete']],
+                         [self.pharmacies[2].id, self.pharmacies[0].id])
+        self.assertEqual(result['cover'], [])
+
+    def test_split_over_fewest_pharmacies(self):
+        # Split items add up: pharmacy 0 holds only one of the two units.
+        first, second, third, fourth = self.ids(0, 1, 2, 3)
+        result = resolve_basket([(first, 1), (second, 1), (second, 1), (third, 1), (fourth, 1)])
+        self.assertEqual(result['complete'], [])
+        self.assertEqual([(part['id'], part['medicine_ids']) for part in result['cover']],
+                         [(self.pharmacies[2].id, [first, second]), (self.pharmacies[1].id, [third])])
+        self.assertEqual(result['unavailable'], [fourth])
+
+    def test_minimum_cover(self):
+        self.assertEqual(sorted(minimum_cover({0b0011: [], 0b0110: [], 0b1100: []}, 0b1111)), [0b0011, 0b1100])
+        self.assertEqual(len(minimum_cover({0b001: [], 0b010: [], 0b100: []}, 0b111)), 3)
+
+    def test_view_validates_the_basket(self):
+        cache.clear()
+        url = reverse('basket-availability')
+        self.assertEqual(self.client.post(url, {'items': []}, content_type='application/json').status_code, 400)
+        response = self.client.post(url, {'items': [{'medicine_id': self.medicines[0].id}], 'lat': 10},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {'items': [{'medicine_id': self.medicines[0].id}]},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['complete_count'], 2)
+
+
+class APIDocsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(API_SCHEMA_DIR=directory.name))
+        api_docs.reset()
+        self.addCleanup(api_docs.reset)
+
+    def test_schema_revalidates_with_etag(self):
+        response = self.client.get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/api/medicines/', json.loads(response.content)['paths'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/swagger.json', headers={'if-none-match': etag}).status_code, 304)
+        self.assertEqual(self.client.post('/swagger.json').status_code, 405)
+
+    def test_exported_schema_is_served_from_disk(self):
+        call_command('export_api_schema', stdout=io.StringIO())
+        with mock.patch.object(api_docs, 'render_schemas', side_effect=AssertionError):
+            response = self.client.get('/swagger.yaml')
+        self.assertEqual(response.content, api_docs.schema_path('yaml').read_bytes())
+
+    def test_disabled_docs_drop_the_routes(self):
+        with override_settings(API_DOCS_ENABLED=False):
+            urlconf = runpy.run_path(str(settings.BASE_DIR / 'pharmareach' / 'urls.py'))
+        names = {getattr(pattern, 'name', None) for pattern in urlconf['urlpatterns']}
+        self.assertNotIn('schema-json', names)
+
+
+@override_settings(THROTTLE_RATES={'ip': '2/min', 'phone': '1/min'}, SMS_WEBHOOK_SECRET='gateway-secret')
+class ThrottlingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Medicine.objects.create(name='Aspirin', description='', price=1, manufacturer='Acme')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_over_budget_gets_429(self):
+        url = reverse('medicine-search')
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, {'name': 'asp'}).status_code, 200)
+        response = self.client.get(url, {'name': 'asp'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertIn(('ip', 'rejected'), {(scope, outcome) for scope, outcome, _ in throttling.counters()})
+
+    def test_cached_view_degrades_to_stale_copy(self):
+        url = reverse('medicine-list')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        # Over budget: the current entry, then a stale one once it is invalidated.
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        cache.delete('version:catalogue')
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'STALE'))
+        self.assertEqual(self.client.get(url, {'page': 2}).status_code, 429)
+
+    def test_phone_bucket_and_non_object_body(self):
+        url = reverse('sms-inbound')
+        payload = {'phone_number': '+919812345678', 'medicine_name': 'Aspirin'}
+        body, headers = signed(payload)
+        for expected in (202, 429):
+            response = self.client.post(url, body, content_type='application/json', headers=headers)
+            self.assertEqual(response.status_code, expected)
+        body, headers = signed([payload])
+        response = self.client.post(url, body, content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_throttle(self):
+        url = reverse('async-sms-inbound')
+        body, headers = signed({'phone_number': '+919812345679', 'medicine_name': 'Aspirin'})
+        with mock.patch('core.views.aenqueue_request', return_value=(SMSRequest(id=1), True)):
+            first = await self.async_client.post(url, body, content_type='application/json', headers=headers)
+            second = await self.async_client.post(url, body, content_type='application/json', headers=headers)
+        self.assertEqual((first.status_code, second.status_code), (202, 429))
+        self.assertIn('Retry-After', second)
+
+
+class SMSDemandTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def sms(self, age, name='Paracetamol', location='Pune', **fields):
+        return SMSRequest.objects.create(phone_number='+919812345678', medicine_name=name, location=location,
+                                         timestamp=self.now - age, **fields)
+
+    def counts(self, period):
+        return list(SMSDemandRollup.objects.filter(period=period).values_list('medicine_name', 'count'))
+
+    def test_roll_up_advances_cursor_and_upserts(self):
+        first = self.sms(timedelta(minutes=10))
+        second = self.sms(timedelta(minutes=9), name='  PARACETAMOL ')
+        # Younger than SMS_ROLLUP_LAG: may still have rows committing below it.
+        young = self.sms(timedelta(seconds=1))
+        self.assertEqual(sms_demand.roll_up(), 2)
+        self.assertEqual(SMSRollupCursor.objects.get().last_id, second.id)
+        self.assertEqual(self.counts(SMSDemandRollup.DAY), [('paracetamol', 2)])
+        self.assertEqual(sms_demand.roll_up(), 0)
+
+        SMSRequest.objects.filter(id=young.id).update(timestamp=first.timestamp)
+        self.assertEqual(sms_demand.roll_up(), 1)
+        self.assertEqual(self.counts(SMSDemandRollup.HOUR), [('paracetamol', 3)])
+        self.assertEqual(sms_demand.demand(), [{'medicine_name': 'paracetamol', 'requests': 3}])
+
+    def test_archive_moves_only_answered_rolled_up_requests(self):
+        old = timedelta(days=settings.SMS_RETENTION_DAYS + 1)
+        archived = self.sms(old, response_sent=True)
+        unanswered = self.sms(old)
+        sms_demand.roll_up()
+        not_rolled_up = self.sms(old, response_sent=True)
+        SMSDemandRollup.objects.create(period=SMSDemandRollup.HOUR, medicine_name='aspirin', location='',
+                                       bucket=self.now - timedelta(days=settings.SMS_HOURLY_ROLLUP_RETENTION_DAYS + 1))
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(SMS_ARCHIVE_DIR=directory):
+            self.assertEqual(sms_demand.archive(), 1)
+            rows = list(sms_demand.read_archive(sms_demand.archive_path(archived.id)))
+        self.assertEqual([row['id'] for row in rows], [archived.id])
+        self.assertEqual(set(SMSRequest.objects.values_list('id', flat=True)), {unanswered.id, not_rolled_up.id})
+        self.assertEqual(self.counts(SMSDemandRollup.HOUR), [('paracetamol', 2)])
+
+    def test_view_caps_the_window(self):
+        self.client.force_login(User.objects.create(username='admin', is_staff=True))
+        url = reverse('sms-demand')
+        for period in ('day', 'hour'):
+            with self.subTest(period):
+                response = self.client.get(url, {'period': period, 'last': 10 ** 9})
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, {'period': 'week'}).status_code, 400)
+
+
+@override_settings(INVENTORY_EVENT_RETENTION_DAYS=7, RESTOCK_SMOOTHING=0.3, RESTOCK_TARGET_DAYS=14)
+class RestockForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='pharmacy', is_pharmacy=True)
+        cls.pharmacy = Pharmacy.objects.create(user=cls.user, license_number='L1', store_name='Store')
+        cls.medicine = Medicine.objects.create(name='Paracetamol', description='', price=1, manufacturer='Acme')
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.row = None
+
+    def midnight(self, days_ago):
+        day = self.today - timedelta(days=days_ago)
+        return datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+
+    def stock(self, days_ago, quantity):
+        """Set the row's quantity as of noon ``days_ago`` days before today."""
+        if self.row is None:
+            self.row = Inventory.objects.create(pharmacy=self.pharmacy, medicine=self.medicine, quantity=quantity)
+        else:
+            Inventory.objects.filter(id=self.row.id).update(quantity=quantity)
+        InventoryEvent.objects.filter(id=InventoryEvent.objects.order_by('-id').values('id')[:1]).update(
+            created_at=self.midnight(days_ago) + timedelta(hours=12)
+        )
+
+    def recommendation(self):
+        return RestockRecommendation.objects.get(pharmacy=self.pharmacy, medicine=self.medicine)
+
+    def test_new_rows_start_from_their_mean_then_smooth(self):
+        # Stocked six days ago, then ten units sold on each of the next five days.
+        for days_ago, quantity in zip(range(6, 0, -1), range(100, 40, -10)):
+            self.stock(days_ago, quantity)
+        self.assertEqual(forecast(self.today), 1)
+        result = self.recommendation()
+        self.assertAlmostEqual(result.level, 50 / 6)
+        self.assertEqual((result.quantity, result.recommended_quantity), (50, 117 - 50))
+        self.assertAlmostEqual(result.days_of_cover, 6.0)
+
+        # A day later only the new day is folded in: 20 units sold.
+        self.stock(0, 30)
+        forecast(self.today + timedelta(days=1))
+        self.assertAlmostEqual(self.recommendation().level, 0.3 * 20 + 0.7 * 50 / 6)
+
+    def test_sms_trend_scales_the_forecast(self):
+        self.assertEqual(sms_trend(self.today)[self.medicine.id], 1)
+        SMSDemandRollup.objects.bulk_create([
+            SMSDemandRollup(period=SMSDemandRollup.DAY, medicine_name='paracetamol', location='', count=2,
+                            bucket=self.midnight(days_ago))
+            for days_ago in range(1, 8)
+        ])
+        # Every request came in the recent week: capped at twice the base rate.
+        self.assertEqual(sms_trend(self.today)[self.medicine.id], 2.0)
+
+    def test_restock_endpoint(self):
+        self.stock(3, 10)
+        self.stock(2, 0)
+        forecast(self.today)
+        url = reverse('pharmacy-restock')
+        self.client.force_login(self.user)
+        [row] = self.client.get(url).json()
+        self.assertEqual((row['medicine_name'], row['quantity'], row['days_of_cover']), ('Paracetamol', 0, 0.0))
+        self.assertGreater(row['recommended_quantity'], 0)
+        self.client.force_login(User.objects.create(username='customer'))
+        self.assertEqual(self.client.get(url).status_code, 403)
@@ -0,0 +1,171 @@
+"""
+Token-bucket rate limiting for the public endpoints.
+
+A bucket holds up to ``n`` tokens and refills at ``n`` per period
+(``THROTTLE_RATES``, in DRF's ``"n/period"`` format). A request takes a
+token from every bucket in its view's ``throttle_scopes``:
+
+* ``ip``: one bucket per client address (``BaseThrottle.get_ident``,
+  which honours ``NUM_PROXIES``);
+* ``phone``: one per SMS sender, since the gateway posts every message
+  from the same address;
+* ``global`` and ``sms``: one bucket shared by all clients, so that a
+  flood from many addresses still cannot swamp the database.
+
+Each bucket is one number in the ``THROTTLE_CACHE_ALIAS`` cache, its
+theoretical arrival time in the generic cell rate algorithm, so checking
+all of a request's buckets is one ``get_many`` and one ``set_many``. The
+two are not atomic: concurrent requests may overdraw a bucket by a token
+or two, as with DRF's own throttles.
+
+Over budget, views whose handler is wrapped in ``cached_response`` are
+let through with ``request.over_budget`` set, and answer from the
+response cache (a stale copy if need be) instead of the database; the
+rest get 429 with ``Retry-After``.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_SCOPES = ('ip', 'global')
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+PHONE_RE = re.compile(r'[^0-9+]')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(scopes, outcome):
+    with _stats_lock:
+        for scope in scopes:
+            _stats[scope, outcome] += 1
+
+
+def counters():
+    with _stats_lock:
+        return sorted((scope, outcome, count) for (scope, outcome), count in _stats.items())
+
+
+def parse_rate(rate):
+    """``'120/min'`` -> ``(120, 60)``; an empty rate disables the bucket."""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    return int(count), DURATIONS[period[0]]
+
+
+def get_cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def get_buckets(scopes, request, phone_number=None):
+    """``{cache key: (scope, count, period)}`` for the enabled ``scopes``."""
+    buckets = {}
+    for scope in scopes:
+        rate = parse_rate(settings.THROTTLE_RATES.get(scope))
+        if rate is None:
+            continue
+        if scope == 'ip':
+            identity = BaseThrottle().get_ident(request)
+        elif scope == 'phone':
+            identity = PHONE_RE.sub('', str(phone_number or ''))[:32]
+            if not identity:
+                # Left to the serializer to reject.
+                continue
+        else:
+            identity = '*'
+        buckets[f'throttle:{scope}:{identity}'] = (scope, *rate)
+    return buckets
+
+
+def _plan(buckets, arrivals, now):
+    """
+    Return the seconds until every bucket has a token, the scopes that are
+    out of them, and the new arrival times if none is.
+    """
+    wait, exhausted, updates = 0.0, [], {}
+    for key, (scope, count, period) in buckets.items():
+        interval = period / count
+        # An idle bucket is full: its arrival time has fallen behind now.
+        arrival = max(arrivals.get(key, now), now) + interval
+        if arrival > now + period:
+            wait = max(wait, arrival - now - period)
+            exhausted.append(scope)
+        else:
+            updates[key] = arrival
+    return wait, exhausted, updates
+
+
+def _timeout(buckets):
+    # After a whole period untouched a bucket is full, like a missing key.
+    return math.ceil(max(period for _, _, period in buckets.values()))
+
+
+def take(buckets):
+    """Take a token from each of ``buckets`` if all have one; see ``_plan``."""
+    if not buckets:
+        return 0.0, []
+    cache = get_cache()
+    wait, exhausted, updates = _plan(buckets, cache.get_many(list(buckets)), time.time())
+    if not exhausted:
+        cache.set_many(updates, timeout=_timeout(buckets))
+    return wait, exhausted
+
+
+async def atake(buckets):
+    """``take`` for async views."""
+    if not buckets:
+        return 0.0, []
+    cache = get_cache()
+    wait, exhausted, updates = _plan(buckets, await cache.aget_many(list(buckets)), time.time())
+    if not exhausted:
+        await cache.aset_many(updates, timeout=_timeout(buckets))
+    return wait, exhausted
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttles on the view's ``throttle_scopes`` (``ip`` and ``global`` by default)."""
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        scopes = getattr(view, 'throttle_scopes', DEFAULT_SCOPES)
+        phone_number = None
+        # A JSON body may be a list or a scalar; the serializer rejects it.
+        if 'phone' in scopes and isinstance(request.data, dict):
+            phone_number = request.data.get('phone_number')
+        self.wait_seconds, exhausted = take(get_buckets(scopes, request, phone_number))
+        if not exhausted:
+            record(scopes, 'allowed')
+            return True
+        handler = getattr(view, getattr(view, 'action', None) or request.method.lower(), None)
+        if getattr(handler, 'cached_namespaces', None):
+            # cached_response records the outcome once it knows whether
+            # the cache could answer.
+            request.over_budget = (self.wait_seconds, exhausted)
+            return True
+        record(exhausted, 'rejected')
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+
+async def athrottle(request, scopes=DEFAULT_SCOPES, phone_number=None):
+    """For async views: ``None`` within budget, otherwise a 429 response."""
+    wait, exhausted = await atake(get_buckets(scopes, request, phone_number))
+    if not exhausted:
+        record(scopes, 'allowed')
+        return None
+    record(exhausted, 'rejected')
+    response = JsonResponse({'detail': 'Request was throttled.'}, status=429)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
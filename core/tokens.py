@@ -0,0 +1,125 @@
+"""
+Signed, stateless API tokens for clients that authenticate on every call.
+
+Tokens are ``django.core.signing`` payloads naming the user and a token
+session id. Verifying an access token costs an HMAC check and a primary
+key lookup of the user: no password hash and no session table read. The
+password is checked once, when the token pair is issued.
+
+Refresh tokens live longer and rotate on every use. Revoking a session
+puts its id on a revocation list until its tokens would have expired
+anyway, which keeps the list small. Every check reads the list from the
+database, a unique index lookup, so a revocation holds in every process
+at once. Rotation claims the old session by inserting its row, so of two
+concurrent refreshes with the same token only one succeeds. Changing the
+password invalidates all of the user's tokens, as it does for sessions.
+"""
+import secrets
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .models import RevokedToken, User
+
+ACCESS_SALT = 'core.tokens.access'
+REFRESH_SALT = 'core.tokens.refresh'
+
+
+class TokenError(Exception):
+    pass
+
+
+def _user_hash(user):
+    return user.get_session_auth_hash()[:16]
+
+
+def issue(user):
+    """Return a new access/refresh token pair for ``user``."""
+    payload = {
+        'u': user.pk,
+        's': secrets.token_urlsafe(12),
+        'h': _user_hash(user),
+        'i': int(time.time()),
+    }
+    return {
+        'access': signing.dumps(payload, salt=ACCESS_SALT),
+        'refresh': signing.dumps(payload, salt=REFRESH_SALT),
+        'token_type': 'Bearer',
+        'expires_in': settings.AUTH_ACCESS_TOKEN_TTL,
+        'refresh_expires_in': settings.AUTH_REFRESH_TOKEN_TTL,
+    }
+
+
+def is_revoked(session_id):
+    return RevokedToken.objects.filter(session_id=session_id).exists()
+
+
+def _verify(token, salt, max_age):
+    try:
+        return signing.loads(token, salt=salt, max_age=max_age)
+    except signing.SignatureExpired:
+        raise TokenError('Token has expired')
+    except signing.BadSignature:
+        raise TokenError('Invalid token')
+
+
+def _load(token, salt, max_age):
+    payload = _verify(token, salt, max_age)
+    if is_revoked(payload['s']):
+        raise TokenError('Token has been revoked')
+    return payload
+
+
+def _user(payload):
+    user = User.objects.filter(pk=payload['u'], is_active=True).first()
+    if user is None or not constant_time_compare(payload['h'], _user_hash(user)):
+        raise TokenError('Invalid token')
+    return user
+
+
+def _expires_at(payload):
+    return datetime.fromtimestamp(payload['i'] + settings.AUTH_REFRESH_TOKEN_TTL, tz=dt_timezone.utc)
+
+
+def _prune():
+    RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+
+
+def authenticate(access_token):
+    """Return ``(user, payload)`` for a valid access token or raise ``TokenError``."""
+    payload = _load(access_token, ACCESS_SALT, settings.AUTH_ACCESS_TOKEN_TTL)
+    return _user(payload), payload
+
+
+def refresh(refresh_token):
+    """Exchange a refresh token for a new pair; the old pair is revoked."""
+    payload = _load(refresh_token, REFRESH_SALT, settings.AUTH_REFRESH_TOKEN_TTL)
+    user = _user(payload)
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(session_id=payload['s'], expires_at=_expires_at(payload))
+    except IntegrityError:
+        # Another request rotated this token since it was loaded.
+        raise TokenError('Token has been revoked')
+    _prune()
+    return issue(user)
+
+
+def revoke(refresh_token):
+    """Revoke the pair a refresh token belongs to. Revoking twice is a no-op."""
+    payload = _verify(refresh_token, REFRESH_SALT, settings.AUTH_REFRESH_TOKEN_TTL)
+    if not is_revoked(payload['s']):
+        revoke_session(payload)
+
+
+def revoke_session(payload):
+    RevokedToken.objects.bulk_create(
+        [RevokedToken(session_id=payload['s'], expires_at=_expires_at(payload))],
+        ignore_conflicts=True,
+    )
+    _prune()
@@ -1,9 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    UserViewSet, PharmacyViewSet, MedicineViewSet, InventoryViewSet,
-    UserRegistrationView, UserLoginView, MedicineSearchView, PharmacyInventoryView,
-    Home
+    UserViewSet, PharmacyViewSet, MedicineViewSet, InventoryViewSet, StockReservationViewSet,
+    UserRegistrationView, UserLoginView, TokenObtainView, TokenRefreshView, TokenRevokeView,
+    MedicineSearchView, PharmacyInventoryView, PharmacyInventoryChangesView,
+    PharmacyInventorySyncView, PharmacyRestockView, BasketAvailabilityView, SnapshotView,
+    SMSInboundView, SMSDemandView,
+    CacheStatsView, MetricsView, Home,
+    AsyncMedicineSearchView, AsyncMedicineAvailabilityView, AsyncSMSInboundView
 )
 
 router = DefaultRouter()
@@ -11,12 +15,31 @@ router.register(r'users', UserViewSet)
 router.register(r'pharmacies', PharmacyViewSet)
 router.register(r'medicines', MedicineViewSet)
 router.register(r'inventory', InventoryViewSet)
+router.register(r'reservations', StockReservationViewSet)
 
 urlpatterns = [
     path('', Home.as_view(), name='home'),  # Add this line for the home page
     path('api/', include(router.urls)),  # Move API routes under /api/
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('login/', UserLoginView.as_view(), name='login'),
+    path('api/auth/token/', TokenObtainView.as_view(), name='token-obtain'),
+    path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('api/auth/token/revoke/', TokenRevokeView.as_view(), name='token-revoke'),
     path('medicine/search/', MedicineSearchView.as_view(), name='medicine-search'),
     path('pharmacy/inventory/', PharmacyInventoryView.as_view(), name='pharmacy-inventory'),
+    path('pharmacy/inventory/changes/', PharmacyInventoryChangesView.as_view(),
+         name='pharmacy-inventory-changes'),
+    path('pharmacy/inventory/sync/', PharmacyInventorySyncView.as_view(), name='pharmacy-inventory-sync'),
+    path('pharmacy/restock/', PharmacyRestockView.as_view(), name='pharmacy-restock'),
+    path('api/availability/basket/', BasketAvailabilityView.as_view(), name='basket-availability'),
+    path('api/snapshots/<str:name>/', SnapshotView.as_view(), name='snapshot'),
+    path('sms/inbound/', SMSInboundView.as_view(), name='sms-inbound'),
+    path('api/sms/demand/', SMSDemandView.as_view(), name='sms-demand'),
+    path('api/cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    # Async views, meant to be served by the ASGI application.
+    path('async/medicines/search/', AsyncMedicineSearchView.as_view(), name='async-medicine-search'),
+    path('async/medicines/<int:pk>/availability/', AsyncMedicineAvailabilityView.as_view(),
+         name='async-medicine-availability'),
+    path('async/sms/inbound/', AsyncSMSInboundView.as_view(), name='async-sms-inbound'),
 ]
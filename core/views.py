@@ -1,16 +1,50 @@
+import json
+import os
+from functools import partial
+
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.db.models import F, Q
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 from django.views import View
-from rest_framework import viewsets, status, generics, permissions
+from rest_framework import viewsets, mixins, status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.decorators import action
 from django.contrib.auth import authenticate, login
-from .models import User, Pharmacy, Medicine, Inventory
+from .models import (
+    User, Pharmacy, Medicine, Inventory, RestockRecommendation, SMSDemandRollup, StockReservation
+)
 from .serializers import (
     UserSerializer, PharmacySerializer,
-    MedicineSerializer, InventorySerializer, UserLoginSerializer
+    MedicineSerializer, InventorySerializer, InventoryAddSerializer, UserLoginSerializer,
+    SMSInboundSerializer, StockReservationSerializer, RefreshTokenSerializer, BasketSerializer
+)
+from .search import get_search_backend, search_medicines, tokenize
+from .geo import nearby_in_stock
+from .basket import resolve_basket
+from .fuzzy import get_matcher
+from .authentication import SignedBySMSGateway
+from .sms import SIGNATURE_HEADER, aenqueue_request, enqueue_request, verify_signature
+from .sms_demand import demand
+from .inventory_sync import FORMATS, SyncError, detect_format, sync_inventory
+from .inventory_log import changes_since
+from .snapshots import (
+    TABLES as SNAPSHOT_TABLES, SnapshotError, parse_byte_range, read_footer, snapshot_etag,
+    snapshot_path
 )
+from .pagination import NDJSONExportMixin
+from .cache import cached_response, counters as cache_counters, stats as cache_stats
+from .throttling import TokenBucketThrottle, athrottle, counters as throttle_counters
+from .metrics import registry as metrics_registry
+from . import stock, tokens
+from .shaping import (
+    ShapedQuerysetMixin, ValuesListMixin, aserialize_values, shape_queryset, serialize_values
+)
+from .aio import fan_out
 
 class Home(View):
     def get(self, request):
@@ -23,6 +57,7 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
 
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
@@ -47,40 +82,90 @@ class UserViewSet(viewsets.ModelViewSet):
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class PharmacyViewSet(viewsets.ModelViewSet):
+class PharmacyViewSet(NDJSONExportMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing pharmacies.
     """
     queryset = Pharmacy.objects.all()
     serializer_class = PharmacySerializer
     permission_classes = [AllowAny]  # Change this to IsAuthenticated after testing
+    throttle_classes = [TokenBucketThrottle]
 
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        pharmacy = serializer.save()
-        # Inventory creation is handled by the post_save signal
+        serializer.save()
 
-class MedicineViewSet(viewsets.ModelViewSet):
+class MedicineViewSet(ShapedQuerysetMixin, NDJSONExportMixin, ValuesListMixin,
+                      viewsets.ModelViewSet):
     """
     API endpoint for managing medicines.
     """
     queryset = Medicine.objects.all()
     serializer_class = MedicineSerializer
     permission_classes = [AllowAny]  # Change this to IsAuthenticated after testing
+    throttle_classes = [TokenBucketThrottle]
+    keyset_orderings = {'id': ('id',), 'name': ('name', 'id')}
 
+    # Medicine rows carry their stock totals, so stock writes invalidate too.
+    @cached_response('catalogue', 'availability')
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
     @action(detail=False, methods=['get'])
+    @cached_response('catalogue', 'availability')
     def search(self, request):
         name = request.query_params.get('name', '')
-        medicines = Medicine.objects.filter(name__icontains=name)
-        serializer = self.get_serializer(medicines, many=True)
-        return Response(serializer.data)
+        medicines = self.get_queryset().filter(name__icontains=name)
+        page = self.paginate_queryset(medicines)
+        return self.get_paginated_response(serialize_values(page, MedicineSerializer))
 
-class InventoryViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def match(self, request):
+        """Closest names to ``q``, misspellings and brand/generic synonyms included."""
+        query = request.query_params.get('q', '').strip()
+        # Matching costs grow with the query; no name is longer than this.
+        max_length = Medicine._meta.get_field('name').max_length
+        if len(query) > max_length:
+            return Response({'error': f'q must be at most {max_length} characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        matches = get_matcher().match(query, limit) if query else []
+        names = dict(Medicine.objects.filter(id__in=[medicine_id for _, medicine_id in matches])
+                     .values_list('id', 'name'))
+        return Response([
+            {'id': medicine_id, 'name': names[medicine_id], 'score': score}
+            for score, medicine_id in matches if medicine_id in names
+        ])
+
+    @action(detail=True, methods=['get'])
+    @cached_response('availability')
+    def nearby(self, request, pk=None):
+        medicine = self.get_object()
+        try:
+            lat = float(request.query_params['lat'])
+            lng = float(request.query_params['lng'])
+            k = int(request.query_params.get('k', 10))
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'lat and lng are required numeric query parameters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response(
+                {'error': 'lat/lng out of range'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        k = max(1, min(k, 50))
+        return Response(nearby_in_stock(medicine.id, lat, lng, k))
+
+class InventoryViewSet(ShapedQuerysetMixin, NDJSONExportMixin, ValuesListMixin,
+                       viewsets.ModelViewSet):
     """
     API endpoint for managing inventory.
     """
@@ -89,8 +174,11 @@ class InventoryViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # Schema generation (core.api_docs) runs without a request.
+            return Inventory.objects.none()
         if self.request.user.is_pharmacy:
-            return Inventory.objects.filter(pharmacy__user=self.request.user)
+            return super().get_queryset().filter(pharmacy__user=self.request.user)
         return Inventory.objects.none()
 
     def update(self, request, *args, **kwargs):
@@ -102,28 +190,91 @@ class InventoryViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def add_medicine(self, request):
-        pharmacy = request.user.pharmacy
-        medicine_id = request.data.get('medicine_id')
-        quantity = request.data.get('quantity', 0)
+        """Add ``quantity`` units of a medicine; with none, just list it."""
+        pharmacy = get_object_or_404(Pharmacy, user=request.user)
+        serializer = InventoryAddSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        medicine = serializer.validated_data['medicine_id']
+        quantity = serializer.validated_data['quantity']
+
+        if quantity:
+            try:
+                inventory, created = stock.add_stock(pharmacy, medicine.id, quantity)
+            except stock.StockError as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            inventory, created = Inventory.objects.get_or_create(pharmacy=pharmacy, medicine=medicine)
+
+        serializer = self.get_serializer(inventory)
+        return Response(serializer.data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class StockReservationViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Reserve stock at a pharmacy, then commit or release the reservation.
+    Creating with an ``idempotency_key`` that was already used returns the
+    original reservation. Any user may hold and release stock; only the
+    pharmacy commits it.
+    """
+    queryset = StockReservation.objects.all()
+    serializer_class = StockReservationSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return StockReservation.objects.none()
+        user = self.request.user
+        return shape_queryset(
+            super().get_queryset().filter(Q(created_by=user) | Q(pharmacy__user=user)),
+            StockReservationSerializer
+        )
 
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
         try:
-            inventory = Inventory.objects.get(
-                pharmacy=pharmacy,
-                medicine_id=medicine_id
-            )
-            inventory.quantity = quantity
-            inventory.save()
-        except Inventory.DoesNotExist:
-            inventory = Inventory.objects.create(
-                pharmacy=pharmacy,
-                medicine_id=medicine_id,
-                quantity=quantity
+            reservation, created = stock.reserve(
+                data['pharmacy'],
+                [(line['medicine_id'], line['quantity']) for line in data['lines']],
+                data['idempotency_key'],
+                user=request.user
             )
+        except stock.InsufficientStock as exc:
+            return Response({'error': str(exc), 'medicine_id': exc.medicine_id},
+                          status=status.HTTP_409_CONFLICT)
+        except stock.IdempotencyConflict as exc:
+            return Response({'error': str(exc)},
+                          status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(
+            self.get_serializer(reservation).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
-        serializer = self.get_serializer(inventory)
-        return Response(serializer.data)
+    def _transition(self, apply):
+        reservation = self.get_object()
+        try:
+            reservation = apply(reservation)
+        except stock.InvalidTransition as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(reservation).data)
+
+    @action(detail=True, methods=['post'])
+    def commit(self, request, pk=None):
+        # Committing takes the units out for good, so only the pharmacy may;
+        # whoever created the reservation can only hold and release it.
+        if self.get_object().pharmacy.user_id != request.user.id:
+            return Response({'error': 'Only the pharmacy can commit a reservation'},
+                          status=status.HTTP_403_FORBIDDEN)
+        return self._transition(stock.commit)
+
+    @action(detail=True, methods=['post'])
+    def release(self, request, pk=None):
+        return self._transition(stock.release)
 
 class UserRegistrationView(APIView):
+    permission_classes = [AllowAny]
+
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
@@ -134,6 +285,8 @@ class UserRegistrationView(APIView):
                 pharmacy_data = {
                     'store_name': request.data.get('store_name'),
                     'license_number': request.data.get('license_number'),
+                    'latitude': request.data.get('latitude'),
+                    'longitude': request.data.get('longitude'),
                     'user': user.id
                 }
                 pharmacy_serializer = PharmacySerializer(data=pharmacy_data)
@@ -148,6 +301,8 @@ class UserRegistrationView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class UserLoginView(APIView):
+    permission_classes = [AllowAny]
+
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
         if serializer.is_valid():
@@ -165,10 +320,64 @@ class UserLoginView(APIView):
             return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class MedicineListView(generics.ListAPIView):
+class TokenObtainView(APIView):
+    """
+    Exchange username and password for a signed access/refresh token pair.
+    Unlike the login views this creates no session: API clients send
+    ``Authorization: Bearer <access>`` on each request instead.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = UserLoginSerializer(data=request.data)
+        if serializer.is_valid():
+            user = authenticate(
+                username=serializer.validated_data['username'],
+                password=serializer.validated_data['password']
+            )
+            if user:
+                return Response(tokens.issue(user))
+            return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class TokenRefreshView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                return Response(tokens.refresh(serializer.validated_data['refresh']))
+            except tokens.TokenError as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class TokenRevokeView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                tokens.revoke(serializer.validated_data['refresh'])
+            except tokens.TokenError as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class MedicineListView(ShapedQuerysetMixin, NDJSONExportMixin, ValuesListMixin,
+                       generics.ListAPIView):
     queryset = Medicine.objects.all()
     serializer_class = MedicineSerializer
     permission_classes = [IsAuthenticated]
+    keyset_orderings = {'id': ('id',), 'name': ('name', 'id')}
+
+    @cached_response('catalogue', 'availability')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
 class PharmacyInventoryView(APIView):
     permission_classes = [IsAuthenticated]
@@ -180,8 +389,7 @@ class PharmacyInventoryView(APIView):
         
         pharmacy = get_object_or_404(Pharmacy, user=request.user)
         inventory = Inventory.objects.filter(pharmacy=pharmacy)
-        serializer = InventorySerializer(inventory, many=True)
-        return Response(serializer.data)
+        return Response(serialize_values(inventory, InventorySerializer))
 
     def post(self, request):
         if not request.user.is_pharmacy:
@@ -192,33 +400,405 @@ class PharmacyInventoryView(APIView):
         serializer = InventorySerializer(data=request.data)
         
         if serializer.is_valid():
-            # Check if medicine already exists in inventory
-            existing_inventory = Inventory.objects.filter(
-                pharmacy=pharmacy,
-                medicine=serializer.validated_data['medicine']
-            ).first()
-            
-            if existing_inventory:
-                existing_inventory.quantity += serializer.validated_data['quantity']
-                existing_inventory.save()
-                return Response(InventorySerializer(existing_inventory).data)
-            
-            serializer.save(pharmacy=pharmacy)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            # Adds to any existing stock with a single atomic UPDATE
+            try:
+                inventory, created = stock.add_stock(
+                    pharmacy,
+                    serializer.validated_data['medicine_id'],
+                    serializer.validated_data.get('quantity', 0)
+                )
+            except stock.StockError as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(
+                InventorySerializer(inventory).data,
+                status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class PharmacyInventoryChangesView(APIView):
+    """
+    Inventory changes after sequence number ``since`` (0 for everything),
+    collapsed to the latest per medicine. Keep the returned ``cursor`` and
+    pass it as ``since`` next time; ``has_more`` means another page is
+    waiting. ``reset`` means the log no longer reaches back to ``since`` and
+    ``changes`` is the whole inventory, to replace the local copy with.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_pharmacy:
+            return Response({'error': 'Only pharmacies can access inventory'},
+                          status=status.HTTP_403_FORBIDDEN)
+
+        pharmacy = get_object_or_404(Pharmacy, user=request.user)
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', settings.INVENTORY_CHANGES_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'since and limit must be integers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({'error': 'since must not be negative and limit must be positive'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, settings.INVENTORY_CHANGES_PAGE_SIZE)
+        return Response(changes_since(pharmacy, since, limit))
+
+class PharmacyInventorySyncView(APIView):
+    """
+    Bulk upsert of a pharmacy's stock from a CSV or NDJSON body (or a
+    multipart ``file`` upload) with ``medicine_id`` and ``quantity`` per row.
+    The body is read as a stream and applied in chunks.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if not request.user.is_pharmacy:
+            return Response({'error': 'Only pharmacies can sync inventory'},
+                          status=status.HTTP_403_FORBIDDEN)
+
+        pharmacy = get_object_or_404(Pharmacy, user=request.user)
+        if request.content_type.startswith('multipart/form-data'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'Missing file upload'},
+                              status=status.HTTP_400_BAD_REQUEST)
+            lines = upload
+            fmt = detect_format(upload.content_type or '', upload.name)
+        else:
+            lines = request.stream or []
+            fmt = detect_format(request.content_type)
+        fmt = request.query_params.get('input_format', fmt)
+        if fmt not in FORMATS:
+            return Response(
+                {'error': f'Unsupported format; use one of {", ".join(FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            report = sync_inventory(pharmacy, lines, fmt)
+        except SyncError as exc:
+            # Earlier chunks are already applied; say how far it got.
+            return Response({'error': str(exc), 'line': exc.line, **exc.report.as_dict()},
+                          status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict())
+
+class PharmacyRestockView(APIView):
+    """
+    Restock recommendations from the last ``forecast_restock`` run, the
+    medicines that run out soonest first. Only rows with something to order
+    unless ``all`` is set.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_pharmacy:
+            return Response({'error': 'Only pharmacies can access restock recommendations'},
+                          status=status.HTTP_403_FORBIDDEN)
+
+        pharmacy = get_object_or_404(Pharmacy, user=request.user)
+        recommendations = RestockRecommendation.objects.filter(pharmacy=pharmacy)
+        if request.query_params.get('all') not in ('1', 'true'):
+            recommendations = recommendations.filter(recommended_quantity__gt=0)
+        rows = recommendations.order_by(
+            F('days_of_cover').asc(nulls_last=True), 'medicine_id'
+        ).values(
+            'medicine_id', 'quantity', 'forecast', 'days_of_cover', 'recommended_quantity',
+            'computed_at', medicine_name=F('medicine__name'),
+        )
+        return Response([
+            {**row, 'forecast': round(row['forecast'], 2),
+             'days_of_cover': None if row['days_of_cover'] is None else round(row['days_of_cover'], 1)}
+            for row in rows
+        ])
+
+class BasketAvailabilityView(APIView):
+    """
+    Pharmacies that can fill a whole basket of medicines, nearest first when
+    ``lat``/``lng`` are given, or else the fewest pharmacies that cover it
+    between them. Body: ``{"items": [{"medicine_id": 1, "quantity": 2}, ...]}``.
+    """
+    permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+
+    def post(self, request):
+        serializer = BasketSerializer(data=request.data)
+        if serializer.is_valid():
+            data = serializer.validated_data
+            return Response(resolve_basket(
+                [(item['medicine_id'], item['quantity']) for item in data['items']],
+                data.get('lat'), data.get('lng'), data['limit'],
+            ))
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class SnapshotView(APIView):
+    """
+    Columnar snapshot of a table (``medicines`` or ``inventory``; see
+    ``core.snapshots`` for the file layout) as last written by
+    ``export_snapshots``; requests never rebuild it. Supports ``Range`` and
+    ``If-Range`` so clients can resume downloads or read the footer and
+    fetch single columns.
+    """
+    # Inventory across all pharmacies is for internal consumers only.
+    public_tables = ('medicines',)
+    chunk_size = 64 * 1024
+
+    def get_permissions(self):
+        if self.kwargs.get('name') in self.public_tables:
+            return [AllowAny()]
+        return [IsAdminUser()]
+
+    def get(self, request, name):
+        if name not in SNAPSHOT_TABLES:
+            raise Http404('Unknown snapshot')
+        path = snapshot_path(name)
+        try:
+            snapshot = open(path, 'rb')
+        except FileNotFoundError:
+            raise Http404('Snapshot has not been exported yet')
+        # Taken from the open file, which a concurrent rebuild cannot change.
+        try:
+            etag = snapshot_etag(read_footer(snapshot))
+        except SnapshotError:
+            # Damaged, e.g. truncated; export_snapshots replaces it.
+            snapshot.close()
+            raise Http404('Snapshot has not been exported yet')
+        size = os.fstat(snapshot.fileno()).st_size
+
+        if request.headers.get('If-None-Match') == etag:
+            snapshot.close()
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+
+        byte_range = None
+        if request.headers.get('If-Range', etag) == etag:
+            try:
+                byte_range = parse_byte_range(request.headers.get('Range'), size)
+            except SnapshotError:
+                snapshot.close()
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+        start, end = byte_range or (0, size - 1)
+
+        response = StreamingHttpResponse(
+            self.read(snapshot, start, end - start + 1),
+            status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+            content_type='application/octet-stream',
+        )
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Content-Disposition'] = f'attachment; filename="{path.name}"'
+        return response
+
+    def read(self, snapshot, offset, length):
+        # The file handle stays valid even if a rebuild replaces the path.
+        with snapshot:
+            snapshot.seek(offset)
+            while length > 0:
+                chunk = snapshot.read(min(self.chunk_size, length))
+                if not chunk:
+                    return
+                length -= len(chunk)
+                yield chunk
+
 class MedicineSearchView(APIView):
+    """
+    HTML search page. Not wrapped in ``cached_response``, which stores DRF
+    response data: this view renders a template from a page of model
+    instances, so over its throttle budget it gets 429 rather than a cached
+    copy. The JSON ``/api/medicines/search/`` is cached.
+    """
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
 
     def get(self, request):
-        medicine_name = request.GET.get('name', '')
-        # Always get all medicines and let JavaScript handle the filtering
-        medicines = Medicine.objects.all()
-        
+        medicine_name = request.GET.get('name', '').strip()
+        page = search_medicines(medicine_name, request.GET.get('page'))
+
         return render(request, 'core/medicine_search.html', {
-            'medicines': medicines,
+            'medicines': page.object_list,
+            'page_obj': page,
             'search_query': medicine_name
         })
 
+class SMSInboundView(APIView):
+    """
+    Webhook for the SMS gateway. Only stores the request; replies are sent
+    by the process_sms worker. Bodies must be signed by the gateway.
+    """
+    authentication_classes = []
+    permission_classes = [SignedBySMSGateway]
+    throttle_classes = [TokenBucketThrottle]
+    # Per sender: every message arrives from the gateway's address.
+    throttle_scopes = ('phone', 'sms')
+
+    def post(self, request):
+        serializer = SMSInboundSerializer(data=request.data)
+        if serializer.is_valid():
+            sms_request, created = enqueue_request(**serializer.validated_data)
+            return Response({
+                'id': sms_request.id,
+                'duplicate': not created
+            }, status=status.HTTP_202_ACCEPTED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class SMSDemandView(APIView):
+    """
+    Most requested medicines by SMS over the last ``last`` hours or days
+    (``period``), from the demand rollups. ``location`` narrows to one
+    location and ``by_location=1`` counts each location separately.
+    ``last`` is capped at the hourly rollup retention, or ten years of days.
+    """
+    permission_classes = [IsAdminUser]
+    max_days = 3660
+
+    def get(self, request):
+        period = request.query_params.get('period', SMSDemandRollup.DAY)
+        if period not in dict(SMSDemandRollup.PERIOD_CHOICES):
+            return Response({'error': 'period must be hour or day'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if period == SMSDemandRollup.DAY:
+            default_last, max_last = 7, self.max_days
+        else:
+            default_last, max_last = 24, settings.SMS_HOURLY_ROLLUP_RETENTION_DAYS * 24
+        try:
+            last = max(1, min(int(request.query_params.get('last', default_last)), max_last))
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+        except ValueError:
+            return Response({'error': 'last and limit must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(demand(
+            period, last, request.query_params.get('location'),
+            request.query_params.get('by_location') in ('1', 'true'), limit,
+        ))
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+class MetricsView(View):
+    """Request and cache metrics in the Prometheus text format."""
+
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            raise Http404
+        extra = [
+            ('response_cache_events_total', {'namespace': namespace, 'event': event}, count)
+            for namespace, event, count in cache_counters()
+        ] + [
+            ('throttle_requests_total', {'scope': scope, 'outcome': outcome}, count)
+            for scope, outcome, count in throttle_counters()
+        ]
+        return HttpResponse(
+            metrics_registry.render(extra),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+class AsyncMedicineSearchView(View):
+    """
+    Async counterpart of the medicine search for the ASGI application.
+    The match count and the ranked ids of the page are fetched concurrently.
+    """
+
+    async def get(self, request):
+        throttled = await athrottle(request)
+        if throttled:
+            return throttled
+        query = request.GET.get('name', '').strip()
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+        except ValueError:
+            return JsonResponse({'error': 'page must be an integer'}, status=400)
+        per_page = settings.MEDICINE_SEARCH_PAGE_SIZE
+        offset = (page - 1) * per_page
+
+        if tokenize(query):
+            backend = get_search_backend()
+            count, ids = await fan_out(
+                partial(backend.count, query),
+                partial(backend.ranked_ids, query, offset, per_page),
+            )
+            rows = await aserialize_values(Medicine.objects.filter(id__in=ids), MedicineSerializer)
+            position = {pk: index for index, pk in enumerate(ids)}
+            rows.sort(key=lambda row: position[row['id']])
+        else:
+            medicines = Medicine.objects.order_by('name', 'id')
+            count, rows = await fan_out(
+                medicines.count,
+                partial(serialize_values, medicines[offset:offset + per_page], MedicineSerializer),
+            )
+        return JsonResponse({'count': count, 'page': page, 'results': rows})
+
+class AsyncMedicineAvailabilityView(View):
+    """
+    Availability of one medicine: its details with stock totals and either
+    the nearest stocking pharmacies (with ``lat``/``lng``) or the
+    best-stocked ones, fetched concurrently.
+    """
+
+    async def get(self, request, pk):
+        throttled = await athrottle(request)
+        if throttled:
+            return throttled
+        try:
+            k = max(1, min(int(request.GET.get('k', 10)), 50))
+            lat = request.GET.get('lat')
+            lng = request.GET.get('lng')
+            point = (float(lat), float(lng)) if lat is not None or lng is not None else None
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {'error': 'lat and lng must be given together as numbers; k must be an integer'},
+                status=400
+            )
+        if point and not (-90 <= point[0] <= 90 and -180 <= point[1] <= 180):
+            return JsonResponse({'error': 'lat/lng out of range'}, status=400)
+
+        in_stock = Inventory.objects.filter(medicine_id=pk, quantity__gt=0)
+        if point:
+            pharmacies = partial(nearby_in_stock, pk, point[0], point[1], k)
+        else:
+            pharmacies = partial(list, in_stock.order_by('-quantity').values(
+                'pharmacy_id', 'quantity', store_name=F('pharmacy__store_name'))[:k])
+        # Stock totals come with the medicine row from the availability summary.
+        medicine, pharmacies = await fan_out(
+            partial(serialize_values, Medicine.objects.filter(pk=pk), MedicineSerializer),
+            pharmacies,
+        )
+        if not medicine:
+            return JsonResponse({'error': 'Medicine not found'}, status=404)
+        return JsonResponse({
+            'medicine': medicine[0],
+            'in_stock_pharmacies': medicine[0]['in_stock_pharmacies'],
+            'total_quantity': medicine[0]['total_quantity'],
+            'pharmacies': pharmacies,
+        })
 
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSMSInboundView(View):
+    """Async counterpart of ``SMSInboundView``; accepts form or JSON bodies."""
 
+    async def post(self, request):
+        if not verify_signature(request.body, request.headers.get(SIGNATURE_HEADER)):
+            return JsonResponse({'detail': SignedBySMSGateway.message}, status=403)
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body)
+            except ValueError:
+                return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+        else:
+            data = request.POST
+        serializer = SMSInboundSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+        throttled = await athrottle(request, SMSInboundView.throttle_scopes,
+                                    serializer.validated_data['phone_number'])
+        if throttled:
+            return throttled
+        sms_request, created = await aenqueue_request(**serializer.validated_data)
+        return JsonResponse({'id': sms_request.id, 'duplicate': not created}, status=202)
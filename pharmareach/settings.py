@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,11 +39,11 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
-    'drf_yasg',
     'core',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,12 +76,59 @@ WSGI_APPLICATION = 'pharmareach.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE selects the backend: 'sqlite' (default) or 'postgres'.
+DB_PROFILE = config('DB_PROFILE', default='sqlite')
+
+if DB_PROFILE == 'postgres':
+    # Requires psycopg (3.x); psycopg[pool] for DB_POOL.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='pharmareach'),
+            'USER': config('DB_USER', default='pharmareach'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if config('DB_POOL', default=False, cast=bool):
+        # A pool replaces persistent connections; Django rejects both at once.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=20, cast=int),
+        }
+elif DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {},
+            # A file rather than SQLite's in-memory default, so that tests
+            # can share the database between threads.
+            'TEST': {'NAME': config('DB_TEST_NAME', default=str(BASE_DIR / 'test_db.sqlite3'))},
+        }
+    }
+    if config('DB_SQLITE_TUNED', default=True, cast=bool):
+        # WAL lets readers run alongside the single writer; IMMEDIATE makes
+        # transactions take the write lock up front so busy_timeout applies
+        # instead of failing on a lock upgrade.
+        DATABASES['default']['OPTIONS'] = {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f"PRAGMA busy_timeout={config('DB_SQLITE_BUSY_TIMEOUT', default=5000, cast=int)};"
+                f"PRAGMA mmap_size={config('DB_SQLITE_MMAP_SIZE', default=268435456, cast=int)};"
+                f"PRAGMA cache_size={config('DB_SQLITE_CACHE_SIZE', default=-65536, cast=int)};"
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        }
+else:
+    raise ImproperlyConfigured(f"Unknown DB_PROFILE {DB_PROFILE!r}; use 'sqlite' or 'postgres'")
 
 
 # Password validation
@@ -129,21 +177,150 @@ AUTH_USER_MODEL = 'core.User'
 
 # REST Framework settings
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
     ],
+    # Signed bearer tokens for API clients (core.tokens), sessions for the
+    # browser. No BasicAuthentication: it hashes the password on every call.
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'core.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication'
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=50, cast=int),
 }
-
-# Documentation settings
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int)
+
+# Documentation settings. The schema (core.api_docs) is built once per
+# process, or read from API_SCHEMA_DIR when `manage.py export_api_schema`
+# has written it at deploy time. API_DOCS_ENABLED=False drops the docs
+# routes and drf_yasg altogether.
+API_DOCS_ENABLED = config('API_DOCS_ENABLED', default=True, cast=bool)
+API_SCHEMA_DIR = config('API_SCHEMA_DIR', default=str(BASE_DIR / 'openapi'))
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
-        'basic': {
-            'type': 'basic'
+        'Bearer': {
+            'type': 'apiKey',
+            'name': 'Authorization',
+            'in': 'header'
         }
     },
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+# Medicine search: dotted path to a core.search backend class. Empty picks
+# SQLite FTS5 on SQLite and the portable database backend elsewhere.
+MEDICINE_SEARCH_BACKEND = config('MEDICINE_SEARCH_BACKEND', default='')
+MEDICINE_SEARCH_PAGE_SIZE = config('MEDICINE_SEARCH_PAGE_SIZE', default=24, cast=int)
+
+# SMS requests. SMS_GATEWAY is a dotted path to a core.sms gateway class;
+# it has to be set when DEBUG is off, since the fake one sends nothing.
+SMS_GATEWAY = config('SMS_GATEWAY', default='core.sms.FakeSMSGateway' if DEBUG else '')
+SMS_DEDUP_WINDOW = config('SMS_DEDUP_WINDOW', default=600, cast=int)  # seconds
+SMS_CLAIM_LEASE = config('SMS_CLAIM_LEASE', default=300, cast=int)  # seconds
+# Shared with the gateway, which signs every webhook body with it (HMAC-SHA256
+# in X-SMS-Signature). Unset, the inbound webhooks refuse every message.
+SMS_WEBHOOK_SECRET = config('SMS_WEBHOOK_SECRET', default='')
+
+# Caching. The cache has to be shared by every worker: response cache
+# versions, throttle buckets and the fuzzy index coordinate through it. The
+# local-memory default is per process and only fits a single development
+# server; point CACHE_BACKEND at RedisCache or FileBasedCache (with
+# CACHE_LOCATION set to a directory) otherwise. `manage.py check --deploy`
+# fails while it is process-local.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='pharmareach'),
+    }
+}
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+
+# Rate limits for the public endpoints (core.throttling): token buckets per
+# client IP, per SMS sender and shared by all clients, as "count/period";
+# an empty rate disables that bucket. Buckets live in the cache, so they
+# are per process with the local-memory default. Requests over budget on
+# cached endpoints get a cached copy up to THROTTLE_STALE_TIMEOUT seconds old.
+THROTTLE_RATES = {
+    'ip': config('THROTTLE_IP_RATE', default='120/min'),
+    'global': config('THROTTLE_GLOBAL_RATE', default='3000/min'),
+    'phone': config('THROTTLE_PHONE_RATE', default='10/min'),
+    'sms': config('THROTTLE_SMS_RATE', default='600/min'),
 }
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_STALE_TIMEOUT = config('THROTTLE_STALE_TIMEOUT', default=3600, cast=int)
+
+# Stock reservations not committed within this many seconds are released by
+# the release_reservations command.
+RESERVATION_TTL = config('RESERVATION_TTL', default=900, cast=int)
+
+# Request metrics, served on /metrics when METRICS_ENABLED is set. The endpoint
+# is unauthenticated, so only enable it where the scraper alone can reach it.
+# Requests slower than METRICS_SLOW_REQUEST_MS are logged with their SQL (0
+# disables the log).
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+METRICS_SLOW_REQUEST_MS = config('METRICS_SLOW_REQUEST_MS', default=0, cast=int)
+
+# Threads that async views use to run independent queries concurrently
+# (core.aio.fan_out). Each busy thread holds one database connection.
+ASYNC_FANOUT_THREADS = config('ASYNC_FANOUT_THREADS', default=32, cast=int)
+
+# API tokens (core.tokens), in seconds. Access tokens are verified without a
+# database session; refresh tokens rotate on use and can be revoked.
+AUTH_ACCESS_TOKEN_TTL = config('AUTH_ACCESS_TOKEN_TTL', default=900, cast=int)
+AUTH_REFRESH_TOKEN_TTL = config('AUTH_REFRESH_TOKEN_TTL', default=14 * 86400, cast=int)
+
+# Low-stock alerts (core.alerts): dotted path to the sink, the file used by
+# FileAlertSink and how long a dispatcher may hold a claimed alert (seconds).
+LOW_STOCK_ALERT_SINK = config('LOW_STOCK_ALERT_SINK', default='core.alerts.FileAlertSink')
+LOW_STOCK_ALERT_FILE = config('LOW_STOCK_ALERT_FILE', default=str(BASE_DIR / 'low_stock_alerts.jsonl'))
+LOW_STOCK_ALERT_LEASE = config('LOW_STOCK_ALERT_LEASE', default=300, cast=int)
+
+# Inventory change log (core.inventory_log): most changes returned per
+# delta page, and how long events are kept before compaction folds them.
+INVENTORY_CHANGES_PAGE_SIZE = config('INVENTORY_CHANGES_PAGE_SIZE', default=1000, cast=int)
+INVENTORY_EVENT_RETENTION_DAYS = config('INVENTORY_EVENT_RETENTION_DAYS', default=7, cast=int)
+
+# Columnar snapshots (core.snapshots): where the files live and how column
+# chunks are compressed ('zlib', 'lzma' or 'none'). /api/snapshots/ serves
+# the files as they are; run export_snapshots periodically to refresh them.
+SNAPSHOT_DIR = config('SNAPSHOT_DIR', default=str(BASE_DIR / 'snapshots'))
+SNAPSHOT_COMPRESSION = config('SNAPSHOT_COMPRESSION', default='zlib')
+
+# Fuzzy medicine name matching (core.fuzzy): the score (0..1) a match needs
+# to answer an SMS, and how often (seconds) a process checks for catalogue
+# changes made by other processes.
+FUZZY_MATCH_MIN_SCORE = config('FUZZY_MATCH_MIN_SCORE', default=0.6, cast=float)
+FUZZY_INDEX_REFRESH_INTERVAL = config('FUZZY_INDEX_REFRESH_INTERVAL', default=30, cast=int)
+
+# Basket availability (core.basket): most medicines one request may ask for.
+BASKET_MAX_ITEMS = config('BASKET_MAX_ITEMS', default=200, cast=int)
+
+# SMS demand rollups and retention (core.sms_demand). The rollup job skips
+# requests younger than SMS_ROLLUP_LAG seconds so that rows still being
+# committed are not passed over. Answered requests older than
+# SMS_RETENTION_DAYS move to gzipped files in SMS_ARCHIVE_DIR; hourly
+# rollups are kept SMS_HOURLY_ROLLUP_RETENTION_DAYS, daily ones forever.
+SMS_ROLLUP_LAG = config('SMS_ROLLUP_LAG', default=60, cast=int)
+SMS_RETENTION_DAYS = config('SMS_RETENTION_DAYS', default=30, cast=int)
+SMS_ARCHIVE_DIR = config('SMS_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'sms'))
+SMS_HOURLY_ROLLUP_RETENTION_DAYS = config('SMS_HOURLY_ROLLUP_RETENTION_DAYS', default=90, cast=int)
+
+# Restock recommendations (core.forecasting): smoothing factor of the daily
+# demand level, days of demand a restock should cover, the SMS trend
+# windows (recent against base, in days) and pharmacies per job chunk.
+RESTOCK_SMOOTHING = config('RESTOCK_SMOOTHING', default=0.3, cast=float)
+RESTOCK_TARGET_DAYS = config('RESTOCK_TARGET_DAYS', default=14, cast=int)
+RESTOCK_TREND_RECENT_DAYS = config('RESTOCK_TREND_RECENT_DAYS', default=7, cast=int)
+RESTOCK_TREND_BASE_DAYS = config('RESTOCK_TREND_BASE_DAYS', default=28, cast=int)
+RESTOCK_CHUNK_PHARMACIES = config('RESTOCK_CHUNK_PHARMACIES', default=100, cast=int)
@@ -14,33 +14,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-# Create schema view for Swagger documentation
-schema_view = get_schema_view(
-    openapi.Info(
-        title="PharmaReach API",
-        default_version='v1',
-        description="API documentation for PharmaReach application",
-        terms_of_service="https://www.example.com/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
     path('api-auth/', include('rest_framework.urls')),
-    
-    # Swagger documentation endpoints
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
+
+if settings.API_DOCS_ENABLED:
+    from core.api_docs import schema_view, ui_view
+
+    # Swagger documentation endpoints; drf_yasg is loaded on first use.
+    urlpatterns += [
+        re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view, name='schema-json'),
+        path('swagger/', ui_view, {'renderer': 'swagger'}, name='schema-swagger-ui'),
+        path('redoc/', ui_view, {'renderer': 'redoc'}, name='schema-redoc'),
+    ]